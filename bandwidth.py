@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+# Transfers are shaped on the link they use: what we download and what we send
+PHASE_LINKS = {"source": "ingress", "r2_get": "ingress", "r2_put": "egress", "youtube": "egress"}
+SETTINGS_ID = "bandwidth"
+
+
+# One direction of the network shared by all tenants. Each user has a virtual
+# clock: moving n bytes pushes it n / rate seconds ahead, and the transfer
+# waits until real time catches up (bytes are charged after they move, so a
+# caller paces its *next* read or chunk). A user's rate is its weighted share
+# of `rate` among users active in the last `idle_after` seconds, capped by
+# its per-user limit, so a tenant running 50 streams gets the same share as
+# one running a single stream. An idle user may run up to `burst` seconds
+# ahead. 0 means unlimited, for both the link and per-user rates.
+class Link:
+    def __init__(
+        self,
+        rate: int = 0,
+        user_rate: int = 0,
+        burst: float = 1.0,
+        idle_after: float = 2.0,
+    ):
+        self.rate = rate
+        self.user_rate = user_rate
+        self.burst = burst
+        self.idle_after = idle_after
+        # Per-user overrides
+        self.user_rates: Dict[str, int] = {}
+        self.weights: Dict[str, float] = {}
+        self.transferred: Counter = Counter()
+        self._clocks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _share(self, user: str, now: float) -> float:
+        cap = self.user_rates.get(user, self.user_rate)
+        if not self.rate:
+            return cap
+        active = 0.0
+        for other, clock in list(self._clocks.items()):
+            if clock < now - self.idle_after:
+                del self._clocks[other]
+            elif other != user:
+                active += self.weights.get(other, 1.0)
+        weight = self.weights.get(user, 1.0)
+        share = self.rate * weight / (active + weight)
+        return min(share, cap) if cap else share
+
+    # Charges `nbytes` to `user`; returns how long to wait before moving more
+    def reserve(self, user: str, nbytes: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self.transferred[user] += nbytes
+            rate = self._share(user, now)
+            if not rate:
+                return 0.0
+            clock = max(self._clocks.get(user, now), now - self.burst) + nbytes / rate
+            self._clocks[user] = clock
+        return max(clock - now, 0.0)
+
+    def config(self) -> dict:
+        with self._lock:
+            users = set(self.user_rates) | set(self.weights)
+            return {
+                "rate": self.rate,
+                "user_rate": self.user_rate,
+                "users": [
+                    {
+                        "user_id": user,
+                        "rate": self.user_rates.get(user),
+                        "weight": self.weights.get(user),
+                    }
+                    for user in sorted(users)
+                ],
+            }
+
+    # Applies a (partial) config as returned by config(); a user entry
+    # replaces that user's overrides, and None values mean the default. With
+    # `replace`, users not listed lose their overrides.
+    def apply(self, config: dict, replace: bool = False):
+        with self._lock:
+            if replace:
+                self.user_rates.clear()
+                self.weights.clear()
+            if config.get("rate") is not None:
+                self.rate = config["rate"]
+            if config.get("user_rate") is not None:
+                self.user_rate = config["user_rate"]
+            for entry in config.get("users") or []:
+                user = entry["user_id"]
+                self.user_rates.pop(user, None)
+                self.weights.pop(user, None)
+                if entry.get("rate") is not None:
+                    self.user_rates[user] = entry["rate"]
+                if entry.get("weight") is not None:
+                    self.weights[user] = entry["weight"]
+
+    def stats(self, top: int = 20) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            active = [
+                {
+                    "user_id": user,
+                    "rate": round(self._share(user, now)),
+                    "backlog_seconds": round(max(clock - now, 0.0), 3),
+                }
+                for user, clock in list(self._clocks.items())
+                if clock >= now - self.idle_after
+            ]
+            return {
+                "active": active,
+                "bytes": sum(self.transferred.values()),
+                "top_users": [
+                    {"user_id": user, "bytes": nbytes}
+                    for user, nbytes in self.transferred.most_common(top)
+                ],
+            }
+
+
+# A user's handle on the shaper, passed down to the transfer code
+class Tenant:
+    def __init__(self, manager: "BandwidthManager", user_id: str):
+        self.manager = manager
+        self.user_id = user_id
+
+    def throttle(self, phase: str, nbytes: int):
+        delay = self.manager.reserve(self.user_id, phase, nbytes)
+        if delay:
+            time.sleep(delay)
+
+    async def athrottle(self, phase: str, nbytes: int):
+        delay = self.manager.reserve(self.user_id, phase, nbytes)
+        if delay:
+            await asyncio.sleep(delay)
+
+    # Byte callback (e.g. for boto3) that paces the transfer, then calls `then`
+    def callback(self, phase: str, then: Optional[Callable[[int], None]] = None):
+        def callback(nbytes: int):
+            self.throttle(phase, nbytes)
+            if then:
+                then(nbytes)
+
+        return callback
+
+
+# Ingress and egress links for this process. Limits changed through update()
+# are stored in `collection`, and refresh() picks up changes made by other
+# processes, so every process converges on the same settings.
+class BandwidthManager:
+    def __init__(self, collection, links: Dict[str, Link]):
+        self.collection = collection
+        self.links = links
+        self._version = None
+
+    def tenant(self, user_id: str) -> Tenant:
+        return Tenant(self, user_id)
+
+    def reserve(self, user_id: str, phase: str, nbytes: int) -> float:
+        return self.links[PHASE_LINKS[phase]].reserve(user_id, nbytes)
+
+    def config(self) -> dict:
+        return {name: link.config() for name, link in self.links.items()}
+
+    def stats(self) -> dict:
+        return {name: link.stats() for name, link in self.links.items()}
+
+    # Applies the stored settings if they changed since the last refresh
+    def refresh(self) -> bool:
+        doc = self.collection.find_one({"_id": SETTINGS_ID})
+        if not doc or doc.get("updated_at") == self._version:
+            return False
+        for name, config in (doc.get("links") or {}).items():
+            if name in self.links:
+                self.links[name].apply(config, replace=True)
+        self._version = doc.get("updated_at")
+        return True
+
+    # Applies `changes` ({link: partial config}) here and stores the result
+    def update(self, changes: Dict[str, dict]):
+        self.refresh()
+        for name, config in changes.items():
+            self.links[name].apply(config)
+        now = datetime.now(timezone.utc)
+        self.collection.update_one(
+            {"_id": SETTINGS_ID},
+            {"$set": {"links": self.config(), "updated_at": now}},
+            upsert=True,
+        )
+        self._version = now
@@ -0,0 +1,116 @@
+"""Measure how bandwidth.Link shares a link between tenants.
+
+Each tenant runs a number of upload streams on threads. A stream "sends" a
+chunk by sleeping for chunk / --wire-mbps (the speed of one connection),
+then charges the chunk to the link the way the upload loop does. The report
+shows each tenant's throughput against its fair share, with and without
+shaping, plus Jain's fairness index over throughput per unit of weight.
+
+    python benchmarks/bandwidth_fairness.py
+    python benchmarks/bandwidth_fairness.py --tenants 50:1 1:1 4:2 --link-mbps 400 --seconds 10
+    python benchmarks/bandwidth_fairness.py --user-cap-mbps 50
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bandwidth import Link  # noqa: E402
+
+MB = 1024 * 1024
+
+
+def run(tenants, link, chunk: int, wire_rate: float, seconds: float):
+    sent = {name: 0 for name, _, _ in tenants}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def stream(name: str):
+        while time.monotonic() < deadline:
+            time.sleep(chunk / wire_rate)
+            with lock:
+                sent[name] += chunk
+            if link:
+                delay = link.reserve(name, chunk)
+                if delay:
+                    time.sleep(delay)
+
+    threads = [
+        threading.Thread(target=stream, args=(name,), daemon=True)
+        for name, streams, _ in tenants for _ in range(streams)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {name: nbytes / seconds for name, nbytes in sent.items()}
+
+
+def jain(values):
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values)) if values else 1.0
+
+
+def report(title: str, tenants, rates, fair):
+    print(f"\n{title}")
+    print(f"{'tenant':>8} {'streams':>8} {'weight':>7} {'MB/s':>8} {'fair MB/s':>10}")
+    for name, streams, weight in tenants:
+        print(f"{name:>8} {streams:>8} {weight:>7g} {rates[name] / MB:8.1f} {fair[name] / MB:10.1f}")
+    total = sum(rates.values())
+    index = jain([rates[name] / weight for name, _, weight in tenants])
+    print(f"{'total':>8} {'':>8} {'':>7} {total / MB:8.1f}   Jain index {index:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tenants", nargs="+", default=["50:1", "1:1", "5:1", "2:2"],
+        help="STREAMS:WEIGHT per tenant",
+    )
+    parser.add_argument("--link-mbps", type=float, default=200, help="shaped link rate, MB/s")
+    parser.add_argument("--wire-mbps", type=float, default=40, help="speed of one stream, MB/s")
+    parser.add_argument("--user-cap-mbps", type=float, default=0, help="per-user cap, MB/s")
+    parser.add_argument("--chunk-mb", type=float, default=1)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    tenants = []
+    for n, spec in enumerate(args.tenants):
+        streams, _, weight = spec.partition(":")
+        tenants.append((f"t{n}", int(streams), float(weight or 1)))
+    chunk = int(args.chunk_mb * MB)
+    wire = args.wire_mbps * MB
+    rate, cap = int(args.link_mbps * MB), int(args.user_cap_mbps * MB)
+
+    # Fair share: weighted max-min over what each tenant's streams can carry
+    demand = {name: streams * wire for name, streams, _ in tenants}
+    fair, left, open_ = {}, rate, [t for t in tenants]
+    while open_:
+        total_weight = sum(weight for _, _, weight in open_)
+        capped = [
+            t for t in open_
+            if min(demand[t[0]], cap or demand[t[0]]) <= left * t[2] / total_weight
+        ]
+        if not capped:
+            for name, _, weight in open_:
+                fair[name] = left * weight / total_weight
+            break
+        for name, _, _ in capped:
+            fair[name] = min(demand[name], cap or demand[name])
+            left -= fair[name]
+        open_ = [t for t in open_ if t not in capped]
+
+    unshaped = run(tenants, None, chunk, wire, args.seconds)
+    report(f"unshaped (no limit; link would be {args.link_mbps:g} MB/s)", tenants, unshaped, fair)
+
+    link = Link(rate, cap)
+    for name, _, weight in tenants:
+        link.weights[name] = weight
+    shaped = run(tenants, link, chunk, wire, args.seconds)
+    report(f"shaped to {args.link_mbps:g} MB/s", tenants, shaped, fair)
+
+
+if __name__ == "__main__":
+    main()
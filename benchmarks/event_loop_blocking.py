@@ -0,0 +1,71 @@
+"""Show that blocking upload work no longer serializes on the event loop.
+
+Simulates N concurrent uploads whose `next_chunk()` calls block for a fixed
+time, once inline on the event loop (the old handler behaviour) and once
+dispatched through `executor.run_blocking`. A heartbeat task stands in for
+`GET /` health checks and records the worst event-loop stall.
+
+    python benchmarks/event_loop_blocking.py --uploads 8 --chunks 5 --chunk-ms 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executor import run_blocking  # noqa: E402
+
+
+def fake_upload(chunks: int, chunk_s: float):
+    for _ in range(chunks):
+        time.sleep(chunk_s)  # stands in for insert.next_chunk()
+
+
+async def inline_upload(chunks: int, chunk_s: float):
+    fake_upload(chunks, chunk_s)
+
+
+async def pooled_upload(chunks: int, chunk_s: float):
+    await run_blocking(fake_upload, chunks, chunk_s)
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def scenario(upload, uploads: int, chunks: int, chunk_s: float):
+    stop = asyncio.Event()
+    probe = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(chunks, chunk_s) for _ in range(uploads)))
+    wall = time.perf_counter() - start
+    stop.set()
+    return wall, await probe
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--chunk-ms", type=float, default=50)
+    args = parser.parse_args()
+    chunk_s = args.chunk_ms / 1000
+
+    serial = args.uploads * args.chunks * chunk_s
+    print(f"{args.uploads} uploads x {args.chunks} chunks x {args.chunk_ms:.0f} ms "
+          f"(fully serialized: {serial:.2f}s)")
+    for name, upload in (("inline", inline_upload), ("run_blocking", pooled_upload)):
+        wall, stall = asyncio.run(scenario(upload, args.uploads, args.chunks, chunk_s))
+        print(f"{name:>13}: wall {wall:.2f}s, worst loop stall {stall * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Report what importing the app costs, and catch cold-start regressions.
+
+Imports `main` in a fresh interpreter under `python -X importtime`, prints the
+wall time of the import and of `create_app()`, and the slowest packages
+(fastapi, pymongo, ...) by the time spent in their own modules, with the
+cumulative time of importing each including its dependencies. Exits non-zero if a module that should
+only load on first use (boto3, the Google client libraries, Pillow) was
+imported, or if the import takes longer than --budget-ms.
+
+    python benchmarks/import_time.py --top 15 --repeat 3 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAZY_MODULES = [
+    "boto3", "botocore", "googleapiclient", "google_auth_oauthlib", "httplib2", "httpx", "PIL",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+start = time.perf_counter()
+main.create_app()
+created = time.perf_counter() - start
+print(json.dumps({
+    "import_s": imported,
+    "create_app_s": created,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def run_probe(lazy_modules):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE % (lazy_modules,)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        sys.exit(proc.returncode)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+# Per root package: the self time of all its modules at any depth, and the
+# cumulative time of the imports where it is entered from another package
+# (so it includes what it pulls in). Everything loads under `main`, so
+# top-level entries alone would hide which package got slower.
+def parse_importtime(report: str):
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        name = fields[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip().split(".")[0], int(fields[0]), int(fields[1])))
+    packages = defaultdict(lambda: [0, 0])
+    # Modules are listed after their own imports, so walking backwards meets
+    # each parent before its children
+    parents = []
+    for depth, root, self_us, cumulative_us in reversed(entries):
+        while parents and parents[-1][0] >= depth:
+            parents.pop()
+        packages[root][0] += self_us
+        if not parents or parents[-1][1] != root:
+            packages[root][1] += cumulative_us
+        parents.append((depth, root))
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=0, help="0 disables the check")
+    args = parser.parse_args()
+
+    runs = [run_probe(LAZY_MODULES) for _ in range(args.repeat)]
+    # The fastest run is the least disturbed by the rest of the machine
+    result, report = min(runs, key=lambda run: run[0]["import_s"])
+    packages = parse_importtime(report)
+
+    print(f"import main:  {result['import_s'] * 1000:8.1f} ms (best of {args.repeat})")
+    print(f"create_app(): {result['create_app_s'] * 1000:8.1f} ms")
+    print(f"\nSlowest packages:\n  {'self':>11}  {'cumulative':>11}")
+    for name, (self_us, cumulative_us) in sorted(packages.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if result["loaded"]:
+        print(f"\nFAIL: imported eagerly: {', '.join(result['loaded'])}")
+        failed = True
+    if args.budget_ms and result["import_s"] * 1000 > args.budget_ms:
+        print(f"\nFAIL: import took longer than {args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("\nOK: heavy client libraries load on first use")
+
+
+if __name__ == "__main__":
+    main()
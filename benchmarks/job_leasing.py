@@ -0,0 +1,263 @@
+"""Scale JobQueue out over several worker processes sharing one Mongo.
+
+Each round enqueues --jobs jobs into a fresh collection, then starts N node
+processes, each running a JobQueue with its own lease owner. A job "uploads"
+in --steps steps of --step-seconds, checkpointing after every step the way
+a real upload checkpoints its resumable offset. The report shows throughput
+per node count (it should grow linearly while Mongo keeps up) and checks
+that every job finished exactly once.
+
+With --kill-after F, node 0 is SIGKILLed once a fraction F of the jobs has
+finished; its jobs must be reclaimed by the other nodes within about
+--lease-time seconds and resume from their last checkpoint.
+
+    python benchmarks/job_leasing.py --mongo-uri mongodb://localhost:27017 --nodes 1 2 4 8
+    python benchmarks/job_leasing.py --nodes 3 --kill-after 0.3 --lease-time 5 --heartbeat 1
+
+--mongomock runs the nodes as separate queues inside this process against
+an in-memory mongomock database; it checks the leasing logic without a Mongo
+server, but doesn't measure scaling. mongomock's find_one_and_update isn't
+atomic across threads, so every call is serialised behind one lock there.
+Needs `pip install mongomock`.
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from executor import run_blocking  # noqa: E402
+from jobs import SUCCEEDED, JobQueue  # noqa: E402
+
+DB_NAME = "job_leasing_bench"
+
+
+# A mongomock collection whose operations run one at a time, as a server's
+# single-document writes would be atomic. Cursors are read inside the lock.
+class SerializedCollection:
+    def __init__(self, collection, lock: threading.Lock):
+        self._collection = collection
+        self._lock = lock
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        def call(*args, **kwargs):
+            with self._lock:
+                result = method(*args, **kwargs)
+                return list(result) if name in ("find", "aggregate") else result
+        return call
+
+
+def make_queue(collection, steps, args, owner: str) -> JobQueue:
+    async def handle(job: dict) -> dict:
+        for step in range(job.get("step", 0), job["payload"]["steps"]):
+            await asyncio.sleep(args.step_seconds)
+            await run_blocking(
+                steps.insert_one,
+                {"job_id": job["_id"], "step": step, "owner": owner},
+            )
+            await run_blocking(queue.checkpoint, job["_id"], {"step": step + 1})
+        return {"owner": owner}
+
+    queue = JobQueue(
+        collection,
+        handle,
+        workers=args.workers,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        lease_time=args.lease_time,
+        heartbeat_interval=args.heartbeat,
+        owner=owner,
+    )
+    return queue
+
+
+# ─────────── Node process ─────────────────────────────────────────────────────
+async def serve_node(args):
+    from pymongo import MongoClient
+
+    db = MongoClient(args.mongo_uri)[DB_NAME]
+    queue = make_queue(db["jobs"], db["steps"], args, args.owner)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    await queue.start()
+    await stop.wait()
+    await queue.stop()
+
+
+class ProcessNodes:
+    def __init__(self, args, count: int):
+        self.procs = [
+            subprocess.Popen([
+                sys.executable, os.path.abspath(__file__), "--node",
+                "--owner", f"node-{n}", "--mongo-uri", args.mongo_uri,
+                "--workers", str(args.workers), "--concurrency", str(args.concurrency),
+                "--poll-interval", str(args.poll_interval),
+                "--lease-time", str(args.lease_time), "--heartbeat", str(args.heartbeat),
+                "--step-seconds", str(args.step_seconds),
+            ])
+            for n in range(count)
+        ]
+
+    async def kill(self, n: int):
+        self.procs[n].kill()
+
+    async def stop(self):
+        for proc in self.procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs:
+            await asyncio.to_thread(proc.wait)
+
+
+# Nodes as queues in this process; kill() drops one without finishing or
+# releasing anything, as if its process had died
+class InProcessNodes:
+    def __init__(self, args, count: int, jobs, steps):
+        self.queues = [make_queue(jobs, steps, args, f"node-{n}") for n in range(count)]
+
+    async def start(self):
+        for queue in self.queues:
+            await queue.start()
+
+    async def kill(self, n: int):
+        queue = self.queues[n]
+        tasks = [queue._heartbeat_task, *queue._worker_tasks, *queue._job_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        queue._worker_tasks, queue._heartbeat_task = [], None
+
+    async def stop(self):
+        for queue in self.queues:
+            await queue.stop()
+
+
+# ─────────── Rounds ─────────────────────────────────────────────────────────────
+async def run_round(args, db, count: int) -> dict:
+    jobs, steps = db["jobs"], db["steps"]
+    await run_blocking(jobs.drop)
+    await run_blocking(steps.drop)
+    seeder = make_queue(jobs, steps, args, "seeder")
+    await seeder.enqueue_many([{"steps": args.steps}] * args.jobs, "bench")
+
+    if args.mongomock:
+        nodes = InProcessNodes(args, count, jobs, steps)
+        await nodes.start()
+    else:
+        nodes = ProcessNodes(args, count)
+    killed_at = reclaimed_in = None
+    orphaned = 0
+    try:
+        deadline = time.monotonic() + args.timeout
+        while True:
+            done = await run_blocking(jobs.count_documents, {"status": SUCCEEDED})
+            if done >= args.jobs:
+                break
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Timed out with {done}/{args.jobs} jobs finished")
+            if args.kill_after and killed_at is None and count > 1 and done >= args.kill_after * args.jobs:
+                await nodes.kill(0)
+                killed_at = time.monotonic()
+                orphaned = await run_blocking(
+                    jobs.count_documents, {"status": "running", "lease_owner": "node-0"}
+                )
+            if killed_at and reclaimed_in is None and not await run_blocking(
+                jobs.count_documents, {"status": "running", "lease_owner": "node-0"}
+            ):
+                reclaimed_in = time.monotonic() - killed_at
+            await asyncio.sleep(0.05)
+    finally:
+        await nodes.stop()
+
+    docs = list(await run_blocking(jobs.find))
+    # From the first claim, so process startup isn't counted
+    first = min(d["started_at"] for d in docs)
+    last = max(d["finished_at"] for d in docs)
+    executed = await run_blocking(steps.count_documents, {})
+    distinct = len(list(await run_blocking(
+        steps.aggregate, [{"$group": {"_id": {"j": "$job_id", "s": "$step"}}}]
+    )))
+    return {
+        "nodes": count,
+        "seconds": (last - first).total_seconds(),
+        "finished": sum(d["status"] == SUCCEEDED for d in docs),
+        "resumed": sum(d["attempts"] > 1 for d in docs),
+        "redone": executed - distinct,
+        "missing": args.jobs * args.steps - distinct,
+        "orphaned": orphaned,
+        "reclaimed_in": reclaimed_in,
+    }
+
+
+async def run(args):
+    if args.mongomock:
+        import mongomock
+
+        lock = threading.Lock()
+        mock = mongomock.MongoClient()[DB_NAME]
+        db = {name: SerializedCollection(mock[name], lock) for name in ("jobs", "steps")}
+    else:
+        from pymongo import MongoClient
+
+        db = MongoClient(args.mongo_uri)[DB_NAME]
+    print(
+        f"{args.jobs} jobs of {args.steps} x {args.step_seconds:g}s, "
+        f"{args.workers} workers x {args.concurrency} per node, lease {args.lease_time:g}s"
+    )
+    print(f"{'nodes':>6} {'seconds':>8} {'jobs/s':>7} {'speedup':>8} {'resumed':>8} {'redone':>7}  notes")
+    base = None  # jobs/s per node in the first round
+    ok = True
+    for count in args.nodes:
+        r = await run_round(args, db, count)
+        rate = r["finished"] / r["seconds"]
+        base = base or rate / count
+        notes = []
+        if r["orphaned"]:
+            reclaimed = "never" if r["reclaimed_in"] is None else f"in {r['reclaimed_in']:.1f}s"
+            notes.append(f"killed node-0 holding {r['orphaned']} jobs, reclaimed {reclaimed}")
+        if r["finished"] != args.jobs or r["missing"]:
+            ok = False
+            notes.append(f"LOST WORK: {r['finished']} finished, {r['missing']} steps missing")
+        # Only a killed node's last step (done, but not yet checkpointed) may run twice
+        if r["redone"] > r["orphaned"]:
+            ok = False
+            notes.append(f"DUPLICATE WORK: {r['redone']} steps ran more than once")
+        print(
+            f"{count:>6} {r['seconds']:8.2f} {rate:7.1f} {rate / base:8.2f} "
+            f"{r['resumed']:>8} {r['redone']:>7}  {'; '.join(notes)}"
+        )
+    if not ok:
+        sys.exit("Some jobs did not finish exactly once")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--mongomock", action="store_true", help="in-process nodes on mongomock")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--step-seconds", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--lease-time", type=float, default=6)
+    parser.add_argument("--heartbeat", type=float, default=2)
+    parser.add_argument("--kill-after", type=float, default=0, metavar="FRACTION")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--node", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--owner", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    asyncio.run(serve_node(args) if args.node else run(args))
+
+
+if __name__ == "__main__":
+    main()
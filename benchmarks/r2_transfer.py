@@ -0,0 +1,95 @@
+"""Measure R2 transfer throughput for different multipart part sizes.
+
+Runs against a local S3 stand-in: an in-process moto server by default
+(`pip install "moto[server]"`), or any S3-compatible endpoint such as MinIO
+via --endpoint/--access-key/--secret-key.
+
+    python benchmarks/r2_transfer.py --size-mb 256 --part-sizes-mb 5 8 16 32 --concurrency 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import MB, R2Storage  # noqa: E402
+
+
+def start_moto():
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+
+def make_source(size: int) -> str:
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    block = os.urandom(MB)
+    with os.fdopen(fd, "wb") as f:
+        for _ in range(size // MB):
+            f.write(block)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--part-sizes-mb", type=int, nargs="+", default=[5, 8, 16, 32])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoint")
+    parser.add_argument("--access-key", default="bench")
+    parser.add_argument("--secret-key", default="bench")
+    parser.add_argument("--bucket", default="bench-videos")
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        server, endpoint = start_moto()
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    source = make_source(args.size_mb * MB)
+    try:
+        print(f"{args.size_mb} MB object, max_concurrency={args.concurrency}, endpoint={endpoint}")
+        for part_mb in args.part_sizes_mb:
+            storage = R2Storage(
+                bucket=args.bucket,
+                endpoint_url=endpoint,
+                access_key_id=args.access_key,
+                secret_access_key=args.secret_key,
+                multipart_threshold=part_mb * MB,
+                part_size=part_mb * MB,
+                max_concurrency=args.concurrency,
+                max_pool_connections=args.concurrency,
+            )
+            try:
+                storage.client.create_bucket(Bucket=args.bucket)
+            except storage.client.exceptions.ClientError:
+                pass
+            key = storage.object_key(source)
+
+            start = time.perf_counter()
+            with open(source, "rb") as f:
+                storage.upload_fileobj(f, key)
+            put_s = time.perf_counter() - start
+
+            with tempfile.TemporaryFile() as sink:
+                start = time.perf_counter()
+                storage.download_fileobj(key, sink)
+                get_s = time.perf_counter() - start
+            storage.delete(key)
+
+            print(f"  part {part_mb:>3} MB: put {args.size_mb / put_s:8.1f} MB/s, "
+                  f"get {args.size_mb / get_s:8.1f} MB/s")
+    finally:
+        os.remove(source)
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Check that `save_upload_file` memory stays flat as uploads grow.
+
+Feeds files of increasing size through `main.save_upload_file`, in chunks
+the way a multipart body arrives, and records the peak Python heap allocation (tracemalloc) and process RSS growth
+for each. Exits non-zero if peak memory grows with file size.
+
+    python benchmarks/save_upload_memory.py --sizes-mb 16 64 256 --chunk-kb 1024
+
+--chunk-kb is the block size written to disk; the body arrives in
+--receive-kb chunks (64 KB, as uvicorn delivers it, by default).
+"""
+import argparse
+import asyncio
+import os
+import resource
+import struct
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import save_upload_file  # noqa: E402
+
+MB = 1024 * 1024
+# ftyp plus an mdat running to the end of the file, so content sniffing
+# accepts the random payload as MP4
+MP4_HEADER = struct.pack(">I4s4sI4s", 20, b"ftyp", b"isom", 0x200, b"isom") + struct.pack(">I4s", 0, b"mdat")
+
+
+def make_source(size: int):
+    src = tempfile.TemporaryFile()
+    block = os.urandom(MB)
+    src.write(MP4_HEADER + block[len(MP4_HEADER):])
+    for _ in range(size // MB - 1):
+        src.write(block)
+    src.seek(0)
+    return src
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+async def receive(src, receive_size: int):
+    while chunk := src.read(receive_size):
+        yield chunk
+
+
+async def measure(size: int, chunk_size: int, receive_size: int):
+    src = make_source(size)
+    rss_before = current_rss()
+    tracemalloc.start()
+    path, _ = await save_upload_file(
+        "bench.mp4", "video/mp4", receive(src, receive_size), size, block_size=chunk_size
+    )
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = current_rss() - rss_before
+    src.close()
+    os.remove(path)
+    return peak, rss_growth
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--receive-kb", type=int, default=64)
+    args = parser.parse_args()
+    chunk_size = args.chunk_kb * 1024
+
+    peaks = []
+    for size_mb in args.sizes_mb:
+        peak, rss_growth = asyncio.run(measure(size_mb * MB, chunk_size, args.receive_kb * 1024))
+        peaks.append(peak)
+        print(f"{size_mb:>6} MB file: peak heap {peak / MB:7.2f} MB, "
+              f"RSS growth {rss_growth / MB:7.2f} MB")
+
+    # Peak should be a small multiple of the chunk size regardless of file size
+    budget = 4 * chunk_size
+    if max(peaks) > budget:
+        print(f"FAIL: peak heap {max(peaks) / MB:.2f} MB exceeds {budget / MB:.2f} MB")
+        sys.exit(1)
+    print(f"OK: peak heap within {budget / MB:.2f} MB for every size")
+
+
+if __name__ == "__main__":
+    main()
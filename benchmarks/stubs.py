@@ -0,0 +1,278 @@
+"""Local stand-ins for the services the uploader talks to, for benchmarks.
+
+- FakeYouTube: the parts of the YouTube Data API the app uses (resumable
+  videos.insert, thumbnails.set, videoCategories.list). Chunks are counted
+  and dropped; latency and 503s can be injected per chunk.
+- FakeOrigin: serves synthetic video files of any size with Range/ETag
+  support, as a source for URL uploads.
+- start_moto(): an in-process S3 server standing in for R2.
+- mongomock_services(): points `main.services` at an in-memory mongomock
+  database instead of MONGO_URI.
+
+The YouTube client keeps the https scheme of the upload URL even when the
+API endpoint is overridden, so FakeYouTube is served over TLS with a
+self-signed certificate (see self_signed_cert) that httplib2 is told to trust
+via HTTPLIB2_CA_CERTS.
+
+Needs `pip install "moto[server]" mongomock uvicorn` on top of requirements.txt.
+"""
+import asyncio
+import datetime
+import ipaddress
+import logging
+import os
+import random
+import re
+import socket
+import struct
+import threading
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+MB = 1024 * 1024
+
+
+# ─────────── Servers ────────────────────────────────────────────────────────────
+# Runs an ASGI app on a background thread; returns (server, base_url)
+def serve(app, certfile: str = None, keyfile: str = None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    config = uvicorn.Config(
+        app, log_level="warning", ssl_certfile=certfile, ssl_keyfile=keyfile,
+        timeout_keep_alive=30,
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    scheme = "https" if certfile else "http"
+    return server, f"{scheme}://127.0.0.1:{port}"
+
+
+def stop(server):
+    server.should_exit = True
+
+
+# Writes a self-signed certificate for 127.0.0.1 into `directory`
+def self_signed_cert(directory: str):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ski = x509.SubjectKeyIdentifier.from_public_key(key.public_key())
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(
+            x509.SubjectAlternativeName([
+                x509.IPAddress(ipaddress.ip_address("127.0.0.1")), x509.DNSName("localhost"),
+            ]),
+            critical=False,
+        )
+        .add_extension(ski, critical=False)
+        .add_extension(
+            x509.AuthorityKeyIdentifier.from_issuer_subject_key_identifier(ski), critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    with open(certfile, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+    return certfile, keyfile
+
+
+def start_moto():
+    from moto.server import ThreadedMotoServer
+
+    # moto logs every request through werkzeug
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    return server, f"http://{host}:{port}"
+
+
+# ─────────── YouTube ────────────────────────────────────────────────────────────
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+
+class FakeYouTube:
+    def __init__(self, chunk_latency: float = 0.0, error_rate: float = 0.0, seed: int = None):
+        self.chunk_latency = chunk_latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.sessions = {}
+        self.videos = 0
+        self.thumbnails = 0
+        self.bytes_received = 0
+        self.errors_injected = 0
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/upload/youtube/v3/videos", self.start_upload, methods=["POST"]),
+            Route("/upload/sessions/{sid}", self.put_chunk, methods=["PUT"]),
+            Route("/upload/youtube/v3/thumbnails/set", self.set_thumbnail, methods=["POST"]),
+            Route("/youtube/v3/videoCategories", self.categories, methods=["GET"]),
+        ])
+
+    async def start_upload(self, request: Request):
+        if request.query_params.get("uploadType") != "resumable":
+            return JSONResponse({"error": "only resumable uploads are faked"}, 400)
+        body = await request.json()
+        sid = uuid.uuid4().hex
+        self.sessions[sid] = {"received": 0, "snippet": body.get("snippet", {})}
+        return Response(headers={"Location": f"{request.base_url}upload/sessions/{sid}"})
+
+    async def put_chunk(self, request: Request):
+        session = self.sessions.get(request.path_params["sid"])
+        if session is None:
+            return JSONResponse({"error": "session expired"}, 404)
+        match = CONTENT_RANGE.fullmatch(request.headers.get("Content-Range", ""))
+        if not match:
+            return JSONResponse({"error": "bad Content-Range"}, 400)
+        first, _, total = match.groups()
+        total = None if total == "*" else int(total)
+
+        if self.chunk_latency:
+            await asyncio.sleep(self.chunk_latency)
+        if first is not None and self.error_rate and self.random.random() < self.error_rate:
+            await request.body()
+            self.errors_injected += 1
+            return JSONResponse({"error": "backend error"}, 503)
+
+        pos = int(first) if first is not None else session["received"]
+        if pos > session["received"]:
+            return JSONResponse({"error": "chunk past the end of the upload"}, 400)
+        async for data in request.stream():
+            # Bytes YouTube already holds (a resent chunk) don't count again
+            new = max(pos + len(data) - session["received"], 0)
+            session["received"] += new
+            self.bytes_received += new
+            pos += len(data)
+
+        received = session["received"]
+        if total is not None and received >= total:
+            self.videos += 1
+            return JSONResponse({
+                "id": request.path_params["sid"][:11],
+                "snippet": session["snippet"],
+                "status": {"uploadStatus": "uploaded"},
+            })
+        headers = {"Range": f"bytes=0-{received - 1}"} if received else {}
+        return Response(status_code=308, headers=headers)
+
+    async def set_thumbnail(self, request: Request):
+        await request.body()
+        self.thumbnails += 1
+        return JSONResponse({"items": [{"default": {"url": "https://i.ytimg.com/fake.jpg"}}]})
+
+    async def categories(self, request: Request):
+        return JSONResponse({"items": [
+            {"id": "22", "snippet": {"title": "People & Blogs", "assignable": True}},
+        ]})
+
+
+# Smallest header that passes validation: an ftyp box and an mdat box running
+# to the end of the file
+MP4_HEADER = struct.pack(">I4s4sI4s", 20, b"ftyp", b"isom", 0x200, b"isom") + struct.pack(">I4s", 0, b"mdat")
+
+
+# ─────────── Source origin ─────────────────────────────────────────────────────
+# GET /videos/<name>?size=<bytes> returns that many bytes of a repeating
+# random block behind an MP4 header (so content sniffing accepts it); every
+# name yields distinct content.
+class FakeOrigin:
+    def __init__(self, block_size: int = MB):
+        self.block_size = block_size
+        self.bytes_served = 0
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[Route("/videos/{name}", self.video, methods=["GET"])])
+
+    def _block(self, name: str) -> bytes:
+        return MP4_HEADER + random.Random(name).randbytes(self.block_size - len(MP4_HEADER))
+
+    async def video(self, request: Request):
+        name = request.path_params["name"]
+        size = int(request.query_params.get("size", str(MB)))
+        etag = f'"{name}-{size}"'
+        start, end, status = 0, size, 200
+        range_header = request.headers.get("Range")
+        if_range = request.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == etag):
+            match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header)
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)) + 1, size) if match.group(2) else size
+                status = 206
+        headers = {
+            "Content-Length": str(end - start),
+            "ETag": etag,
+            "Accept-Ranges": "bytes",
+        }
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+        block = memoryview(self._block(name))
+
+        async def body():
+            pos = start
+            while pos < end:
+                offset = pos % self.block_size
+                data = block[offset:offset + min(self.block_size - offset, end - pos)]
+                pos += len(data)
+                self.bytes_served += len(data)
+                yield bytes(data)
+
+        return StreamingResponse(body(), status_code=status, headers=headers, media_type="video/mp4")
+
+
+# ─────────── Mongo ─────────────────────────────────────────────────────────────
+# Async face over a mongomock collection, for the code paths that use the
+# async driver (the token store)
+class AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+# Replaces the Mongo clients on `services` (a main.Services) with mongomock
+def mongomock_services(services, db_name: str):
+    import mongomock
+
+    from token_store import TokenStore
+
+    services.mongo = mongomock.MongoClient()
+    services.token_store = TokenStore(AsyncCollection(services.mongo[db_name]["tokens"]))
+    return services.mongo[db_name]
@@ -0,0 +1,98 @@
+"""Measure bytes saved and end-to-end time of the transcode stage.
+
+Generates synthetic high-bitrate sources with ffmpeg (MJPEG/PCM in AVI,
+near-lossless H.264/PCM in MKV and MOV), then sends each one to a sink
+throttled to --uplink-mbps, once as-is and once through each transcode
+profile. The transcoded output is read from the ffmpeg pipe while it is
+produced, the way the upload reads it, so the end-to-end time covers
+transcoding and sending together.
+
+    python benchmarks/transcode.py --seconds 20 --size 1280x720 --uplink-mbps 100
+    python benchmarks/transcode.py --ffmpeg /usr/local/bin/ffmpeg --profiles remux
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcode import TRANSCODE_PROFILES, Transcoder  # noqa: E402
+
+MB = 1024 * 1024
+CHUNK = 8 * MB
+
+SOURCES = {
+    "mjpeg.avi": ["-c:v", "mjpeg", "-q:v", "2", "-c:a", "pcm_s16le"],
+    "h264-crf12.mkv": ["-c:v", "libx264", "-preset", "ultrafast", "-crf", "12", "-c:a", "pcm_s16le"],
+    "h264-crf12.mov": ["-c:v", "libx264", "-preset", "ultrafast", "-crf", "12", "-c:a", "pcm_s16le"],
+}
+
+
+def make_source(ffmpeg: str, directory: str, name: str, seconds: int, size: str) -> str:
+    path = os.path.join(directory, name)
+    subprocess.run(
+        [
+            ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=30:duration={seconds}",
+            "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+            *SOURCES[name], "-shortest", path,
+        ],
+        check=True,
+    )
+    return path
+
+
+# Reads `stream` to the end in upload-sized chunks, pacing to `rate` bytes/s
+def send(stream, rate: float) -> int:
+    sent = 0
+    start = time.perf_counter()
+    while data := stream.read(CHUNK):
+        sent += len(data)
+        ahead = sent / rate - (time.perf_counter() - start)
+        if ahead > 0:
+            time.sleep(ahead)
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ffmpeg", default="ffmpeg")
+    parser.add_argument("--seconds", type=int, default=20)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument("--profiles", nargs="+", choices=TRANSCODE_PROFILES, default=list(TRANSCODE_PROFILES))
+    parser.add_argument("--uplink-mbps", type=float, default=100, help="simulated upload bandwidth")
+    parser.add_argument("--video-bitrate", default="4M")
+    args = parser.parse_args()
+
+    transcoder = Transcoder(ffmpeg=args.ffmpeg, max_processes=1, video_bitrate=args.video_bitrate)
+    if not transcoder.available():
+        sys.exit(f"{args.ffmpeg} not found; pass --ffmpeg")
+    rate = args.uplink_mbps * 1e6 / 8
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.seconds}s of {args.size} per source, uplink {args.uplink_mbps:g} Mbit/s\n")
+        print(f"{'source':>16} {'profile':>8} {'MB sent':>9} {'saved':>7} {'e2e s':>7} {'speedup':>8}")
+        for name in args.sources:
+            path = make_source(args.ffmpeg, directory, name, args.seconds, args.size)
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                original = send(f, rate)
+            baseline = time.perf_counter() - start
+            print(f"{name:>16} {'none':>8} {original / MB:9.1f} {'':>7} {baseline:7.2f} {'':>8}")
+            for profile in args.profiles:
+                start = time.perf_counter()
+                with transcoder.open(path, profile) as output:
+                    sent = send(output, rate)
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{'':>16} {profile:>8} {sent / MB:9.1f} {1 - sent / original:7.1%} "
+                    f"{elapsed:7.2f} {baseline / elapsed:7.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Load-test `/upload/` end to end against local stand-ins.
+
+Starts a fake YouTube API (TLS), a fake source origin, an in-process moto
+S3 server for R2 and, per scenario, a fresh uvicorn process running the app
+with its Mongo clients pointed at mongomock (or --mongo-uri). Each scenario
+submits --uploads uploads of one size and type, --concurrency at a time,
+follows every job to completion through GET /jobs/{id}, and reports:
+
+    uploads/s   finished uploads per second of wall time
+    MB/s        video bytes delivered to the fake YouTube per second
+    submit      p50/p99 latency of the POST /upload/ request
+    e2e         p50/p99 latency from submit to the job finishing
+    peak RSS    high-water mark of the app process
+
+Types: `local` (multipart file), `url-stream` and `url-staged` (URL sources
+with URL_UPLOAD_MODE=stream/staged).
+
+    python benchmarks/upload_load.py --types local url-stream url-staged \\
+        --sizes-mb 8 64 --uploads 16 --concurrency 4 --json results.json
+
+Needs `pip install "moto[server]" mongomock uvicorn` on top of requirements.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+# The app's modules must win over benchmark scripts of the same name
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+from stubs import (  # noqa: E402
+    MB, MP4_HEADER, FakeOrigin, FakeYouTube, mongomock_services, self_signed_cert, serve,
+    start_moto, stop,
+)
+
+TYPES = ("local", "url-stream", "url-staged")
+BUCKET = "bench-videos"
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+# ─────────── App process ─────────────────────────────────────────────────────
+# Entry point of the per-scenario app process (--serve-app)
+def serve_app(port: int, users: int, oauth_clients: int):
+    import uvicorn
+
+    import main
+
+    if not os.getenv("MONGO_URI"):
+        mongomock_services(main.services, main.MONGO_DB)
+    tokens = main.services.mongo[main.MONGO_DB]["tokens"]
+    expiry = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    grant = {"access_token": "bench-token", "refresh_token": "bench-refresh", "token_expiry": expiry}
+    for n in range(users):
+        # Every user has authorized every OAuth client
+        tokens.update_one(
+            {"user_id": f"bench-user-{n}"},
+            {"$set": {
+                "email": f"bench-{n}@example.com",
+                **grant,
+                **{f"grants.bench{c}": grant for c in range(1, oauth_clients)},
+            }},
+            upsert=True,
+        )
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(env: dict, users: int, oauth_clients: int):
+    port = free_port()
+    proc = subprocess.Popen(
+        [
+            sys.executable, os.path.abspath(__file__), "--serve-app", str(port),
+            "--users", str(users), "--oauth-clients", str(oauth_clients),
+        ],
+        env=env,
+        cwd=ROOT,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited during startup ({proc.returncode})")
+        try:
+            if httpx.get(f"{base}/", timeout=1).status_code == 200:
+                return proc, base
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("App did not start within 60s")
+
+
+# Stops the app and returns its peak RSS in MB
+def stop_app(proc) -> float:
+    proc.send_signal(signal.SIGINT)
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        return float("nan")
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return usage.ru_maxrss / (MB if sys.platform == "darwin" else 1024)
+
+
+# ─────────── Load ─────────────────────────────────────────────────────────────
+def make_file(directory: str, size: int) -> str:
+    path = os.path.join(directory, f"source-{size}.mp4")
+    if not os.path.exists(path):
+        block = MP4_HEADER + os.urandom(MB - len(MP4_HEADER))
+        with open(path, "wb") as f:
+            for _ in range(size // MB):
+                f.write(block)
+            f.write(block[:size % MB])
+    return path
+
+
+async def run_upload(client, n: int, kind: str, size: int, source, users: int, poll: float):
+    form = {
+        "upload_type": "local" if kind == "local" else "url",
+        "title": f"bench {n}",
+        "description": "load test",
+        "tags": ["bench"],
+        "category_id": "22",
+        "privacy_status": "private",
+        "email": f"bench-{n % users}@example.com",
+    }
+    start = time.perf_counter()
+    if kind == "local":
+        with open(source, "rb") as f:
+            resp = await client.post(
+                "/upload/", data=form, files={"file": ("bench.mp4", f, "video/mp4")}
+            )
+    else:
+        form["video_url"] = f"{source}/videos/bench-{n}.mp4?size={size}"
+        resp = await client.post("/upload/", data=form)
+    submitted = time.perf_counter()
+    if resp.status_code != 202:
+        return {"ok": False, "submit": submitted - start, "error": f"{resp.status_code} {resp.text[:200]}"}
+    job_id = resp.json()["job_id"]
+    while True:
+        await asyncio.sleep(poll)
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+    return {
+        "ok": job["status"] == "succeeded",
+        "submit": submitted - start,
+        "e2e": time.perf_counter() - start,
+        "error": job.get("error"),
+    }
+
+
+async def drive(base: str, kind: str, size: int, source, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base, timeout=None, limits=limits) as client:
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def one(n: int):
+            async with slots:
+                return await run_upload(client, n, kind, size, source, args.users, args.poll)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(n) for n in range(args.uploads)))
+        wall = time.perf_counter() - start
+    ok = [r for r in results if r["ok"]]
+    return {
+        "wall_s": wall,
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": sorted({str(r["error"]) for r in results if not r["ok"]})[:3],
+        "uploads_per_s": len(ok) / wall,
+        "submit_p50_s": percentile([r["submit"] for r in results], 50),
+        "submit_p99_s": percentile([r["submit"] for r in results], 99),
+        "e2e_p50_s": percentile([r["e2e"] for r in ok], 50),
+        "e2e_p99_s": percentile([r["e2e"] for r in ok], 99),
+    }
+
+
+def app_env(args, kind: str, r2_endpoint: str, youtube_url: str, certfile: str, scratch: str):
+    env = dict(os.environ)
+    env.update({
+        "LOG_LEVEL": "WARNING",
+        "PYTHONPATH": os.pathsep.join(filter(None, [BENCH_DIR, env.get("PYTHONPATH")])),
+        "YOUTUBE_API_ENDPOINT": f"{youtube_url}/",
+        "HTTPLIB2_CA_CERTS": certfile,
+        "GOOGLE_CLIENT_ID": "bench",
+        "GOOGLE_CLIENT_SECRET": "bench",
+        "R2_ENDPOINT_URL": r2_endpoint,
+        "R2_BUCKET_NAME": BUCKET,
+        "R2_ACCESS_KEY_ID": "bench",
+        "R2_SECRET_ACCESS_KEY": "bench",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "SCRATCH_DIR": scratch,
+        # Every upload is new content to YouTube, and nothing waits on quota
+        "DEDUP_POLICY": "off",
+        "QUOTA_DAILY_LIMIT": str(10 ** 12),
+        "UPLOAD_MAX_PER_USER": "0",
+        "UPLOAD_WORKERS": str(args.workers),
+        "UPLOAD_WORKER_CONCURRENCY": str(args.worker_concurrency),
+        "UPLOAD_CHUNK_SIZE": str(args.chunk_mb * MB),
+        "JOB_POLL_INTERVAL": "0.1",
+        "OAUTH_CLIENTS": json.dumps([
+            {"name": f"bench{c}", "client_id": f"bench-{c}", "client_secret": "bench"}
+            for c in range(1, args.oauth_clients)
+        ]),
+    })
+    if kind != "local":
+        env["URL_UPLOAD_MODE"] = kind.split("-", 1)[1]
+    if args.mongo_uri:
+        env["MONGO_URI"] = args.mongo_uri
+    else:
+        env.pop("MONGO_URI", None)
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--types", nargs="+", choices=TYPES, default=list(TYPES))
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[8, 64])
+    parser.add_argument("--uploads", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--worker-concurrency", type=int, default=2)
+    parser.add_argument("--chunk-mb", type=int, default=8, help="UPLOAD_CHUNK_SIZE in MiB")
+    parser.add_argument("--youtube-latency-ms", type=float, default=0, help="added per chunk")
+    parser.add_argument("--youtube-error-rate", type=float, default=0, help="share of chunks answered 503")
+    parser.add_argument("--poll", type=float, default=0.05, help="job status poll interval (s)")
+    parser.add_argument("--oauth-clients", type=int, default=1, help="OAuth clients to route uploads across")
+    parser.add_argument("--mongo-uri", help="use this MongoDB instead of mongomock")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--serve-app", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args.serve_app, args.users, args.oauth_clients)
+        return
+
+    import boto3
+
+    workdir = tempfile.mkdtemp(prefix="upload-load-")
+    certfile, keyfile = self_signed_cert(workdir)
+    youtube = FakeYouTube(args.youtube_latency_ms / 1000, args.youtube_error_rate, seed=0)
+    youtube_server, youtube_url = serve(youtube.app(), certfile, keyfile)
+    origin_server, origin_url = serve(FakeOrigin().app())
+    moto, r2_endpoint = start_moto()
+    boto3.client(
+        "s3", endpoint_url=r2_endpoint, region_name="us-east-1",
+        aws_access_key_id="bench", aws_secret_access_key="bench",
+    ).create_bucket(Bucket=BUCKET)
+
+    results = []
+    try:
+        for kind in args.types:
+            for size_mb in args.sizes_mb:
+                size = size_mb * MB
+                scratch = tempfile.mkdtemp(dir=workdir)
+                env = app_env(args, kind, r2_endpoint, youtube_url, certfile, scratch)
+                source = make_file(workdir, size) if kind == "local" else origin_url
+                received = youtube.bytes_received
+                proc, base = start_app(env, args.users, args.oauth_clients)
+                try:
+                    result = asyncio.run(drive(base, kind, size, source, args))
+                finally:
+                    peak_rss = stop_app(proc)
+                result.update({
+                    "type": kind,
+                    "size_mb": size_mb,
+                    "uploads": args.uploads,
+                    "concurrency": args.concurrency,
+                    "mb_per_s": (youtube.bytes_received - received) / MB / result["wall_s"],
+                    "peak_rss_mb": peak_rss,
+                })
+                results.append(result)
+                print(
+                    f"{kind:>10} {size_mb:5d} MB  ok {result['ok']:3d}/{args.uploads:<3d} "
+                    f"{result['uploads_per_s']:7.2f} uploads/s {result['mb_per_s']:8.1f} MB/s  "
+                    f"submit p50 {result['submit_p50_s'] * 1000:7.1f} ms p99 {result['submit_p99_s'] * 1000:7.1f} ms  "
+                    f"e2e p50 {result['e2e_p50_s']:6.2f} s p99 {result['e2e_p99_s']:6.2f} s  "
+                    f"peak RSS {peak_rss:6.1f} MB"
+                )
+                for error in result["errors"]:
+                    print(f"{'':>12}error: {error}")
+    finally:
+        stop(youtube_server)
+        stop(origin_server)
+        moto.stop()
+
+    print(f"\nfake YouTube: {youtube.videos} videos, {youtube.errors_injected} injected errors")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if any(r["failed"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Check and time the header sniffing in validation.py against a fixture corpus.
+
+The corpus is built in memory: well-formed MP4/MOV (faststart and
+moov-at-end, 32- and 64-bit boxes), Matroska/WebM (known and unknown segment
+size) and AVI headers, plus inputs that must be rejected (other formats,
+truncated or malformed containers, over-long videos). With --ffmpeg, short
+real files encoded by ffmpeg are added too. Every fixture's verdict is
+checked first (the script exits non-zero on a mismatch), then parse time per
+header and the per-chunk cost of HeaderValidator on a streamed upload are
+reported.
+
+    python benchmarks/validation.py
+    python benchmarks/validation.py --ffmpeg ffmpeg --iterations 20000
+    python benchmarks/validation.py --write /tmp/corpus   # dump the fixtures
+"""
+import argparse
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from validation import HEADER_BYTES, HeaderValidator, InvalidVideo, validate_head  # noqa: E402
+
+MB = 1024 * 1024
+MAX_DURATION = 12 * 3600
+REJECT = "reject"
+
+
+# ─────────── Fixture builders ─────────────────────────────────────────────────
+def box(kind: bytes, payload: bytes = b"", size: int = None) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload) if size is None else size, kind) + payload
+
+
+def large_box(kind: bytes, payload: bytes, size: int) -> bytes:
+    return struct.pack(">I4sQ", 1, kind, size) + payload
+
+
+def ftyp(brand: bytes) -> bytes:
+    return box(b"ftyp", brand + struct.pack(">I", 0x200) + b"isomiso2mp41")
+
+
+def mvhd(seconds: float, version: int = 0, timescale: int = 1000) -> bytes:
+    duration = int(seconds * timescale)
+    if version == 1:
+        body = struct.pack(">B3xQQIQ", 1, 0, 0, timescale, duration)
+    else:
+        body = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration)
+    return box(b"mvhd", body + bytes(80))
+
+
+def mp4(seconds: float, brand: bytes = b"isom", moov_first: bool = True, version: int = 0) -> bytes:
+    moov = box(b"moov", mvhd(seconds, version) + box(b"trak", bytes(64)))
+    media = box(b"mdat", bytes(4096), size=50 * MB)
+    parts = [ftyp(brand), moov, media] if moov_first else [ftyp(brand), media]
+    return b"".join(parts)
+
+
+def ebml_id(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+def ebml_size(size: int = None) -> bytes:
+    if size is None:
+        return b"\x01\xff\xff\xff\xff\xff\xff\xff"  # unknown
+    return (size | 1 << 56).to_bytes(8, "big")
+
+
+def element(value: int, payload: bytes, size: int = -1) -> bytes:
+    return ebml_id(value) + ebml_size(len(payload) if size == -1 else size) + payload
+
+
+def matroska(doctype: bytes, seconds: float, unknown_size: bool = False) -> bytes:
+    header = element(0x1A45DFA3, element(0x4286, b"\x01") + element(0x4282, doctype))
+    info = element(0x1549A966, element(0x2AD7B1, (1_000_000).to_bytes(3, "big"))
+                   + element(0x4489, struct.pack(">d", seconds * 1000)))
+    children = element(0xEC, bytes(32)) + info + element(0x1F43B675, bytes(4096))
+    return header + element(0x18538067, children, None if unknown_size else 50 * MB)
+
+
+def avi(seconds: float, fps: int = 25) -> bytes:
+    avih = struct.pack("<10I", 1_000_000 // fps, 0, 0, 0, int(seconds * fps), 0, 1, 0, 1280, 720)
+    avih = b"avih" + struct.pack("<I", 56) + avih + bytes(16)
+    hdrl = b"LIST" + struct.pack("<I", 4 + len(avih)) + b"hdrl" + avih
+    return b"RIFF" + struct.pack("<I", 50 * MB) + b"AVI " + hdrl + bytes(4096)
+
+
+# name -> (bytes, expected container or REJECT, expected duration or None)
+def corpus() -> dict:
+    return {
+        "mp4-faststart": (mp4(95), "mp4", 95),
+        "mp4-moov-at-end": (mp4(95, moov_first=False), "mp4", None),
+        "mp4-mvhd-v1": (mp4(3600, version=1), "mp4", 3600),
+        "mp4-largesize-mdat": (
+            ftyp(b"mp42") + large_box(b"mdat", bytes(4096), 5 * 1024 * MB), "mp4", None,
+        ),
+        "mov-qt-brand": (mp4(30, brand=b"qt  "), "mov", 30),
+        "mov-legacy-no-ftyp": (box(b"wide") + box(b"mdat", bytes(4096), size=MB), "mov", None),
+        "mkv": (matroska(b"matroska", 125), "matroska", 125),
+        "mkv-unknown-size": (matroska(b"matroska", 10, unknown_size=True), "matroska", 10),
+        "webm": (matroska(b"webm", 42), "webm", 42),
+        "avi": (avi(60), "avi", 60),
+        "reject-too-long-mp4": (mp4(13 * 3600), REJECT, None),
+        "reject-too-long-mkv": (matroska(b"webm", 24 * 3600), REJECT, None),
+        "reject-png": (b"\x89PNG\r\n\x1a\n" + box(b"IHDR", bytes(13)) + bytes(1024), REJECT, None),
+        "reject-zip": (b"PK\x03\x04" + bytes(2048), REJECT, None),
+        "reject-html": (b"<!DOCTYPE html><html><body>Not found</body></html>", REJECT, None),
+        "reject-json": (b'{"error": {"code": 403, "message": "Forbidden"}}', REJECT, None),
+        "reject-wav": (b"RIFF" + struct.pack("<I", 4096) + b"WAVEfmt " + bytes(4096), REJECT, None),
+        "reject-empty": (b"", REJECT, None),
+        "reject-truncated": (ftyp(b"isom")[:10], REJECT, None),
+        "reject-bad-box-size": (box(b"ftyp", b"isom", size=4) + bytes(64), REJECT, None),
+        "reject-ebml-doctype": (element(0x1A45DFA3, element(0x4282, b"foo")) + bytes(64), REJECT, None),
+        "reject-random": (os.urandom(HEADER_BYTES), REJECT, None),
+    }
+
+
+FFMPEG_SAMPLES = {
+    "ffmpeg.mp4": (["-c:v", "libx264", "-movflags", "+faststart"], "mp4"),
+    "ffmpeg-moov-at-end.mp4": (["-c:v", "libx264"], "mp4"),
+    "ffmpeg.mov": (["-c:v", "libx264"], "mov"),
+    "ffmpeg.mkv": (["-c:v", "libx264"], "matroska"),
+    "ffmpeg.webm": (["-c:v", "libvpx", "-deadline", "realtime"], "webm"),
+    "ffmpeg.avi": (["-c:v", "mjpeg"], "avi"),
+}
+
+
+def ffmpeg_corpus(ffmpeg: str, directory: str, seconds: int = 3) -> dict:
+    samples = {}
+    for name, (codec, container) in FFMPEG_SAMPLES.items():
+        path = os.path.join(directory, name)
+        subprocess.run(
+            [
+                ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "lavfi", "-i", f"testsrc2=size=320x240:rate=25:duration={seconds}",
+                *codec, path,
+            ],
+            check=True,
+        )
+        with open(path, "rb") as f:
+            # Files without a duration in the header (moov at the end) report None
+            samples[name] = (f.read(HEADER_BYTES), container, "any")
+    return samples
+
+
+# ─────────── Checks and timings ─────────────────────────────────────────────────
+def verdict(data: bytes):
+    try:
+        header = validate_head(data[:HEADER_BYTES], max_duration=MAX_DURATION)
+    except InvalidVideo as exc:
+        return REJECT, None, str(exc)
+    return header.container, header.duration, ""
+
+
+def check(fixtures: dict) -> bool:
+    ok = True
+    print(f"{'fixture':>24} {'expected':>9} {'got':>9} {'duration':>9}  detail")
+    for name, (data, container, duration) in fixtures.items():
+        got, got_duration, detail = verdict(data)
+        passed = got == container and (
+            duration in (None, "any") and (duration == "any" or got_duration is None)
+            or got_duration is not None and abs(got_duration - duration) < 0.05
+        )
+        ok &= passed
+        shown = "" if got_duration is None else f"{got_duration:.1f}"
+        print(f"{name:>24} {container:>9} {got:>9} {shown:>9}  {'' if passed else 'MISMATCH '}{detail}")
+    return ok
+
+
+def time_parsing(fixtures: dict, iterations: int):
+    print(f"\n{'fixture':>24} {'us/header':>10}")
+    for name, (data, _, _) in fixtures.items():
+        head = data[:HEADER_BYTES]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            verdict(head)
+        print(f"{name:>24} {(time.perf_counter() - start) / iterations * 1e6:10.2f}")
+
+
+# The cost the validator adds to a streamed upload read in `chunk`-sized pieces
+def time_stream(size: int, chunk: int):
+    data = mp4(600) + bytes(chunk)
+    chunks = [data[:chunk]] + [bytes(chunk)] * (size // chunk - 1)
+    start = time.perf_counter()
+    for _ in chunks:
+        pass
+    baseline = time.perf_counter() - start
+    start = time.perf_counter()
+    validator = HeaderValidator(max_bytes=2 * size, max_duration=MAX_DURATION)
+    for piece in chunks:
+        validator.feed(piece)
+    validator.finish()
+    elapsed = time.perf_counter() - start - baseline
+    print(
+        f"\nstream of {size // MB} MB in {chunk // 1024} KB chunks: "
+        f"{elapsed * 1e3:.2f} ms total, {elapsed / len(chunks) * 1e6:.2f} us/chunk"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--ffmpeg", help="also encode real samples with this ffmpeg")
+    parser.add_argument("--stream-mb", type=int, default=1024)
+    parser.add_argument("--chunk-kb", type=int, default=1024)
+    parser.add_argument("--write", metavar="DIR", help="write the fixtures to DIR and exit")
+    args = parser.parse_args()
+
+    fixtures = corpus()
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+        for name, (data, _, _) in fixtures.items():
+            with open(os.path.join(args.write, name), "wb") as f:
+                f.write(data[:HEADER_BYTES])
+        print(f"Wrote {len(fixtures)} fixtures to {args.write}")
+        return
+    if args.ffmpeg:
+        if not shutil.which(args.ffmpeg):
+            sys.exit(f"{args.ffmpeg} not found")
+        with tempfile.TemporaryDirectory() as directory:
+            fixtures.update(ffmpeg_corpus(args.ffmpeg, directory))
+
+    ok = check(fixtures)
+    time_parsing(fixtures, args.iterations)
+    time_stream(args.stream_mb * MB, args.chunk_kb * 1024)
+    if not ok:
+        sys.exit("Some fixtures got the wrong verdict")
+
+
+if __name__ == "__main__":
+    main()
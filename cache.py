@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from cachetools import LRUCache
+
+from executor import run_blocking
+
+logger = logging.getLogger("uvicorn.error")
+
+# A backend stores (value, stored_at) pairs. Implement get/set to plug in a
+# shared store; values must be JSON/BSON-serialisable for non-memory backends.
+Entry = Tuple[Any, float]
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int = 1024):
+        self._data: LRUCache = LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> Optional[Entry]:
+        return self._data.get(key)
+
+    async def set(self, key: str, value: Any, stored_at: float):
+        self._data[key] = (value, stored_at)
+
+
+# Shares entries between processes/nodes through a Mongo collection
+class MongoBackend:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, key: str) -> Optional[Entry]:
+        doc = await run_blocking(self.collection.find_one, {"_id": key})
+        return (doc["value"], doc["stored_at"]) if doc else None
+
+    async def set(self, key: str, value: Any, stored_at: float):
+        await run_blocking(
+            self.collection.replace_one,
+            {"_id": key},
+            {"_id": key, "value": value, "stored_at": stored_at},
+            upsert=True,
+        )
+
+
+# TTL cache with stale-while-revalidate and request coalescing: fresh entries
+# are served directly, stale ones are served while a single background
+# refresh runs, and concurrent misses for a key share one upstream fetch.
+class SWRCache:
+    def __init__(self, ttl: float, stale_ttl: float = 0, backend=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend or MemoryBackend()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        entry = await self.backend.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < self.ttl:
+                return value
+            if age < self.ttl + self.stale_ttl:
+                if key not in self._inflight:
+                    self._fetch(key, fetch).add_done_callback(self._log_refresh_error)
+                return value
+        return await asyncio.shield(self._fetch(key, fetch))
+
+    def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return fut
+
+    async def _load(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        await self.backend.set(key, value, time.time())
+        return value
+
+    @staticmethod
+    def _log_refresh_error(fut: asyncio.Future):
+        if not fut.cancelled() and fut.exception() is not None:
+            logger.warning(f"Background cache refresh failed: {fut.exception()}")
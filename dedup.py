@@ -0,0 +1,97 @@
+import hashlib
+from typing import Iterable, Optional, Set
+
+from pymongo import ASCENDING
+
+from jobs import utcnow
+
+# Dedup policies: "off" skips hashing lookups entirely, "record" only indexes
+# uploads, "reuse" also short-circuits duplicates to the existing video id.
+DEDUP_POLICIES = ("off", "record", "reuse")
+
+
+# File-like wrapper that hashes everything read through it
+class HashingReader:
+    def __init__(self, stream):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self._hash.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def sha256_file(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Index of content hash / source URL -> uploaded video, per user
+class UploadIndex:
+    def __init__(self, collection, policy: str = "reuse"):
+        if policy not in DEDUP_POLICIES:
+            raise ValueError(f"Unknown dedup policy {policy!r}; use one of {DEDUP_POLICIES}")
+        self.collection = collection
+        self.policy = policy
+
+    def ensure_indexes(self):
+        self.collection.create_index(
+            [("user_id", ASCENDING), ("sha256", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"sha256": {"$type": "string"}},
+        )
+        self.collection.create_index([("user_id", ASCENDING), ("source_url", ASCENDING)])
+        self.collection.create_index(
+            [("r2_key", ASCENDING)], partialFilterExpression={"r2_key": {"$type": "string"}}
+        )
+
+    def find_duplicate(
+        self, user_id: str, sha256: Optional[str] = None, source_url: Optional[str] = None
+    ) -> Optional[dict]:
+        if self.policy != "reuse" or not (sha256 or source_url):
+            return None
+        query = {"user_id": user_id}
+        query.update({"sha256": sha256} if sha256 else {"source_url": source_url})
+        return self.collection.find_one(query, sort=[("created_at", -1)])
+
+    # R2 objects kept on purpose (archived sources) among `keys`
+    def referenced_keys(self, keys: Iterable[str]) -> Set[str]:
+        keys = list(keys)
+        if not keys:
+            return set()
+        return {
+            doc["r2_key"]
+            for doc in self.collection.find({"r2_key": {"$in": keys}}, {"r2_key": 1})
+        }
+
+    def record(
+        self,
+        user_id: str,
+        video_id: str,
+        sha256: Optional[str] = None,
+        source_url: Optional[str] = None,
+        r2_key: Optional[str] = None,
+    ):
+        if self.policy == "off" or not (sha256 or source_url):
+            return
+        doc = {
+            "user_id": user_id,
+            "video_id": video_id,
+            "sha256": sha256,
+            "source_url": source_url,
+            "r2_key": r2_key,
+            "created_at": utcnow(),
+        }
+        if sha256:
+            self.collection.replace_one({"user_id": user_id, "sha256": sha256}, doc, upsert=True)
+        else:
+            self.collection.insert_one(doc)
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+
+# In-process pub/sub for upload progress. Publishing never blocks: each
+# subscriber has a small bounded queue and a slow consumer simply loses its
+# oldest undelivered events, so it can never slow down the upload itself.
+# publish() may be called from worker threads.
+class ProgressBroker:
+    def __init__(self, queue_size: int = 32):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._latest: Dict[str, dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def publish(self, job_id: str, event: dict):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(job_id, event)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, job_id, event)
+
+    def _deliver(self, job_id: str, event: dict):
+        if event.get("type") == "status" and event.get("final"):
+            self._latest.pop(job_id, None)
+        else:
+            self._latest[job_id] = event
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def subscribe(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[job_id].add(queue)
+        try:
+            if job_id in self._latest:
+                yield self._latest[job_id]
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None  # lets the caller send a keep-alive / re-check
+        finally:
+            self._subscribers[job_id].discard(queue)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+
+def sse_message(event: dict) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+# Turns byte counts from one pipeline phase into throttled progress events
+# with throughput and ETA.
+class ProgressTracker:
+    def __init__(
+        self,
+        publish: Callable[[dict], None],
+        phase: str,
+        total: Optional[int] = None,
+        min_interval: float = 0.5,
+    ):
+        self.publish = publish
+        self.phase = phase
+        self.total = total
+        self.min_interval = min_interval
+        self.done = 0
+        self._started = time.monotonic()
+        self._last_sent = 0.0
+        self._lock = threading.Lock()
+
+    # boto3 transfer callbacks report increments from several threads
+    def add(self, nbytes: int):
+        with self._lock:
+            self.done += nbytes
+            done = self.done
+        self.update(done)
+
+    def update(self, done: int, total: Optional[int] = None, force: bool = False):
+        self.done = done
+        if total is not None:
+            self.total = total
+        now = time.monotonic()
+        if not force and now - self._last_sent < self.min_interval:
+            return
+        self._last_sent = now
+        elapsed = max(now - self._started, 1e-6)
+        throughput = done / elapsed
+        eta = None
+        if self.total and throughput > 0:
+            eta = max(self.total - done, 0) / throughput
+        self.publish({
+            "type": "progress",
+            "phase": self.phase,
+            "bytes": done,
+            "total": self.total,
+            "percent": round(done * 100 / self.total, 1) if self.total else None,
+            "throughput_bps": round(throughput),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        })
@@ -0,0 +1,67 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Sized pool for blocking SDK calls (pymongo, boto3, requests, googleapiclient).
+# Every upload holds a thread for its whole resumable loop, so size this to at
+# least UPLOAD_WORKERS * UPLOAD_WORKER_CONCURRENCY plus headroom for requests.
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "32"))
+
+blocking_pool = ThreadPoolExecutor(
+    max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking"
+)
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        blocking_pool, functools.partial(fn, *args, **kwargs)
+    )
+
+
+def shutdown_blocking_pool():
+    blocking_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Worker processes for CPU-bound work (image processing) that would otherwise
+# hold the GIL in the API process. Started on first use, not at import. By
+# then the process runs threads (blocking pool, pymongo monitors), which a
+# forked child could deadlock on, so workers come from a forkserver (spawn
+# where that isn't available).
+PROCESS_POOL_SIZE = int(os.getenv("PROCESS_POOL_SIZE", "2"))
+PROCESS_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_SIZE,
+                mp_context=multiprocessing.get_context(PROCESS_START_METHOD),
+            )
+        return _process_pool
+
+
+async def run_in_process(fn: Callable[..., T], *args) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(process_pool(), fn, *args)
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
@@ -0,0 +1,137 @@
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Text fields are held in memory, so they are kept small
+MAX_FIELD_BYTES = 1024 * 1024
+MAX_PARTS = 1000
+
+
+class FormError(Exception):
+    pass
+
+
+# One part of a multipart body. Its data is read chunk by chunk as it
+# arrives; moving on to the next part skips whatever is left unread.
+class FormPart:
+    def __init__(self, reader: "MultipartReader", headers: Dict[str, str]):
+        self._reader = reader
+        self.headers = headers
+        _, params = parse_options_header(headers.get("content-disposition"))
+        self.name = params.get(b"name", b"").decode("utf-8", "replace")
+        filename = params.get(b"filename")
+        self.filename = None if filename is None else filename.decode("utf-8", "replace")
+        self.content_type = headers.get("content-type")
+        self.done = False
+
+    # The next chunk of data, or b"" once the part has ended
+    async def read_chunk(self) -> bytes:
+        return await self._reader._read_chunk(self)
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while chunk := await self.read_chunk():
+            yield chunk
+
+    async def text(self, limit: int = MAX_FIELD_BYTES) -> str:
+        data = bytearray()
+        async for chunk in self.chunks():
+            data += chunk
+            if len(data) > limit:
+                raise FormError(f"Form field {self.name!r} is larger than {limit} bytes")
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise FormError(f"Form field {self.name!r} is not valid UTF-8")
+
+
+# Parses a multipart/form-data body from an async byte stream (e.g.
+# request.stream()) without spooling it anywhere: parts are handed out in
+# order as their headers arrive, and their data only as it is read, so a
+# caller can reject a file after its first chunks.
+class MultipartReader:
+    def __init__(self, stream: AsyncIterator[bytes], content_type: str, max_parts: int = MAX_PARTS):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise FormError("Missing multipart boundary")
+        self.max_parts = max_parts
+        self._stream = stream.__aiter__()
+        # What the parser found in the chunks fed to it so far, in order
+        self._events: Deque[Tuple[str, object]] = deque()
+        self._field = bytearray()
+        self._value = bytearray()
+        self._headers: Dict[str, str] = {}
+        self._part: Optional[FormPart] = None
+        self._parts = 0
+        self._exhausted = False
+        self._finished = False
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda data, start, end: self._field.extend(data[start:end]),
+            "on_header_value": lambda data, start, end: self._value.extend(data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self._events.append(("headers", self._headers)),
+            "on_part_data": lambda data, start, end: self._events.append(("data", bytes(data[start:end]))),
+            "on_part_end": lambda: self._events.append(("end", None)),
+            "on_end": lambda: self._events.append(("finished", None)),
+        })
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_end(self):
+        self._headers[self._field.decode("latin-1").lower()] = self._value.decode("latin-1")
+        self._field.clear()
+        self._value.clear()
+
+    async def _next_event(self) -> Tuple[str, object]:
+        while not self._events:
+            if self._exhausted:
+                raise FormError("Multipart body ended unexpectedly")
+            try:
+                chunk = await self._stream.__anext__()
+            except StopAsyncIteration:
+                self._exhausted = True
+                chunk = None
+            try:
+                if chunk is None:
+                    self._parser.finalize()
+                else:
+                    self._parser.write(chunk)
+            except FormParserError as exc:
+                raise FormError(f"Malformed multipart body: {exc}")
+        return self._events.popleft()
+
+    # The next part, or None after the last one
+    async def next_part(self) -> Optional[FormPart]:
+        if self._part is not None:
+            async for _ in self._part.chunks():
+                pass
+        if self._finished:
+            return None
+        kind, value = await self._next_event()
+        if kind == "finished":
+            self._finished = True
+            return None
+        if kind != "headers":
+            raise FormError("Malformed multipart body")
+        self._parts += 1
+        if self._parts > self.max_parts:
+            raise FormError(f"More than {self.max_parts} parts in the form")
+        self._part = FormPart(self, value)
+        return self._part
+
+    async def _read_chunk(self, part: FormPart) -> bytes:
+        if part is not self._part or part.done:
+            return b""
+        while True:
+            kind, value = await self._next_event()
+            if kind == "end":
+                part.done = True
+                return b""
+            if kind != "data":
+                raise FormError("Malformed multipart body")
+            if value:
+                return value
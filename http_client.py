@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Optional
+
+import httpx
+
+from executor import run_blocking
+
+logger = logging.getLogger("uvicorn.error")
+
+# Writes are batched to this size before hitting the disk
+WRITE_BLOCK = 1024 * 1024
+RETRIABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _client_options(
+    http2: bool,
+    connect_timeout: float,
+    read_timeout: float,
+    max_connections: int,
+    max_keepalive: int,
+) -> dict:
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 requested but the h2 package is missing; using HTTP/1.1")
+            http2 = False
+    return {
+        "http2": http2,
+        "follow_redirects": True,
+        "timeout": httpx.Timeout(read_timeout, connect=connect_timeout),
+        "limits": httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_keepalive
+        ),
+    }
+
+
+# One pooled client per process for async code, and a sync twin for bodies
+# consumed on worker threads (streamed uploads); both keep connections alive.
+def create_async_client(**options) -> httpx.AsyncClient:
+    return httpx.AsyncClient(**_client_options(**options))
+
+
+def create_sync_client(**options) -> httpx.Client:
+    return httpx.Client(**_client_options(**options))
+
+
+# File-like view of a streamed response body, for consumers that call read()
+class ResponseReader:
+    def __init__(self, response: httpx.Response, chunk_size: int = WRITE_BLOCK):
+        self._chunks = response.iter_bytes(chunk_size)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                self._eof = True
+        if size < 0 or size > len(self._buffer):
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class SourceChanged(Exception):
+    pass
+
+
+@dataclass
+class SourceInfo:
+    url: str
+    size: Optional[int]
+    ranges: bool
+    # ETag or Last-Modified; a resumed download must see the same value
+    validator: Optional[str]
+    content_type: Optional[str]
+    # The first `head_bytes` of the body, for content sniffing
+    head: bytes = b""
+
+
+# A range request for the first `head_bytes` tells us the size, whether
+# ranges work and the validator in one round trip (some origins reject HEAD),
+# and returns the start of the file so it can be checked before downloading.
+async def probe(client: httpx.AsyncClient, url: str, head_bytes: int = 1) -> SourceInfo:
+    async with client.stream("GET", url, headers={"Range": f"bytes=0-{head_bytes - 1}"}) as resp:
+        resp.raise_for_status()
+        size = None
+        ranges = resp.status_code == 206
+        if ranges:
+            total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+            size = int(total) if total.isdigit() else None
+        elif resp.headers.get("Content-Length", "").isdigit():
+            size = int(resp.headers["Content-Length"])
+        head = bytearray()
+        async for chunk in resp.aiter_bytes():
+            head += chunk
+            if len(head) >= head_bytes:
+                break
+        return SourceInfo(
+            url=str(resp.url),
+            size=size,
+            ranges=ranges and size is not None,
+            validator=resp.headers.get("ETag") or resp.headers.get("Last-Modified"),
+            content_type=resp.headers.get("Content-Type"),
+            head=bytes(head[:head_bytes]),
+        )
+
+
+def _retriable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRIABLE_STATUS_CODES
+    return isinstance(exc, (httpx.TransportError, EOFError))
+
+
+# Downloads `info` into `path`. When the origin supports ranges the file is
+# fetched as `segment_size` pieces, `concurrency` at a time, each written at
+# its offset; segments listed in `done` (from an earlier, interrupted run)
+# are skipped and `on_segment` is awaited as each one completes so the
+# caller can checkpoint; `throttle` is awaited after every block written, to
+# pace the download. Otherwise the body is read as a single stream.
+# Failed requests resume from the last byte written, with backoff.
+async def download_to_file(
+    client: httpx.AsyncClient,
+    info: SourceInfo,
+    path: str,
+    segment_size: int,
+    concurrency: int,
+    done: Iterable[int] = (),
+    on_segment: Optional[Callable[[int], Awaitable[None]]] = None,
+    on_bytes: Optional[Callable[[int], None]] = None,
+    throttle: Optional[Callable[[int], Awaitable[None]]] = None,
+    max_retries: int = 5,
+    retry_delay: Callable[[int], float] = lambda attempt: min(2 ** attempt, 30),
+) -> int:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if info.ranges:
+            await run_blocking(os.ftruncate, fd, info.size)
+            done = set(done)
+            spans = [
+                (index, start, min(start + segment_size, info.size))
+                for index, start in enumerate(range(0, info.size, segment_size))
+                if index not in done
+            ]
+        else:
+            await run_blocking(os.ftruncate, fd, 0)
+            spans = [(0, 0, None)]
+
+        async def write(data: bytearray, offset: int) -> int:
+            written = await run_blocking(os.pwrite, fd, bytes(data), offset)
+            if on_bytes:
+                on_bytes(written)
+            if throttle:
+                await throttle(written)
+            return written
+
+        async def fetch(start: int, end: Optional[int]) -> int:
+            pos = start
+            attempt = 0
+            while True:
+                headers = {}
+                if info.ranges:
+                    headers["Range"] = f"bytes={pos}-{end - 1}"
+                    if info.validator:
+                        headers["If-Range"] = info.validator
+                try:
+                    async with client.stream("GET", info.url, headers=headers) as resp:
+                        resp.raise_for_status()
+                        if info.ranges and resp.status_code != 206:
+                            raise SourceChanged(f"{info.url} changed while downloading")
+                        buffer = bytearray()
+                        async for chunk in resp.aiter_bytes():
+                            buffer += chunk
+                            if len(buffer) >= WRITE_BLOCK:
+                                pos += await write(buffer, pos)
+                                buffer.clear()
+                        if buffer:
+                            pos += await write(buffer, pos)
+                    if end is not None and pos < end:
+                        raise EOFError(f"Connection closed at byte {pos} of {end}")
+                    return pos - start
+                except Exception as exc:
+                    if not _retriable(exc) or attempt >= max_retries:
+                        raise
+                    attempt += 1
+                    if not info.ranges:
+                        # Without ranges the only way to resume is from scratch
+                        await run_blocking(os.ftruncate, fd, 0)
+                        pos = 0
+                    delay = retry_delay(attempt)
+                    logger.warning(
+                        f"Source download failed ({exc}); retry {attempt}/{max_retries} "
+                        f"at byte {pos} in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+        pending = iter(spans)
+        written = 0
+
+        async def worker():
+            nonlocal written
+            for index, start, end in pending:
+                nbytes = await fetch(start, end)
+                written += nbytes
+                if on_segment:
+                    await on_segment(index)
+
+        workers = min(concurrency, len(spans)) or 1
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return written
+    finally:
+        os.close(fd)
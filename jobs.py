@@ -0,0 +1,436 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from executor import run_blocking
+
+logger = logging.getLogger("uvicorn.error")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINAL_STATUSES = {SUCCEEDED, FAILED}
+
+
+# Raised by a handler to put its job back in the queue until `delay` seconds
+# from now, e.g. while waiting for API quota.
+class DeferJob(Exception):
+    def __init__(self, delay: float, reason: str = ""):
+        super().__init__(reason or f"Deferred for {delay:.0f}s")
+        self.delay = delay
+        self.reason = reason
+
+
+# Raised from checkpoint() once another worker has taken the job over (our
+# lease expired), so a superseded handler stops at its next checkpoint.
+class LeaseLost(Exception):
+    pass
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_status(job: dict) -> dict:
+    return {
+        "job_id": job["_id"],
+        "status": job["status"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "attempts": job.get("attempts", 0),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "run_after": job.get("run_after"),
+        "lease_owner": job.get("lease_owner"),
+        "lease_expires_at": job.get("lease_expires_at"),
+    }
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+# Mongo-backed job queue drained by a pool of asyncio workers. Each worker
+# claims queued jobs atomically and runs at most `concurrency` of them at once;
+# `max_per_user` caps how many of one user's jobs run in this process.
+#
+# Any number of processes (nodes) may share the collection. A claimed job is
+# leased to its node (`lease_owner`) until `lease_expires_at`; the node renews
+# the leases of all the jobs it runs every `heartbeat_interval` seconds, and a
+# job whose lease has expired (its node died or lost Mongo) is claimable again
+# like a queued one, resuming from its checkpoints. `attempts` doubles as the
+# lease's fencing token: checkpoints and the final status are only written by
+# the lease holder, so a node that comes back after losing a job can't
+# overwrite the new holder's progress.
+class JobQueue:
+    def __init__(
+        self,
+        collection,
+        handler: Callable[[dict], Awaitable[dict]],
+        workers: int = 2,
+        concurrency: int = 2,
+        poll_interval: float = 2.0,
+        lease_time: float = 60.0,
+        heartbeat_interval: float = 15.0,
+        owner: Optional[str] = None,
+        max_per_user: int = 0,
+        listener: Optional[Callable[[str, dict], None]] = None,
+    ):
+        if heartbeat_interval * 2 > lease_time:
+            raise ValueError("heartbeat_interval must be at most half of lease_time")
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_time = lease_time
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = owner or default_owner()
+        self.max_per_user = max_per_user
+        # Notified of status transitions, e.g. to push them to subscribers
+        self.listener = listener
+        self._running_by_user: Counter = Counter()
+        self._claim_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._worker_tasks: list = []
+        self._job_tasks: set = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # job id -> attempts (fencing token) of the jobs this node holds
+        self._leases: Dict[str, int] = {}
+
+    # ─────────── Producer API ─────────────────────────────────────────────────
+    @staticmethod
+    def _new_job(payload: dict, user_id: str, job_id: Optional[str] = None) -> dict:
+        now = utcnow()
+        return {
+            "_id": job_id or str(uuid.uuid4()),
+            "user_id": user_id,
+            "status": QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    # With `hold`, the job starts out leased to this node (running, with no
+    # attempts yet), so nothing claims it until release_hold(); if this node
+    # dies first, the lease lapses and the job is claimable as usual.
+    async def enqueue(
+        self, payload: dict, user_id: str, job_id: Optional[str] = None, hold: bool = False
+    ) -> str:
+        job = self._new_job(payload, user_id, job_id)
+        if hold:
+            job.update(
+                status=RUNNING,
+                lease_owner=self.owner,
+                lease_expires_at=job["created_at"] + timedelta(seconds=self.lease_time),
+            )
+            self._leases[job["_id"]] = job["attempts"]
+        try:
+            await run_blocking(self.collection.insert_one, job)
+        except BaseException:
+            self._leases.pop(job["_id"], None)
+            raise
+        if not hold:
+            self._wakeup.set()
+        return job["_id"]
+
+    # Queues a job enqueued with `hold`, setting `fields` on it; False if the
+    # lease ran out first and another node has claimed it
+    async def release_hold(self, job_id: str, fields: Optional[dict] = None) -> bool:
+        attempts = self._leases.pop(job_id, None)
+        res = await run_blocking(
+            self.collection.update_one,
+            {"_id": job_id, "lease_owner": self.owner, "attempts": attempts},
+            {"$set": {
+                **(fields or {}),
+                "status": QUEUED,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "updated_at": utcnow(),
+            }},
+        )
+        self._wakeup.set()
+        return bool(res.matched_count)
+
+    async def enqueue_many(self, payloads: List[dict], user_id: str) -> List[str]:
+        if not payloads:
+            return []
+        docs = [self._new_job(payload, user_id) for payload in payloads]
+        await run_blocking(self.collection.insert_many, docs, ordered=True)
+        self._wakeup.set()
+        return [doc["_id"] for doc in docs]
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await run_blocking(self.collection.find_one, {"_id": job_id})
+
+    # Jobs that haven't finished, e.g. to tell which staged files are in use
+    async def active(self, projection: Optional[dict] = None) -> List[dict]:
+        return await run_blocking(
+            lambda: list(self.collection.find({"status": {"$in": [QUEUED, RUNNING]}}, projection))
+        )
+
+    # Whether an unfinished job other than `exclude` matches `query`
+    def any_active(self, query: dict, exclude: Optional[str] = None) -> bool:
+        query = {**query, "status": {"$in": [QUEUED, RUNNING]}}
+        if exclude:
+            query["_id"] = {"$ne": exclude}
+        return self.collection.find_one(query, {"_id": 1}) is not None
+
+    # Called from the (threaded) job handler to persist resumable state. It
+    # also renews the lease, and raises LeaseLost if the job is no longer ours.
+    def checkpoint(self, job_id: str, fields: dict):
+        attempts = self._leases.get(job_id)
+        if attempts is None:
+            raise LeaseLost(f"Job {job_id} was taken over by another worker")
+        now = utcnow()
+        res = self.collection.update_one(
+            {"_id": job_id, "lease_owner": self.owner, "attempts": attempts},
+            {"$set": {
+                **fields,
+                "lease_expires_at": now + timedelta(seconds=self.lease_time),
+                "updated_at": now,
+            }},
+        )
+        if not res.matched_count:
+            self._leases.pop(job_id, None)
+            raise LeaseLost(f"Job {job_id} was taken over by another worker")
+
+    # Whether `current` (a fresh read of `job`'s document) shows the attempt
+    # this node is running still holding the lease; a superseded attempt must
+    # leave what it staged to the new holder
+    def holds(self, job: dict, current: Optional[dict]) -> bool:
+        return (
+            current is not None
+            and current.get("lease_owner") == self.owner
+            and current.get("attempts") == job["attempts"]
+        )
+
+    # ─────────── Worker pool ──────────────────────────────────────────────────
+    async def start(self):
+        await run_blocking(
+            self.collection.create_index,
+            [("status", ASCENDING), ("created_at", ASCENDING)],
+        )
+        await run_blocking(
+            self.collection.create_index,
+            [("status", ASCENDING), ("lease_expires_at", ASCENDING)],
+        )
+        await self.adopt_unleased()
+        self._stopping = False
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(n)) for n in range(self.workers)
+        ]
+        logger.info(
+            f"Started {self.workers} upload workers "
+            f"(concurrency {self.concurrency} each) as {self.owner}"
+        )
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        # Let in-flight jobs finish rather than abandoning half-sent uploads
+        if self._job_tasks:
+            await asyncio.gather(*self._job_tasks, return_exceptions=True)
+        # Leases are renewed until the last job is done
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+
+    # Running jobs from before leases existed get one that expires unless
+    # renewed, so they're reclaimed like any other abandoned job.
+    async def adopt_unleased(self) -> int:
+        res = await run_blocking(
+            self.collection.update_many,
+            {"status": RUNNING, "lease_expires_at": {"$exists": False}},
+            {"$set": {"lease_expires_at": utcnow() + timedelta(seconds=self.lease_time)}},
+        )
+        return res.modified_count
+
+    # Extends the leases of the jobs this node runs, in one write however many
+    # there are, and forgets any that another node has taken over meanwhile
+    def renew(self) -> int:
+        held = dict(self._leases)
+        if not held:
+            return 0
+        now = utcnow()
+        res = self.collection.update_many(
+            {"_id": {"$in": list(held)}, "status": RUNNING, "lease_owner": self.owner},
+            {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_time)}},
+        )
+        if res.matched_count < len(held):
+            kept = {
+                doc["_id"] for doc in self.collection.find(
+                    {"_id": {"$in": list(held)}, "lease_owner": self.owner}, {"_id": 1}
+                )
+            }
+            for job_id in set(held) - kept:
+                if self._leases.get(job_id) == held[job_id]:
+                    logger.warning(f"Lost the lease on job {job_id}")
+                    self._leases.pop(job_id, None)
+        return res.matched_count
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                # Off the blocking pool, which running uploads may have filled
+                await asyncio.to_thread(self.renew)
+            except Exception:
+                logger.exception("Failed to renew job leases")
+
+    def _claim(self, saturated_users: List[str]) -> Optional[dict]:
+        now = utcnow()
+        query = {
+            "$or": [
+                # Deferred jobs only become claimable once run_after has passed
+                {"status": QUEUED, "run_after": {"$not": {"$gt": now}}},
+                # Abandoned by a node that stopped renewing its lease
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            ],
+        }
+        if self._leases:
+            query["_id"] = {"$nin": list(self._leases)}
+        if saturated_users:
+            query["user_id"] = {"$nin": saturated_users}
+        job = self.collection.find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_owner": self.owner,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_time),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            self._leases[job["_id"]] = job["attempts"]
+        return job
+
+    async def _wait_for_work(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _claim_next(self) -> Optional[dict]:
+        # Serialised so per-user counts can't be overshot by racing workers
+        async with self._claim_lock:
+            saturated = []
+            if self.max_per_user:
+                saturated = [
+                    user for user, running in self._running_by_user.items()
+                    if running >= self.max_per_user
+                ]
+            job = await run_blocking(self._claim, saturated)
+            if job is not None:
+                self._running_by_user[job["user_id"]] += 1
+                self._notify(job["_id"], {"status": RUNNING, "attempts": job["attempts"]})
+            return job
+
+    def _notify(self, job_id: str, event: dict):
+        if self.listener is not None:
+            self.listener(job_id, {"type": "status", **event})
+
+    async def _worker(self, n: int):
+        slots = asyncio.Semaphore(self.concurrency)
+        while not self._stopping:
+            await slots.acquire()
+            try:
+                job = await self._claim_next()
+            except Exception:
+                logger.exception(f"Worker {n} failed to claim a job")
+                job = None
+            if job is None:
+                slots.release()
+                await self._wait_for_work()
+                continue
+            task = asyncio.create_task(self._run(job, slots))
+            self._job_tasks.add(task)
+            task.add_done_callback(self._job_tasks.discard)
+
+    async def _run(self, job: dict, slots: asyncio.Semaphore):
+        try:
+            result = await self.handler(job)
+            update = {"status": SUCCEEDED, "result": result}
+        except LeaseLost as exc:
+            logger.warning(str(exc))
+            update = None
+        except DeferJob as exc:
+            logger.info(f"Job {job['_id']} deferred {exc.delay:.0f}s: {exc}")
+            update = {
+                "status": QUEUED,
+                "run_after": utcnow() + timedelta(seconds=exc.delay),
+                "error": str(exc),
+            }
+        except Exception as exc:
+            logger.exception(f"Job {job['_id']} failed")
+            update = {"status": FAILED, "error": str(exc)}
+        finally:
+            slots.release()
+            self._running_by_user[job["user_id"]] -= 1
+            if self._running_by_user[job["user_id"]] <= 0:
+                del self._running_by_user[job["user_id"]]
+            # A per-user slot may have opened up for a waiting job
+            self._wakeup.set()
+        try:
+            if update is not None:
+                update = await self._finish(job, update)
+        finally:
+            if self._leases.get(job["_id"]) == job["attempts"]:
+                self._leases.pop(job["_id"], None)
+        if update is None:
+            return
+        final = update["status"] in FINAL_STATUSES
+        self._notify(job["_id"], {
+            "status": update["status"],
+            "result": update.get("result"),
+            "error": update.get("error"),
+            "run_after": update.get("run_after"),
+            "final": final,
+        })
+
+    # Records the outcome and releases the lease, unless the job has been
+    # taken over; returns the update written, or None
+    async def _finish(self, job: dict, update: dict) -> Optional[dict]:
+        now = utcnow()
+        update["updated_at"] = now
+        if update["status"] in FINAL_STATUSES:
+            update["finished_at"] = now
+        res = await run_blocking(
+            self.collection.update_one,
+            {"_id": job["_id"], "lease_owner": self.owner, "attempts": job["attempts"]},
+            {"$set": {**update, "lease_owner": None, "lease_expires_at": None}},
+        )
+        if not res.matched_count:
+            logger.warning(
+                f"Job {job['_id']} was taken over by another worker; "
+                f"discarding this attempt's {update['status']} result"
+            )
+            return None
+        return update
@@ -0,0 +1,19 @@
+import threading
+
+
+# Like functools.cached_property, but builds the value at most once even when
+# several threads (e.g. the blocking pool) ask for it at the same time.
+class lazy:
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.lock = threading.Lock()
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        with self.lock:
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.factory(obj)
+        return obj.__dict__[self.name]
@@ -1,37 +1,60 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import itertools
 import os
+import random
 import tempfile
 import time
 import uuid
 import traceback
 import logging
+import mimetypes
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from urllib.parse import urlparse
 
 import aiofiles
-import requests
-import boto3
 from fastapi import (
-    FastAPI, HTTPException, UploadFile, File, Form, Request, Query
+    APIRouter, BackgroundTasks, Depends, FastAPI, Header, HTTPException, Request, Query
 )
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import RedirectResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from pymongo import MongoClient
+from pydantic import BaseModel, Field, ValidationError
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.errors import AutoReconnect, BulkWriteError
 from dotenv import load_dotenv
 
-import google_auth_oauthlib.flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-import google.auth.transport.requests
+# boto3, googleapiclient, google_auth_oauthlib, httpx and Pillow are imported where
+# they are first needed, so importing this module (and cold starts) stay cheap
+from bandwidth import BandwidthManager, Link, Tenant
+from cache import MemoryBackend, MongoBackend, SWRCache
+from dedup import HashingReader, UploadIndex, sha256_file
+from events import ProgressBroker, ProgressTracker, sse_message
+from executor import run_blocking, run_in_process, shutdown_blocking_pool, shutdown_process_pool
+from forms import MAX_FIELD_BYTES, FormError, MultipartReader
+from jobs import FINAL_STATUSES, DeferJob, JobQueue, LeaseLost, job_status, utcnow
+from lazy import lazy
+from metrics import (
+    BYTES_TRANSFERRED, CHUNK_RETRIES, REQUEST_SECONDS, UPLOAD_FAILURES, UPLOADS_IN_FLIGHT,
+    count_bytes, render, timed,
+)
+from quota import QuotaExceeded, QuotaScheduler, quota_day, seconds_until_reset
+from scheduler import UploadScheduler, parse_windows, schedule_status
+from scratch import ScratchFull, ScratchSpace
+from oauth_clients import DEFAULT_CLIENT, ClientRouter, OAuthClient, load_clients
+from token_store import TokenStore, user_grants
+from validation import (
+    HEADER_BYTES, HeaderValidator, InvalidVideo, ValidatingReader, VideoTooLarge, validate_head,
+)
 
 # ─────────── Logging & Debug Setup ───────────────────────────────────────────────
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI(debug=True)
-
-@app.exception_handler(Exception)
 async def debug_exception_handler(request: Request, exc: Exception):
     tb = traceback.format_exc()
     logger.error(f"Unhandled exception:\n{tb}")
@@ -40,29 +63,34 @@ async def debug_exception_handler(request: Request, exc: Exception):
         content={"error": str(exc), "traceback": tb.splitlines()},
     )
 
-# ─────────── CORS & Config ────────────────────────────────────────────────────────
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Lock down in production
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Latency per route template (not raw path, to keep label cardinality bounded)
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status)
+        ).observe(time.perf_counter() - start)
 
+# ─────────── Config ───────────────────────────────────────────────────────────────
 load_dotenv()
 
-# MongoDB & Token Store
-mongo = MongoClient(os.getenv("MONGO_URI"))
-tokens = mongo["youtube_uploader"]["tokens"]
+MB = 1024 * 1024
 
-# Cloudflare R2 (S3-compatible)
-s3 = boto3.client(
-    "s3",
-    endpoint_url=os.getenv("R2_ENDPOINT_URL"),
-    aws_access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
-)
-R2_BUCKET = os.getenv("R2_BUCKET_NAME")
+# MongoDB. Request-path token lookups use the async driver; the sync client
+# serves code that already runs on the blocking pool.
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = "youtube_uploader"
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+# Content-hash index of finished uploads; "reuse" short-circuits duplicates
+DEDUP_POLICY = os.getenv("DEDUP_POLICY", "reuse")
 
 # OAuth2 (Google)
 SCOPES = [
@@ -73,15 +101,26 @@ SCOPES = [
     "https://www.googleapis.com/auth/youtube.readonly",
 ]
 REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI")
-OAUTH_CLIENT_CONFIG = {
-    "web": {
-        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-        "redirect_uris": [REDIRECT_URI],
-        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-        "token_uri": "https://oauth2.googleapis.com/token",
-    }
-}
+
+# OAuth clients, each in its own Cloud project with its own YouTube quota:
+# GOOGLE_CLIENT_ID/SECRET is the "default" client and OAUTH_CLIENTS (JSON)
+# adds more. Users authorize each client separately; uploads are routed to
+# the user's client with the most quota left per running upload.
+OAUTH_CLIENTS = load_clients(
+    os.getenv("OAUTH_CLIENTS"),
+    OAuthClient(
+        name=DEFAULT_CLIENT,
+        client_id=os.getenv("GOOGLE_CLIENT_ID"),
+        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+        redirect_uri=REDIRECT_URI,
+        project=os.getenv("GOOGLE_CLIENT_ID") or "default",
+    ),
+)
+client_router = ClientRouter(OAUTH_CLIENTS)
+
+# Video categories barely change, so serve them from a shared cache keyed by
+# region/language instead of spending quota on every request
+CATEGORY_CACHE_BACKEND = os.getenv("CATEGORY_CACHE_BACKEND", "memory")
 
 # File validation
 ALLOWED_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}
@@ -89,15 +128,315 @@ ALLOWED_MIMES = {
     "video/mp4", "video/quicktime", "video/x-msvideo",
     "video/x-matroska", "video/webm"
 }
+# Sources are also sniffed from their first bytes (container magic, MP4 box
+# layout, EBML doctype) and rejected before the bulk transfer when they aren't
+# a supported video or exceed these limits (0 disables a limit). The defaults
+# are YouTube's own caps.
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(256 * 1024 ** 3)))
+VIDEO_MAX_DURATION = float(os.getenv("VIDEO_MAX_DURATION", str(12 * 3600)))
+
+# Scratch space for temp copies of videos: a byte budget per process, a floor
+# of free disk, and how long to wait for space before rejecting (requests) or
+# deferring (jobs). Sizes that aren't known up front reserve SCRATCH_UNKNOWN_SIZE.
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "youtube_uploader"))
+SCRATCH_BUDGET_BYTES = int(os.getenv("SCRATCH_BUDGET_BYTES", str(20 * 1024 ** 3)))
+SCRATCH_MIN_FREE_BYTES = int(os.getenv("SCRATCH_MIN_FREE_BYTES", str(1024 ** 3)))
+SCRATCH_UNKNOWN_SIZE = int(os.getenv("SCRATCH_UNKNOWN_SIZE", str(1024 ** 3)))
+SCRATCH_ADMISSION_TIMEOUT = float(os.getenv("SCRATCH_ADMISSION_TIMEOUT", "30"))
+SCRATCH_RETRY_DELAY = float(os.getenv("SCRATCH_RETRY_DELAY", "30"))
+# Unclaimed scratch files and R2 incoming objects older than this are removed on startup
+SCRATCH_ORPHAN_AGE = float(os.getenv("SCRATCH_ORPHAN_AGE", "86400"))
+SCRATCH_SWEEP_R2 = os.getenv("SCRATCH_SWEEP_R2", "true").lower() == "true"
+
+# Local uploads are copied to disk in blocks of this size (bounds memory per request)
+UPLOAD_READ_CHUNK_SIZE = int(os.getenv("UPLOAD_READ_CHUNK_SIZE", str(1024 * 1024)))
+
+# URL uploads: "stream" pipes the source straight into YouTube, "staged"
+# downloads it to scratch space and copies it to R2 first. Streaming can
+# optionally tee into R2.
+URL_UPLOAD_MODE = os.getenv("URL_UPLOAD_MODE", "stream")
+R2_ARCHIVE_URL_SOURCES = os.getenv("R2_ARCHIVE_URL_SOURCES", "false").lower() == "true"
+# Local uploads are saved to the accepting node's scratch space; the R2 copy
+# lets any other node run the job. Only safe to turn off with a single node.
+LOCAL_UPLOAD_R2_COPY = os.getenv("LOCAL_UPLOAD_R2_COPY", "true").lower() == "true"
+# Outbound HTTP (URL sources, thumbnails) goes through one pooled client per
+# process. HTTP/2 needs the optional h2 package.
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_CLIENT_OPTIONS = {
+    "http2": HTTP2_ENABLED,
+    "connect_timeout": HTTP_CONNECT_TIMEOUT,
+    "read_timeout": HTTP_READ_TIMEOUT,
+    "max_connections": HTTP_MAX_CONNECTIONS,
+    "max_keepalive": HTTP_MAX_KEEPALIVE,
+}
+# Staged URL sources that support range requests are fetched in segments of
+# this size, several at once; finished segments survive a retry or restart
+SOURCE_SEGMENT_SIZE = int(os.getenv("SOURCE_SEGMENT_SIZE", str(16 * MB)))
+SOURCE_SEGMENT_CONCURRENCY = int(os.getenv("SOURCE_SEGMENT_CONCURRENCY", "4"))
+SOURCE_MAX_RETRIES = int(os.getenv("SOURCE_MAX_RETRIES", "5"))
+# Resumable upload chunk size (multiple of 256 KiB); each acknowledged chunk
+# is checkpointed so a retry or restart resumes from there
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "8"))
+UPLOAD_RETRY_BASE_DELAY = float(os.getenv("UPLOAD_RETRY_BASE_DELAY", "1"))
+UPLOAD_RETRY_MAX_DELAY = float(os.getenv("UPLOAD_RETRY_MAX_DELAY", "64"))
+RETRIABLE_STATUS_CODES = {500, 502, 503, 504}
+
+# Optional per-upload transcode stage (transcode=remux|h264): ffmpeg output is
+# piped into the resumable upload, with at most TRANSCODE_MAX_PROCESSES
+# ffmpeg processes per app process
+TRANSCODE_FFMPEG = os.getenv("TRANSCODE_FFMPEG", "ffmpeg")
+TRANSCODE_MAX_PROCESSES = int(os.getenv("TRANSCODE_MAX_PROCESSES", "2"))
+
+# Thumbnail sources larger than this are rejected before decoding
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))
 
 # Privacy options
 PRIVACY_OPTIONS = ["public", "private", "unlisted"]
 
+# Upload progress events (per process); SSE clients get a keep-alive this often
+progress_broker = ProgressBroker(queue_size=int(os.getenv("PROGRESS_QUEUE_SIZE", "32")))
+PROGRESS_KEEPALIVE = float(os.getenv("PROGRESS_KEEPALIVE", "15"))
+
+# Background upload workers
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_WORKER_CONCURRENCY = int(os.getenv("UPLOAD_WORKER_CONCURRENCY", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+# Each node renews the leases of its running jobs every JOB_HEARTBEAT_INTERVAL
+# seconds; a job whose lease (JOB_LEASE_TIME) runs out is taken over by any
+# node. WORKER_ID names this node in lease_owner (default host:pid:random).
+JOB_LEASE_TIME = float(os.getenv("JOB_LEASE_TIME", "60"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "15"))
+WORKER_ID = os.getenv("WORKER_ID")
+
+# Deferred uploads (defer_upload with a publish_at) wait in the `schedules`
+# collection and start in the latest off-peak window (UTC, "HH:MM-HH:MM,...")
+# that leaves SCHEDULE_LEAD_TIME seconds before the publish time. Items due
+# within SCHEDULE_HORIZON seconds are held in memory, at most SCHEDULE_MAX_LOADED.
+SCHEDULE_OFF_PEAK_WINDOWS = parse_windows(os.getenv("SCHEDULE_OFF_PEAK_WINDOWS", "01:00-06:00"))
+SCHEDULE_LEAD_TIME = float(os.getenv("SCHEDULE_LEAD_TIME", "86400"))
+SCHEDULE_HORIZON = float(os.getenv("SCHEDULE_HORIZON", "3600"))
+SCHEDULE_REFILL_INTERVAL = float(os.getenv("SCHEDULE_REFILL_INTERVAL", "60"))
+SCHEDULE_MAX_LOADED = int(os.getenv("SCHEDULE_MAX_LOADED", "100000"))
+# How long a due upload waits when no OAuth client has quota left for it
+SCHEDULE_RETRY_DELAY = float(os.getenv("SCHEDULE_RETRY_DELAY", "3600"))
+# Max uploads of one user running at once in this process (0 = no limit)
+UPLOAD_MAX_PER_USER = int(os.getenv("UPLOAD_MAX_PER_USER", "2"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+# Cloudflare R2 (S3-compatible); the shared connection pool defaults to one
+# connection per concurrent multipart part across all upload slots
+R2_MAX_CONCURRENCY = int(os.getenv("R2_MAX_CONCURRENCY", "8"))
+
+# Bandwidth shaping per process, in bytes/s (0 = unlimited). A link's rate is
+# shared between the users moving data through it, by weight, and each user
+# can also be capped. These are defaults: limits set through /admin/bandwidth
+# are stored in Mongo and picked up by every process within
+# BANDWIDTH_SYNC_INTERVAL seconds.
+BANDWIDTH_EGRESS_RATE = int(os.getenv("BANDWIDTH_EGRESS_RATE", "0"))
+BANDWIDTH_INGRESS_RATE = int(os.getenv("BANDWIDTH_INGRESS_RATE", "0"))
+BANDWIDTH_USER_EGRESS_RATE = int(os.getenv("BANDWIDTH_USER_EGRESS_RATE", "0"))
+BANDWIDTH_USER_INGRESS_RATE = int(os.getenv("BANDWIDTH_USER_INGRESS_RATE", "0"))
+# Seconds of transfer an idle user may burst before being paced
+BANDWIDTH_BURST = float(os.getenv("BANDWIDTH_BURST", "1"))
+BANDWIDTH_SYNC_INTERVAL = float(os.getenv("BANDWIDTH_SYNC_INTERVAL", "10"))
+
+# Shared secret for the /admin routes (X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Build the YouTube and R2 clients in the background right after startup, so
+# the first upload doesn't pay for importing their libraries
+PRELOAD_CLIENTS = os.getenv("PRELOAD_CLIENTS", "true").lower() == "true"
+
+# ─────────── Services ───────────────────────────────────────────────────────────
+# Clients and the objects that wrap them are built on first use; constructing
+# them does no I/O at import time.
+class Services:
+    @lazy
+    def mongo(self):
+        return MongoClient(
+            MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE, minPoolSize=MONGO_MIN_POOL_SIZE
+        )
+
+    @lazy
+    def async_mongo(self):
+        return AsyncMongoClient(
+            MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE, minPoolSize=MONGO_MIN_POOL_SIZE
+        )
+
+    @lazy
+    def token_store(self):
+        return TokenStore(self.async_mongo[MONGO_DB]["tokens"])
+
+    @lazy
+    def upload_index(self):
+        return UploadIndex(self.mongo[MONGO_DB]["uploads"], policy=DEDUP_POLICY)
+
+    @lazy
+    def quota(self):
+        return QuotaScheduler(
+            self.mongo[MONGO_DB]["quota"],
+            daily_limit=int(os.getenv("QUOTA_DAILY_LIMIT", "10000")),
+            user_daily_limit=int(os.getenv("QUOTA_USER_DAILY_LIMIT", "0")),
+            bucket_capacity=int(os.getenv("QUOTA_BUCKET_CAPACITY", "0")) or None,
+            project_limits={
+                client.project: client.daily_limit
+                for client in OAUTH_CLIENTS.values() if client.daily_limit
+            },
+        )
+
+    # Per-user cache of credentials and YouTube service objects, per OAuth client
+    @lazy
+    def youtube_clients(self):
+        from youtube_clients import YouTubeClientCache
+
+        return {
+            client.name: YouTubeClientCache(
+                self.mongo[MONGO_DB]["tokens"],
+                client_id=client.client_id,
+                client_secret=client.client_secret,
+                scopes=SCOPES,
+                maxsize=int(os.getenv("YOUTUBE_CLIENT_CACHE_SIZE", "1024")),
+                ttl=float(os.getenv("YOUTUBE_CLIENT_CACHE_TTL", "3600")),
+                refresh_margin=float(os.getenv("TOKEN_REFRESH_MARGIN", "300")),
+                api_endpoint=os.getenv("YOUTUBE_API_ENDPOINT"),
+                client=client.name,
+            )
+            for client in OAUTH_CLIENTS.values()
+        }
+
+    @lazy
+    def category_cache(self):
+        return SWRCache(
+            ttl=float(os.getenv("CATEGORY_CACHE_TTL", "86400")),
+            stale_ttl=float(os.getenv("CATEGORY_CACHE_STALE_TTL", "604800")),
+            backend=(
+                MongoBackend(self.mongo[MONGO_DB]["cache"])
+                if CATEGORY_CACHE_BACKEND == "mongo" else MemoryBackend()
+            ),
+        )
+
+    @lazy
+    def r2(self):
+        from storage import R2Storage
+
+        return R2Storage(
+            bucket=os.getenv("R2_BUCKET_NAME"),
+            endpoint_url=os.getenv("R2_ENDPOINT_URL"),
+            access_key_id=os.getenv("R2_ACCESS_KEY_ID"),
+            secret_access_key=os.getenv("R2_SECRET_ACCESS_KEY"),
+            multipart_threshold=int(os.getenv("R2_MULTIPART_THRESHOLD", str(16 * MB))),
+            part_size=int(os.getenv("R2_PART_SIZE", str(16 * MB))),
+            max_concurrency=R2_MAX_CONCURRENCY,
+            max_pool_connections=int(os.getenv(
+                "R2_MAX_POOL_CONNECTIONS",
+                str(UPLOAD_WORKERS * UPLOAD_WORKER_CONCURRENCY * R2_MAX_CONCURRENCY),
+            )),
+        )
+
+    @lazy
+    def scratch(self):
+        return ScratchSpace(
+            SCRATCH_DIR, budget=SCRATCH_BUDGET_BYTES, min_free=SCRATCH_MIN_FREE_BYTES
+        )
+
+    @lazy
+    def http(self):
+        from http_client import create_async_client
+
+        return create_async_client(**HTTP_CLIENT_OPTIONS)
+
+    # For response bodies read on worker threads (streamed uploads)
+    @lazy
+    def http_sync(self):
+        from http_client import create_sync_client
+
+        return create_sync_client(**HTTP_CLIENT_OPTIONS)
+
+    @lazy
+    def transcoder(self):
+        from transcode import Transcoder
+
+        return Transcoder(
+            ffmpeg=TRANSCODE_FFMPEG,
+            max_processes=TRANSCODE_MAX_PROCESSES,
+            video_bitrate=os.getenv("TRANSCODE_VIDEO_BITRATE", "4M"),
+            audio_bitrate=os.getenv("TRANSCODE_AUDIO_BITRATE", "192k"),
+            preset=os.getenv("TRANSCODE_PRESET", "veryfast"),
+            threads=int(os.getenv("TRANSCODE_THREADS", "0")),
+        )
+
+    @lazy
+    def upload_queue(self):
+        return JobQueue(
+            self.mongo[MONGO_DB]["jobs"],
+            process_upload_job,
+            workers=UPLOAD_WORKERS,
+            concurrency=UPLOAD_WORKER_CONCURRENCY,
+            poll_interval=JOB_POLL_INTERVAL,
+            lease_time=JOB_LEASE_TIME,
+            heartbeat_interval=JOB_HEARTBEAT_INTERVAL,
+            owner=WORKER_ID,
+            max_per_user=UPLOAD_MAX_PER_USER,
+            listener=progress_broker.publish,
+        )
+
+    @lazy
+    def bandwidth(self):
+        return BandwidthManager(
+            self.mongo[MONGO_DB]["settings"],
+            {
+                "ingress": Link(
+                    BANDWIDTH_INGRESS_RATE, BANDWIDTH_USER_INGRESS_RATE, burst=BANDWIDTH_BURST
+                ),
+                "egress": Link(
+                    BANDWIDTH_EGRESS_RATE, BANDWIDTH_USER_EGRESS_RATE, burst=BANDWIDTH_BURST
+                ),
+            },
+        )
+
+    @lazy
+    def scheduler(self):
+        return UploadScheduler(
+            self.mongo[MONGO_DB]["schedules"],
+            dispatch_scheduled,
+            windows=SCHEDULE_OFF_PEAK_WINDOWS,
+            lead_time=SCHEDULE_LEAD_TIME,
+            horizon=SCHEDULE_HORIZON,
+            refill_interval=SCHEDULE_REFILL_INTERVAL,
+            max_loaded=SCHEDULE_MAX_LOADED,
+        )
+
+    def preload(self):
+        self.youtube_clients
+        self.r2
+
+    async def close(self):
+        built = vars(self)
+        if "async_mongo" in built:
+            await built["async_mongo"].close()
+        if "mongo" in built:
+            built["mongo"].close()
+        if "http" in built:
+            await built["http"].aclose()
+        if "http_sync" in built:
+            built["http_sync"].close()
+        if "transcoder" in built:
+            built["transcoder"].kill_all()
+
+services = Services()
+
 # ─────────── Models ─────────────────────────────────────────────────────────────
-class VideoUploadRequest(BaseModel):
-    upload_type: str = Field(..., pattern="^(url|local)$")
+# The upload fields a client sets
+class UploadItem(BaseModel):
+    upload_type: str = Field(..., pattern="^(url|local|r2)$")
     video_url: Optional[str] = None
-    local_video_path: Optional[str] = None
+    r2_key: Optional[str] = None
+    sha256: Optional[str] = None
     title: str
     description: str
     tags: List[str]
@@ -111,44 +450,465 @@ class VideoUploadRequest(BaseModel):
     notify_subscribers: Optional[bool] = True
     stabilize: Optional[bool] = False
     thumbnail_url: Optional[str] = None
+    transcode: Optional[str] = Field(None, pattern="^(remux|h264)$")
+    # Upload in an off-peak window before publish_at instead of now
+    defer_upload: Optional[bool] = False
+
+# A queued upload: the client's fields plus, for local uploads, where the
+# server saved the file. Never built from a request body, since the job's
+# cleanup deletes these.
+class VideoUploadRequest(UploadItem):
+    local_video_path: Optional[str] = None
+    # R2 copy of local_video_path, for nodes other than the one it was saved on
+    local_r2_key: Optional[str] = None
+
+# The /upload/ form fields besides the file
+class UploadForm(UploadItem):
+    email: str
+
+# /upload/ parses its body itself (see read_upload_form), so the form is
+# described to the API docs here
+def upload_form_openapi() -> dict:
+    schema = UploadForm.model_json_schema()
+    schema["properties"]["file"] = {"type": "string", "format": "binary"}
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": schema}}}}
+
+UPLOAD_FORM_OPENAPI = upload_form_openapi()
+
+class BatchUploadRequest(BaseModel):
+    email: str
+    items: List[UploadItem]
+
+# Bandwidth limits in bytes/s; omitted fields are left as they are, and a
+# user entry replaces that user's overrides (null = the link default)
+class UserBandwidth(BaseModel):
+    user_id: str
+    rate: Optional[int] = Field(None, ge=0)
+    weight: Optional[float] = Field(None, gt=0)
+
+class LinkLimits(BaseModel):
+    rate: Optional[int] = Field(None, ge=0)
+    user_rate: Optional[int] = Field(None, ge=0)
+    users: List[UserBandwidth] = []
+
+class BandwidthLimits(BaseModel):
+    ingress: Optional[LinkLimits] = None
+    egress: Optional[LinkLimits] = None
 
 # ─────────── Helpers ────────────────────────────────────────────────────────────
-def get_youtube_client(user_id: str):
-    user = tokens.find_one({"user_id": user_id})
-    if not user:
+def validate_upload_request(meta: UploadItem) -> Optional[str]:
+    if meta.upload_type == "url" and not meta.video_url:
+        return "video_url is required for URL upload"
+    if meta.upload_type == "r2" and not meta.r2_key:
+        return "r2_key is required for R2 upload"
+    if meta.privacy_status not in PRIVACY_OPTIONS:
+        return f"privacy_status must be one of {PRIVACY_OPTIONS}"
+    if meta.transcode and not services.transcoder.available():
+        return "Transcoding is not available on this server"
+    if meta.defer_upload:
+        if not meta.publish_at:
+            return "defer_upload requires publish_at"
+        try:
+            publish_at = parse_publish_at(meta.publish_at)
+        except ValueError:
+            return "publish_at must be an ISO 8601 date-time with a timezone"
+        if publish_at <= utcnow():
+            return "publish_at must be in the future"
+    return None
+
+def parse_publish_at(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        raise ValueError("publish_at needs a timezone")
+    return parsed.astimezone(timezone.utc)
+
+async def find_user(email: Optional[str] = None, user_id: Optional[str] = None) -> Optional[dict]:
+    with timed("token_lookup"):
+        return await services.token_store.find(email=email, user_id=user_id)
+
+# Pass the user doc when the caller already has it; otherwise it is only
+# fetched if the client cache is cold
+async def get_youtube_client(
+    user_id: str, user: Optional[dict] = None, client: str = DEFAULT_CLIENT
+):
+    clients = services.youtube_clients[client]
+    if user is None and not clients.cached(user_id):
+        user = await find_user(user_id=user_id)
+        if not user:
+            raise HTTPException(401, "User not authenticated")
+    with timed("youtube_client"):
+        youtube = await run_blocking(clients.get, user_id, user)
+    if youtube is None:
         raise HTTPException(401, "User not authenticated")
-    creds = Credentials(
-        token=user["access_token"],
-        refresh_token=user["refresh_token"],
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-        scopes=SCOPES,
-    )
-    return build("youtube", "v3", credentials=creds)
+    return youtube
+
+def oauth_client(name: Optional[str]) -> OAuthClient:
+    client = OAUTH_CLIENTS.get(name or DEFAULT_CLIENT)
+    if client is None:
+        raise HTTPException(400, f"Unknown OAuth client {name!r}")
+    return client
+
+# The OAuth clients the user has authorized, best first for new work
+def ranked_clients(user: dict) -> List[OAuthClient]:
+    grants = [name for name in user_grants(user) if name in OAUTH_CLIENTS]
+    remaining = services.quota.remaining_many({OAUTH_CLIENTS[name].project for name in grants})
+    return client_router.rank(grants, remaining)
+
+# Reserves today's videos.insert quota on the best of the user's clients
+# that can still cover it; returns that client's name and the quota day
+# the reservation was made on
+def reserve_upload(user: dict) -> Tuple[str, str]:
+    clients = ranked_clients(user)
+    if not clients:
+        raise HTTPException(401, "User has not authorized any configured OAuth client")
+    day = quota_day()
+    for client in clients:
+        try:
+            services.quota.reserve(client.project, user["user_id"], "videos.insert", day=day)
+            return client.name, day
+        except QuotaExceeded as exc:
+            error = exc
+    raise error
+
+# Hands back a reservation made by reserve_upload, e.g. when the job it was
+# for could not be queued
+def release_upload(user_id: str, client: str, day: str):
+    services.quota.release(OAUTH_CLIENTS[client].project, user_id, "videos.insert", day=day)
+
+# The quota day a job's videos.insert is reserved on; jobs queued before
+# the day was stored reserved on the day they were created
+def job_quota_day(job: dict) -> str:
+    day = job["payload"].get("quota_day")
+    if day:
+        return day
+    created_at = job["created_at"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return quota_day(created_at)
+
+# The client a job was routed to when it was accepted
+def job_client(job: dict) -> OAuthClient:
+    name = job["payload"].get("oauth_client") or DEFAULT_CLIENT
+    if name not in OAUTH_CLIENTS:
+        raise RuntimeError(f"OAuth client {name!r} is no longer configured")
+    return OAUTH_CLIENTS[name]
 
-async def save_upload_file(upload_file: UploadFile) -> str:
-    ext = os.path.splitext(upload_file.filename)[1].lower()
+# Writes an uploaded file into scratch space as its bytes arrive, validating
+# and hashing them on the way, so a bad file is rejected after its first
+# chunks. `size` is what to reserve (the request's Content-Length bounds the
+# file); without it the reservation grows by SCRATCH_UNKNOWN_SIZE whenever
+# the file outgrows it, so nothing is written beyond the budget. Writes go
+# to disk in blocks of `block_size`.
+async def save_upload_file(
+    filename: str,
+    content_type: Optional[str],
+    chunks: AsyncIterator[bytes],
+    size: Optional[int] = None,
+    block_size: int = UPLOAD_READ_CHUNK_SIZE,
+) -> Tuple[str, str]:
+    ext = os.path.splitext(filename)[1].lower()
     if ext not in ALLOWED_EXTS:
         raise HTTPException(400, f"Unsupported extension: {ext}")
-    if upload_file.content_type not in ALLOWED_MIMES:
-        raise HTTPException(400, f"Unsupported MIME type: {upload_file.content_type}")
-    tmp_dir = tempfile.gettempdir()
-    unique = f"{uuid.uuid4()}{ext}"
-    path = os.path.join(tmp_dir, unique)
-    async with aiofiles.open(path, 'wb') as f:
-        await f.write(await upload_file.read())
-    return path
+    if content_type not in ALLOWED_MIMES:
+        raise HTTPException(400, f"Unsupported MIME type: {content_type}")
+    validator = HeaderValidator(VIDEO_MAX_BYTES, VIDEO_MAX_DURATION)
+    scratch = services.scratch
+    path = scratch.new_path(ext)
+    try:
+        reserved = size or SCRATCH_UNKNOWN_SIZE
+        await scratch.reserve(path, reserved, SCRATCH_ADMISSION_TIMEOUT)
+    except ScratchFull as exc:
+        raise HTTPException(507, str(exc))
+    digest = hashlib.sha256()
+    block = bytearray()
+    try:
+        async with aiofiles.open(path, 'wb') as f:
+            async for chunk in chunks:
+                validator.feed(chunk)
+                if validator.size > reserved:
+                    reserved = validator.size + SCRATCH_UNKNOWN_SIZE
+                    if scratch.budget:
+                        # Room for whatever still fits rather than a full step
+                        reserved = max(min(reserved, scratch.budget), validator.size)
+                    await scratch.reserve(path, reserved, SCRATCH_ADMISSION_TIMEOUT)
+                digest.update(chunk)
+                block += chunk
+                if len(block) >= block_size:
+                    await f.write(block)
+                    block.clear()
+                BYTES_TRANSFERRED.labels("source").inc(len(chunk))
+            await f.write(block)
+        validator.finish()
+    except InvalidVideo as exc:
+        scratch.remove(path)
+        raise HTTPException(413 if isinstance(exc, VideoTooLarge) else 400, str(exc))
+    except ScratchFull as exc:
+        scratch.remove(path)
+        raise HTTPException(507, str(exc))
+    except BaseException:
+        # Includes the client going away mid-upload
+        scratch.remove(path)
+        raise
+    finally:
+        scratch.release(path)
+    return path, digest.hexdigest()
+
+# Reads the /upload/ form straight from the request body. Starlette's form
+# parser would spool the whole file to the system temp dir before anything
+# could look at it; here the file part goes through save_upload_file as it
+# arrives, into scratch space and within its budget, and the other fields
+# may take MAX_FIELD_BYTES in all. A body whose Content-Length is over those
+# limits is refused before any of it is read. Returns the other fields, and
+# the saved file's path and hash.
+async def read_upload_form(
+    request: Request,
+) -> Tuple[Dict[str, List[str]], Optional[str], Optional[str]]:
+    content_type = request.headers.get("content-type", "")
+    size = request.headers.get("content-length")
+    size = int(size) if size and size.isdigit() else None
+    multipart = content_type.startswith("multipart/form-data")
+    if multipart:
+        max_size = VIDEO_MAX_BYTES + MAX_FIELD_BYTES if VIDEO_MAX_BYTES else 0
+    else:
+        max_size = MAX_FIELD_BYTES
+    if size and max_size and size > max_size:
+        raise HTTPException(413, f"Request body is larger than {max_size} bytes")
+    if not multipart:
+        # URL-encoded forms carry no file
+        form = await request.form()
+        return {key: form.getlist(key) for key in form.keys()}, None, None
+    fields: Dict[str, List[str]] = {}
+    remaining = MAX_FIELD_BYTES
+    video_path = digest = None
+    try:
+        reader = MultipartReader(request.stream(), content_type)
+        while part := await reader.next_part():
+            if part.filename is None:
+                value = await part.text(limit=remaining)
+                remaining -= len(value.encode())
+                fields.setdefault(part.name, []).append(value)
+            elif part.name != "file" or video_path:
+                raise HTTPException(400, f"Unexpected file in form field {part.name!r}")
+            elif part.filename:  # browsers send an empty file input as filename=""
+                with timed("local_save"):
+                    video_path, digest = await save_upload_file(
+                        part.filename, part.content_type, part.chunks(), size
+                    )
+    except BaseException as exc:
+        if video_path:
+            discard_scratch(video_path)
+        if isinstance(exc, FormError):
+            raise HTTPException(400, str(exc))
+        raise
+    return fields, video_path, digest
+
+# Validates the /upload/ form fields like FastAPI's Form() parameters would:
+# `tags` may repeat, other fields take their last value, and empty optional
+# fields are left unset
+def parse_upload_form(fields: Dict[str, List[str]]) -> "UploadForm":
+    values = {}
+    for key, items in fields.items():
+        field = UploadForm.model_fields.get(key)
+        if field is None:
+            continue
+        if key == "tags":
+            values[key] = items
+        elif items[-1] != "" or field.is_required():
+            values[key] = items[-1]
+    try:
+        return UploadForm.model_validate(values)
+    except ValidationError as exc:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+        )
+
+def source_mimetype(url: str, content_type: Optional[str]) -> str:
+    content_type = (content_type or "").split(";")[0].strip()
+    if content_type in ALLOWED_MIMES:
+        return content_type
+    guessed, _ = mimetypes.guess_type(urlparse(url).path)
+    return guessed if guessed in ALLOWED_MIMES else "application/octet-stream"
+
+# Byte callback pacing a transfer to the user's bandwidth share, when a
+# shaper is given, then calling `then`
+def paced(phase: str, shaper: Optional[Tenant], then: Optional[Callable[[int], None]] = None):
+    return shaper.callback(phase, then) if shaper else then
 
-async def download_url_to_temp_and_r2(url: str):
-    resp = requests.get(url, stream=True)
-    resp.raise_for_status()
-    key = os.path.basename(urlparse(url).path) or f"video_{int(time.time())}.mp4"
-    s3.upload_fileobj(resp.raw, R2_BUCKET, key)
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(key)[1])
-    s3.download_fileobj(R2_BUCKET, key, tmp)
-    tmp.close()
-    return tmp.name, key
+def put_file_to_r2(
+    path: str,
+    key: str,
+    publish: Optional[Callable[[dict], None]] = None,
+    shaper: Optional[Tenant] = None,
+):
+    progress = ProgressTracker(publish, "r2", os.path.getsize(path)) if publish else None
+    with timed("r2_put"), open(path, "rb") as f:
+        services.r2.upload_fileobj(
+            f, key, callback=count_bytes("r2_put", paced("r2_put", shaper, progress and progress.add))
+        )
+
+# Copies a saved local upload to its content-addressed R2 key (unless that
+# content is already there) so other nodes can run the job; returns the key
+def copy_local_upload_to_r2(path: str, digest: str) -> str:
+    key = services.r2.object_key(path, digest=digest)
+    if not services.r2.exists(key):
+        put_file_to_r2(path, key)
+    return key
+
+# Runs after /upload/ has answered: copies a held local upload job's file to
+# R2, records the copy and hands the job to the queue. Without a copy (R2
+# failed) the job is still released, and only this node can run it.
+async def share_local_upload(job_id: str, path: str, digest: str):
+    key = None
+    try:
+        with timed("local_r2_put"):
+            key = await run_blocking(copy_local_upload_to_r2, path, digest)
+    except Exception as exc:
+        logger.warning(f"Could not copy local upload {job_id} to R2: {exc}")
+    fields = {"payload.local_r2_key": key} if key else None
+    if not await services.upload_queue.release_hold(job_id, fields) and key:
+        # Taken over without the copy, which nothing else may need
+        await run_blocking(discard_scratch, None, key, job_id)
+
+# Downloads a URL source into scratch space, then copies it to R2, where a
+# retry that no longer has the scratch file (e.g. on another node) reads it
+# back instead of fetching the source again. Origins
+# that support ranges are fetched in parallel segments; each finished
+# segment is checkpointed as `staged.download`, so a retried or recovered job
+# only fetches what is missing (as long as the source's validator matches).
+async def stage_url_source(
+    job: dict, url: str, publish: Optional[Callable[[dict], None]] = None
+) -> Tuple[str, str, str]:
+    from http_client import download_to_file, probe
+
+    scratch = services.scratch
+    shaper = services.bandwidth.tenant(job["user_id"])
+    info = await probe(services.http, url, HEADER_BYTES)
+    # Fails the job on a bad source before anything is downloaded
+    validate_head(info.head, info.size, VIDEO_MAX_BYTES, VIDEO_MAX_DURATION)
+    partial = (job.get("staged") or {}).get("download") or {}
+    resumable = (
+        info.ranges and info.validator
+        and partial.get("url") == info.url
+        and partial.get("validator") == info.validator
+        and partial.get("size") == info.size
+        and partial.get("path") and os.path.exists(partial["path"])
+    )
+    if resumable:
+        path, done = partial["path"], set(partial.get("done", []))
+    else:
+        discard_scratch(partial.get("path"))
+        path = scratch.new_path(os.path.splitext(urlparse(url).path)[1].lower() or ".mp4")
+        done = set()
+    if not scratch.try_reserve(path, info.size or SCRATCH_UNKNOWN_SIZE):
+        raise DeferJob(SCRATCH_RETRY_DELAY, "Waiting for scratch space")
+    state = {
+        "url": info.url, "path": path, "size": info.size,
+        "validator": info.validator, "done": sorted(done),
+    }
+
+    async def save_state():
+        await run_blocking(
+            services.upload_queue.checkpoint, job["_id"], {"staged": {"download": state}}
+        )
+
+    async def segment_done(index: int):
+        done.add(index)
+        state["done"] = sorted(done)
+        await save_state()
+
+    progress = ProgressTracker(publish, "download", info.size) if publish else None
+    if progress and done:
+        progress.update(min(len(done) * SOURCE_SEGMENT_SIZE, info.size), info.size)
+    try:
+        # Record the path first, so the file is found again after a crash
+        await save_state()
+        with timed("source_download"):
+            await download_to_file(
+                services.http, info, path,
+                segment_size=SOURCE_SEGMENT_SIZE,
+                concurrency=SOURCE_SEGMENT_CONCURRENCY,
+                done=done,
+                on_segment=segment_done if info.ranges else None,
+                on_bytes=count_bytes("source", progress and progress.add),
+                throttle=functools.partial(shaper.athrottle, "source"),
+                max_retries=SOURCE_MAX_RETRIES,
+                retry_delay=retry_delay,
+            )
+    finally:
+        scratch.release(path)
+    size = os.path.getsize(path)
+    if progress:
+        progress.update(size, size, force=True)
+    digest = await run_blocking(sha256_file, path)
+    key = services.r2.object_key(urlparse(url).path, digest=digest)
+    # Identical content may already be there, staged or archived by another job
+    if not await run_blocking(services.r2.exists, key):
+        try:
+            await run_blocking(put_file_to_r2, path, key, publish, shaper)
+        except BaseException:
+            discard_scratch(r2_key=key, job_id=job["_id"])
+            raise
+    return path, key, digest
+
+# Whether a content-addressed R2 object is still needed: staged by another
+# unfinished job, or kept as the archived copy of an upload
+def r2_object_in_use(key: str, job_id: Optional[str] = None) -> bool:
+    in_jobs = {"$or": [{"staged.r2_key": key}, {"payload.local_r2_key": key}]}
+    return (
+        services.upload_queue.any_active(in_jobs, exclude=job_id)
+        or bool(services.upload_index.referenced_keys([key]))
+    )
+
+# Best-effort removal of a scratch file and/or a staged R2 object on behalf
+# of `job_id`; never raises, so it is safe on error paths. Content-addressed
+# objects are shared, so they stay while anything else uses them.
+def discard_scratch(
+    video_path: Optional[str] = None, r2_key: Optional[str] = None, job_id: Optional[str] = None
+):
+    if video_path and services.scratch.owns(video_path):
+        try:
+            services.scratch.remove(video_path)
+        except OSError as exc:
+            logger.warning(f"Could not remove scratch file {video_path}: {exc}")
+    if r2_key:
+        try:
+            if not (services.r2.is_content_addressed(r2_key) and r2_object_in_use(r2_key, job_id)):
+                services.r2.delete(r2_key)
+        except Exception as exc:
+            logger.warning(f"Could not delete staged R2 object {r2_key}: {exc}")
+
+# Everything a job staged, as recorded on the job document. Only local
+# uploads have files in the payload, saved there by upload_video.
+def discard_job_files(job: dict):
+    staged, payload = job.get("staged") or {}, job.get("payload") or {}
+    if payload.get("upload_type") == "local":
+        discard_scratch(
+            payload.get("local_video_path"), payload.get("local_r2_key"), job_id=job["_id"]
+        )
+    discard_scratch(staged.get("video_path"), staged.get("r2_key"), job_id=job["_id"])
+    discard_scratch((staged.get("download") or {}).get("path"))
+
+def download_r2_to_temp(
+    key: str,
+    publish: Optional[Callable[[dict], None]] = None,
+    shaper: Optional[Tenant] = None,
+) -> str:
+    scratch, r2 = services.scratch, services.r2
+    path = scratch.new_path(os.path.splitext(key)[1].lower() or ".mp4")
+    if not scratch.try_reserve(path, r2.size(key)):
+        raise DeferJob(SCRATCH_RETRY_DELAY, "Waiting for scratch space")
+    fetch = ProgressTracker(publish, "r2") if publish else None
+    try:
+        with timed("r2_get"), open(path, "wb") as tmp:
+            r2.download_fileobj(
+                key, tmp, callback=count_bytes("r2_get", paced("r2_get", shaper, fetch and fetch.add))
+            )
+    except BaseException:
+        scratch.remove(path)
+        raise
+    finally:
+        scratch.release(path)
+    return path
 
 def build_request_body(meta: VideoUploadRequest):
     return {
@@ -157,7 +917,6 @@ def build_request_body(meta: VideoUploadRequest):
             "description": meta.description,
             "tags": meta.tags,
             "categoryId": meta.category_id,
-            "thumbnails": {"default": {"url": meta.thumbnail_url or ""}},
         },
         "status": {
             "privacyStatus": meta.privacy_status,
@@ -170,18 +929,590 @@ def build_request_body(meta: VideoUploadRequest):
         },
     }
 
+# Coarse, bounded label for what made a chunk or job fail
+def failure_cause(exc: BaseException) -> str:
+    import httpx
+    from googleapiclient.errors import HttpError
+
+    if isinstance(exc, HttpError):
+        return f"youtube_{exc.resp.status}"
+    if isinstance(exc, HTTPException):
+        return f"http_{exc.status_code}"
+    if isinstance(exc, httpx.HTTPStatusError):
+        return "source_http"
+    if isinstance(exc, (httpx.TransportError, *retriable_exceptions())):
+        return "network"
+    return type(exc).__name__
+
+def retriable_exceptions() -> tuple:
+    import httplib2
+
+    return (httplib2.HttpLib2Error, OSError)
+
+def retry_delay(attempt: int) -> float:
+    delay = min(UPLOAD_RETRY_MAX_DELAY, UPLOAD_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+# Persists upload state, riding out a MongoDB failover with the same backoff
+# as chunk retries (a lost lease still ends the upload)
+def save_checkpoint(checkpoint: Callable[[Optional[dict]], None], state: Optional[dict]):
+    for attempt in itertools.count(1):
+        try:
+            checkpoint(state)
+            return
+        except AutoReconnect as exc:
+            if attempt > UPLOAD_MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt)
+            logger.warning(
+                f"Checkpoint failed ({exc}); retry {attempt}/{UPLOAD_MAX_RETRIES} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+def upload_to_youtube(
+    youtube,
+    meta: VideoUploadRequest,
+    media,
+    session: Optional[dict] = None,
+    checkpoint: Optional[Callable[[dict], None]] = None,
+    publish: Optional[Callable[[dict], None]] = None,
+    shaper: Optional[Tenant] = None,
+) -> dict:
+    from googleapiclient.errors import HttpError
+
+    retriable = retriable_exceptions()
+    progress = ProgressTracker(publish, "youtube") if publish else None
+    body = build_request_body(meta)
+    insert = youtube.videos().insert(
+        part="snippet,status,paidProductPlacementDetails",
+        body=body,
+        media_body=media,
+        autoLevels=meta.auto_levels,
+        notifySubscribers=meta.notify_subscribers,
+        stabilize=meta.stabilize
+    )
+    if session and session.get("session_uri"):
+        insert.resumable_uri = session["session_uri"]
+        insert.resumable_progress = session.get("offset", 0)
+        # Makes the next chunk ask YouTube how many bytes it really holds
+        insert._in_error_state = True
+        logger.info(f"Resuming upload session at byte {insert.resumable_progress}")
+
+    resp = None
+    attempt = 0
+    sent = insert.resumable_progress
+    while resp is None:
+        try:
+            with timed("youtube_chunk"):
+                status, resp = insert.next_chunk()
+        except HttpError as exc:
+            if exc.resp.status in (404, 410) and insert.resumable_uri:
+                can_rewind = getattr(media, "can_rewind", None)
+                if can_rewind and not can_rewind(0):
+                    # A stream can't be replayed from byte zero: forget the
+                    # session and have the job reopen the source
+                    if checkpoint:
+                        save_checkpoint(checkpoint, None)
+                    raise DeferJob(0, "Resumable session expired; restarting from the source")
+                # Session expired: start a new one from byte zero
+                logger.warning("Resumable session expired, starting over")
+                insert.resumable_uri = None
+                insert.resumable_progress = sent = 0
+                insert._in_error_state = False
+                error = exc
+            elif exc.resp.status not in RETRIABLE_STATUS_CODES:
+                raise
+            else:
+                error = exc
+        except retriable as exc:
+            error = exc
+        else:
+            attempt = 0
+            acked = insert.resumable_progress if resp is None else (media.size() or sent)
+            delta = max(acked - sent, 0)
+            BYTES_TRANSFERRED.labels("youtube").inc(delta)
+            sent = acked
+            if checkpoint and insert.resumable_uri:
+                save_checkpoint(checkpoint, {
+                    "session_uri": insert.resumable_uri,
+                    "offset": insert.resumable_progress,
+                })
+            if progress and resp is None:
+                progress.update(insert.resumable_progress, media.size())
+            elif progress:
+                total = media.size() or insert.resumable_progress
+                progress.update(total, total, force=True)
+            if status:
+                logger.debug(f"Upload {int(status.progress()*100)}%")
+            if shaper and resp is None:
+                # Holds the next chunk back until the user's share allows it
+                shaper.throttle("youtube", delta)
+            continue
+
+        CHUNK_RETRIES.labels(failure_cause(error)).inc()
+        attempt += 1
+        if attempt > UPLOAD_MAX_RETRIES:
+            raise error
+        delay = retry_delay(attempt)
+        logger.warning(
+            f"Upload chunk failed ({error}); retry {attempt}/{UPLOAD_MAX_RETRIES} "
+            f"in {delay:.1f}s"
+        )
+        time.sleep(delay)
+    return resp
+
+def upload_file_to_youtube(
+    youtube,
+    meta: VideoUploadRequest,
+    video_path: str,
+    session: Optional[dict] = None,
+    checkpoint: Optional[Callable[[dict], None]] = None,
+    publish: Optional[Callable[[dict], None]] = None,
+    shaper: Optional[Tenant] = None,
+) -> dict:
+    from googleapiclient.http import MediaFileUpload
+
+    media = MediaFileUpload(video_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    return upload_to_youtube(youtube, meta, media, session, checkpoint, publish, shaper)
+
+# Pipes `video_path` through ffmpeg into a new resumable upload. The output
+# isn't byte-for-byte reproducible, so an interrupted upload starts over
+# rather than resuming a previous session.
+def transcode_file_to_youtube(
+    youtube,
+    meta: VideoUploadRequest,
+    video_path: str,
+    checkpoint: Optional[Callable[[dict], None]] = None,
+    publish: Optional[Callable[[dict], None]] = None,
+    shaper: Optional[Tenant] = None,
+) -> dict:
+    from streaming import StreamingMediaUpload
+
+    with services.transcoder.open(video_path, meta.transcode) as output:
+        media = StreamingMediaUpload(output, "video/mp4", chunksize=UPLOAD_CHUNK_SIZE)
+        try:
+            return upload_to_youtube(youtube, meta, media, None, checkpoint, publish, shaper)
+        finally:
+            BYTES_TRANSFERRED.labels("transcode_in").inc(os.path.getsize(video_path))
+            BYTES_TRANSFERRED.labels("transcode_out").inc(output.bytes_read)
+
+def stream_url_to_youtube(
+    youtube,
+    meta: VideoUploadRequest,
+    session: Optional[dict] = None,
+    checkpoint: Optional[Callable[[dict], None]] = None,
+    publish: Optional[Callable[[dict], None]] = None,
+    shaper: Optional[Tenant] = None,
+):
+    from http_client import ResponseReader
+    from streaming import StreamingMediaUpload, TeeReader, discard
+
+    archive_key = None
+    offset = (session or {}).get("offset", 0)
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with services.http_sync.stream("GET", meta.video_url, headers=headers) as resp:
+        resp.raise_for_status()
+        body = ResponseReader(resp)
+        if offset and resp.status_code != 206:
+            # Origin ignored the range request; skip to the resume offset
+            discard(body, offset)
+        elif not offset:
+            # The header is checked as soon as the upload reads its first
+            # chunk, before the YouTube session is opened
+            length = resp.headers.get("Content-Length", "")
+            validator = HeaderValidator(
+                VIDEO_MAX_BYTES, VIDEO_MAX_DURATION, int(length) if length.isdigit() else None
+            )
+            body = ValidatingReader(body, validator)
+        source = hasher = HashingReader(body)
+        tee = None
+        # A resumed stream would only archive the tail, so skip the tee then
+        if R2_ARCHIVE_URL_SOURCES and not offset:
+            archive_key = services.r2.object_key(urlparse(meta.video_url).path)
+            source = tee = TeeReader(
+                hasher,
+                lambda f: services.r2.upload_fileobj(
+                    f, archive_key, callback=count_bytes("r2_put", paced("r2_put", shaper))
+                ),
+            )
+        media = StreamingMediaUpload(
+            source,
+            source_mimetype(meta.video_url, resp.headers.get("Content-Type")),
+            chunksize=UPLOAD_CHUNK_SIZE,
+            offset=offset,
+        )
+        try:
+            result = upload_to_youtube(
+                youtube, meta, media, session, checkpoint, publish, shaper
+            )
+        except Exception:
+            # Don't leave a truncated archive behind
+            if tee:
+                tee.close()
+                services.r2.delete(archive_key)
+            raise
+        finally:
+            BYTES_TRANSFERRED.labels("source").inc(hasher.bytes_read)
+    # A resumed stream only saw the tail of the source, so its hash is partial
+    digest = None if offset else hasher.hexdigest()
+    if tee:
+        error = tee.close()
+        if error:
+            logger.warning(f"R2 archive of {meta.video_url} failed: {error}")
+            archive_key = None
+        else:
+            archive_key = content_address(archive_key, digest)
+    return result, archive_key, digest
+
+# Moves an object written before its hash was known (a streamed archive) to
+# its content-addressed key; keeps the original key if the move fails
+def content_address(key: str, digest: str) -> str:
+    r2 = services.r2
+    target = r2.object_key(key, digest=digest)
+    try:
+        if not r2.exists(target):
+            r2.copy(key, target)
+        r2.delete(key)
+    except Exception as exc:
+        logger.warning(f"Could not move R2 object {key} to {target}: {exc}")
+        return key
+    return target
+
+async def prepare_thumbnail(url: str) -> Tuple[bytes, str]:
+    from thumbnails import fetch_image, prepare_image
+
+    with timed("thumbnail_prepare"):
+        data = await fetch_image(services.http, url, THUMBNAIL_MAX_SOURCE_BYTES)
+        return await run_in_process(prepare_image, data)
+
+def set_thumbnail(youtube, video_id: str, image: bytes, mimetype: str):
+    from googleapiclient.http import MediaInMemoryUpload
+
+    with timed("thumbnail_set"):
+        youtube.thumbnails().set(
+            videoId=video_id, media_body=MediaInMemoryUpload(image, mimetype=mimetype)
+        ).execute()
+
+# A thumbnail problem never fails the upload; returns the error, if any
+async def apply_thumbnail(
+    user_id: str, video_id: str, pending: asyncio.Task, client: OAuthClient
+) -> Optional[str]:
+    try:
+        image, mimetype = await pending
+        youtube = await get_youtube_client(user_id, client=client.name)
+        await run_blocking(services.quota.reserve, client.project, user_id, "thumbnails.set")
+        await run_blocking(set_thumbnail, youtube, video_id, image, mimetype)
+    except Exception as exc:
+        logger.warning(f"Thumbnail for video {video_id} not set: {exc}")
+        return str(exc)
+    return None
+
+# ─────────── Upload Jobs ────────────────────────────────────────────────────────
+# The videos.insert quota is reserved when a job is accepted; here the job
+# waits its turn in the token bucket (once), and the reservation is handed
+# back if the job ends without ever starting a YouTube upload. A job held back past
+# the daily reset first moves its reservation to the day it actually runs.
+async def process_upload_job(job: dict) -> dict:
+    quota = services.quota
+    client = job_client(job)
+    if not job.get("upload"):
+        reserved_on, day = job_quota_day(job), quota_day()
+        if day != reserved_on:
+            try:
+                await run_blocking(
+                    quota.move, client.project, job["user_id"], "videos.insert", reserved_on, day
+                )
+            except QuotaExceeded as exc:
+                raise DeferJob(seconds_until_reset(), str(exc))
+            try:
+                await run_blocking(
+                    services.upload_queue.checkpoint, job["_id"], {"payload.quota_day": day}
+                )
+            except LeaseLost:
+                # The new holder moves the reservation from the stored day
+                await run_blocking(
+                    quota.move, client.project, job["user_id"], "videos.insert", day, reserved_on
+                )
+                raise
+            job["payload"]["quota_day"] = day
+    # Admitted once, however often the job is deferred or taken over later
+    if not (job.get("upload") or job.get("admitted_at")):
+        with timed("quota_admit"):
+            wait = await run_blocking(quota.try_admit, client.project, "videos.insert")
+        if wait:
+            raise DeferJob(wait, "Waiting for YouTube API quota")
+        await run_blocking(
+            services.upload_queue.checkpoint, job["_id"], {"admitted_at": utcnow()}
+        )
+    # The thumbnail is fetched and resized while the video uploads, then set
+    # as soon as the video id is known
+    thumbnail_url = job["payload"].get("thumbnail_url")
+    thumbnail = asyncio.create_task(prepare_thumbnail(thumbnail_url)) if thumbnail_url else None
+    if thumbnail:
+        # Mark a failure as retrieved even if the upload fails first
+        thumbnail.add_done_callback(lambda t: t.cancelled() or t.exception())
+    upload_type = job["payload"].get("upload_type", "unknown")
+    try:
+        try:
+            in_flight = UPLOADS_IN_FLIGHT.labels(upload_type).track_inprogress()
+            with in_flight, client_router.track(client.name):
+                result = await run_upload_job(job, client)
+        except (DeferJob, LeaseLost):
+            # Not final: the job (and what it staged) lives on
+            raise
+        except Exception as exc:
+            latest = await services.upload_queue.get(job["_id"])
+            if not services.upload_queue.holds(job, latest):
+                # Another node has the job now; its files and quota are in use
+                raise LeaseLost(f"Job {job['_id']} was taken over by another worker") from exc
+            UPLOAD_FAILURES.labels(failure_cause(exc)).inc()
+            # Failure is final, so nothing the job staged will be resumed
+            await run_blocking(discard_job_files, latest)
+            if not latest.get("upload"):
+                await run_blocking(
+                    quota.release, client.project, job["user_id"], "videos.insert",
+                    day=job_quota_day(latest),
+                )
+            raise
+        if result.get("duplicate"):
+            if not services.upload_queue.holds(job, await services.upload_queue.get(job["_id"])):
+                raise LeaseLost(f"Job {job['_id']} was taken over by another worker")
+            await run_blocking(
+                quota.release, client.project, job["user_id"], "videos.insert",
+                day=job_quota_day(job),
+            )
+        elif thumbnail:
+            error = await apply_thumbnail(job["user_id"], result["video_id"], thumbnail, client)
+            result["thumbnail"] = "failed" if error else "set"
+            if error:
+                result["thumbnail_error"] = error
+        return result
+    finally:
+        if thumbnail and not thumbnail.done():
+            thumbnail.cancel()
+
+async def run_upload_job(job: dict, client: OAuthClient) -> dict:
+    meta = VideoUploadRequest(**job["payload"])
+    youtube = await get_youtube_client(job["user_id"], client=client.name)
+    # Set when a previous attempt got part-way through the resumable upload
+    session = job.get("upload")
+    shaper = services.bandwidth.tenant(job["user_id"])
+
+    def checkpoint(upload_state: Optional[dict]):
+        services.upload_queue.checkpoint(job["_id"], {"upload": upload_state})
+
+    def publish(event: dict):
+        progress_broker.publish(job["_id"], event)
+
+    def record(video_id: str, sha256: Optional[str], r2_key: Optional[str] = None):
+        services.upload_index.record(
+            job["user_id"], video_id, sha256=sha256, source_url=meta.video_url, r2_key=r2_key
+        )
+
+    # The resumable upload loop is synchronous; keep it off the event loop.
+    # Transcoded URL sources are staged, since ffmpeg may need to seek.
+    if meta.upload_type == "url" and URL_UPLOAD_MODE == "stream" and not meta.transcode:
+        resp, archive_key, digest = await run_blocking(
+            stream_url_to_youtube, youtube, meta, session, checkpoint, publish, shaper
+        )
+        await run_blocking(record, resp.get("id"), digest, archive_key)
+        return {"video_id": resp.get("id"), "r2_key": archive_key}
+
+    with timed("dedup_lookup"):
+        duplicate = await run_blocking(
+            services.upload_index.find_duplicate, job["user_id"], meta.sha256
+        )
+    if duplicate:
+        return {"video_id": duplicate["video_id"], "duplicate": True}
+
+    staged = job.get("staged") or {}
+    digest = meta.sha256
+    if staged.get("video_path") and os.path.exists(staged["video_path"]):
+        video_path, r2_key = staged["video_path"], staged["r2_key"]
+        digest = staged.get("sha256") or digest
+    else:
+        if meta.upload_type == "url":
+            copy = staged.get("r2_key")
+        elif meta.upload_type == "local" and not os.path.exists(meta.local_video_path):
+            # Saved on the node that accepted the upload
+            copy = meta.local_r2_key
+        else:
+            copy = None
+        if copy and await run_blocking(services.r2.exists, copy):
+            # The temp file is gone (another node took the job over, or the
+            # scratch space was lost); the R2 copy replaces the source
+            r2_key, digest = copy, staged.get("sha256") or digest
+            video_path = await run_blocking(download_r2_to_temp, copy, publish, shaper)
+        elif meta.upload_type == "url":
+            video_path, r2_key, digest = await stage_url_source(job, meta.video_url, publish)
+        elif meta.upload_type == "r2":
+            video_path = await run_blocking(download_r2_to_temp, meta.r2_key, publish, shaper)
+            r2_key = None
+            digest = digest or await run_blocking(sha256_file, video_path)
+        else:
+            video_path, r2_key = meta.local_video_path, meta.local_r2_key
+        if video_path != meta.local_video_path:
+            await run_blocking(
+                services.upload_queue.checkpoint,
+                job["_id"],
+                {"staged": {"video_path": video_path, "r2_key": r2_key, "sha256": digest}},
+            )
+
+    # Pre-staged R2 objects belong to the caller (r2_key is None for them)
+    def cleanup():
+        with timed("cleanup"):
+            discard_scratch(video_path, r2_key, job_id=job["_id"])
+
+    # Now that the content hash is known, skip re-uploading identical content
+    with timed("dedup_lookup"):
+        duplicate = await run_blocking(services.upload_index.find_duplicate, job["user_id"], digest)
+    if duplicate:
+        await run_blocking(cleanup)
+        return {"video_id": duplicate["video_id"], "duplicate": True}
+
+    if meta.transcode:
+        with timed("transcode_upload"):
+            resp = await run_blocking(
+                transcode_file_to_youtube, youtube, meta, video_path, checkpoint, publish, shaper
+            )
+    else:
+        resp = await run_blocking(
+            upload_file_to_youtube,
+            youtube, meta, video_path, session, checkpoint, publish, shaper,
+        )
+    await run_blocking(record, resp.get("id"), digest)
+    await run_blocking(cleanup)
+
+    return {"video_id": resp.get("id")}
+
+# Hands a due scheduled upload to the job queue under the schedule's id. The
+# videos.insert quota is reserved now, not when the upload was scheduled, so
+# an upload due when no client has quota left waits SCHEDULE_RETRY_DELAY.
+async def dispatch_scheduled(item: dict):
+    if await services.upload_queue.get(item["_id"]):
+        return  # queued before a crash, just not marked dispatched
+    user = await find_user(user_id=item["user_id"])
+    if not user:
+        raise RuntimeError("User no longer exists")
+    try:
+        client, day = await run_blocking(reserve_upload, user)
+    except QuotaExceeded as exc:
+        raise DeferJob(SCHEDULE_RETRY_DELAY, str(exc))
+    try:
+        await services.upload_queue.enqueue(
+            {**item["payload"], "oauth_client": client, "quota_day": day},
+            item["user_id"],
+            job_id=item["_id"],
+        )
+    except BaseException:
+        await run_blocking(release_upload, item["user_id"], client, day)
+        raise
+
+# Removes scratch files and staged R2 objects (incoming and content-addressed)
+# left behind by crashed or killed processes. Anything an unfinished job
+# still points at is kept, as are R2 objects the upload index refers to
+# (archived URL sources).
+def sweep_r2_orphans(keep: set) -> int:
+    r2 = services.r2
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=SCRATCH_ORPHAN_AGE)
+    keys = itertools.chain(
+        r2.list_keys(f"{r2.prefix}/incoming/"), r2.list_keys(f"{r2.prefix}/sha256/")
+    )
+    removed = 0
+    while page := list(itertools.islice(keys, 1000)):
+        candidates = [key for key, modified in page if modified < cutoff and key not in keep]
+        referenced = services.upload_index.referenced_keys(candidates)
+        orphans = [key for key in candidates if key not in referenced]
+        r2.delete_many(orphans)
+        removed += len(orphans)
+    return removed
+
+async def sweep_orphans():
+    try:
+        active = await services.upload_queue.active(
+            {"payload.local_video_path": 1, "payload.local_r2_key": 1, "payload.r2_key": 1, "staged": 1}
+        )
+        keep_paths, keep_keys = set(), set()
+        for job in active:
+            payload, staged = job.get("payload") or {}, job.get("staged") or {}
+            keep_paths.update(filter(None, [
+                payload.get("local_video_path"),
+                staged.get("video_path"),
+                (staged.get("download") or {}).get("path"),
+            ]))
+            keep_keys.update(filter(None, [
+                payload.get("r2_key"), payload.get("local_r2_key"), staged.get("r2_key"),
+            ]))
+        files, freed = await run_blocking(
+            services.scratch.sweep, SCRATCH_ORPHAN_AGE, keep_paths
+        )
+        logger.info(f"Scratch sweep removed {files} orphaned files ({freed} bytes)")
+        if SCRATCH_SWEEP_R2 and os.getenv("R2_BUCKET_NAME"):
+            keys = await run_blocking(sweep_r2_orphans, keep_keys)
+            logger.info(f"Scratch sweep removed {keys} orphaned R2 objects")
+    except Exception:
+        logger.exception("Scratch sweep failed")
+
+# Picks up bandwidth limits changed through another process
+async def sync_bandwidth():
+    while True:
+        try:
+            await run_blocking(services.bandwidth.refresh)
+        except Exception:
+            logger.exception("Loading bandwidth limits failed")
+        await asyncio.sleep(BANDWIDTH_SYNC_INTERVAL)
+
+async def preload_clients():
+    try:
+        await run_blocking(services.preload)
+    except Exception:
+        logger.exception("Preloading clients failed; they will be built on first use")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    progress_broker.bind(asyncio.get_running_loop())
+    await asyncio.gather(
+        services.token_store.ensure_indexes(),
+        run_blocking(lambda: services.upload_index.ensure_indexes()),
+        run_blocking(lambda: services.quota.ensure_indexes()),
+    )
+    await services.upload_queue.start()
+    await services.scheduler.start()
+    background = [asyncio.create_task(sweep_orphans()), asyncio.create_task(sync_bandwidth())]
+    if PRELOAD_CLIENTS:
+        background.append(asyncio.create_task(preload_clients()))
+    yield
+    for task in background:
+        task.cancel()
+    await services.scheduler.stop()
+    await services.upload_queue.stop()
+    shutdown_blocking_pool()
+    shutdown_process_pool()
+    await services.close()
+
 # ─────────── Routes ─────────────────────────────────────────────────────────────
-@app.get("/")
+router = APIRouter()
+
+@router.get("/")
 def index():
     return {"message": "ContentOS FastAPI Backend is running!"}
 
-@app.get("/auth/login")
-def login():
-    state = str(uuid.uuid4())
+# Without `client`, new grants go to the client with the most quota left
+@router.get("/auth/login")
+def login(client: Optional[str] = Query(None, description="OAuth client to authorize")):
+    import google_auth_oauthlib.flow
+
+    if client:
+        oauth = oauth_client(client)
+    else:
+        remaining = services.quota.remaining_many({c.project for c in OAUTH_CLIENTS.values()})
+        oauth = client_router.rank(OAUTH_CLIENTS, remaining)[0]
+    # The callback needs to know which client the code was issued to
+    state = f"{oauth.name}:{uuid.uuid4()}"
     flow = google_auth_oauthlib.flow.Flow.from_client_config(
-        OAUTH_CLIENT_CONFIG, scopes=SCOPES
+        oauth.client_config(), scopes=SCOPES
     )
-    flow.redirect_uri = REDIRECT_URI
+    flow.redirect_uri = oauth.redirect_uri
     auth_url, _ = flow.authorization_url(
         access_type="offline",
         include_granted_scopes="true",
@@ -190,132 +1521,374 @@ def login():
     )
     return RedirectResponse(auth_url)
 
-@app.get("/auth/callback")
-def auth_callback(request: Request, code: str, state: str):
+def exchange_code(oauth: OAuthClient, code: str):
+    import google_auth_oauthlib.flow
+    from googleapiclient.discovery import build
+
     flow = google_auth_oauthlib.flow.Flow.from_client_config(
-        OAUTH_CLIENT_CONFIG, scopes=SCOPES
+        oauth.client_config(), scopes=SCOPES
     )
-    flow.redirect_uri = REDIRECT_URI
+    flow.redirect_uri = oauth.redirect_uri
     flow.fetch_token(code=code)
     creds = flow.credentials
-    oauth_req = google.auth.transport.requests.Request()
     oauth2_svc = build("oauth2", "v2", credentials=creds)
     info = oauth2_svc.userinfo().get().execute()
+    return creds, info
+
+@router.get("/auth/callback")
+async def auth_callback(request: Request, code: str, state: str):
+    oauth = oauth_client(state.split(":", 1)[0] if ":" in state else DEFAULT_CLIENT)
+    creds, info = await run_blocking(exchange_code, oauth, code)
     google_sub = info.get("id") or info.get("sub")
     google_email = info.get("email")
     if not google_sub or not google_email:
         raise HTTPException(400, "Failed to get identity from Google")
-    tokens.update_one(
-        {"user_id": google_sub},
-        {"$set": {
-            "email": google_email,
-            "access_token": creds.token,
-            "refresh_token": creds.refresh_token,
-            "token_expiry": creds.expiry.isoformat(),
-        }},
-        upsert=True
+    await services.token_store.save(
+        google_sub,
+        google_email,
+        access_token=creds.token,
+        refresh_token=creds.refresh_token,
+        token_expiry=creds.expiry.isoformat(),
+        client=oauth.name,
     )
-    return {"message": f"Authenticated as {google_email}", "user_id": google_sub}
+    services.youtube_clients[oauth.name].invalidate(google_sub)
+    return {
+        "message": f"Authenticated as {google_email}",
+        "user_id": google_sub,
+        "client": oauth.name,
+    }
 
-@app.get("/categories/")
-def list_categories(
-    email: str = Query(..., description="Authenticated user's email"),
-    region_code: str = Query("US", alias="regionCode", description="ISO country code")
+def fetch_categories(
+    youtube, project: str, user_id: str, region_code: str, hl: Optional[str]
 ):
-    user = tokens.find_one({"email": email})
-    if not user:
-        raise HTTPException(401, "User not authenticated")
-    youtube = get_youtube_client(user["user_id"])
+    services.quota.record(project, user_id, "videoCategories.list")
     resp = youtube.videoCategories().list(
         part="snippet",
-        regionCode=region_code
+        regionCode=region_code,
+        **({"hl": hl} if hl else {}),
     ).execute()
     return [
         {"id": item["id"], "title": item["snippet"]["title"]}
         for item in resp.get("items", [])
     ]
 
-@app.get("/privacy-options/")
+@router.get("/categories/")
+async def list_categories(
+    email: str = Query(..., description="Authenticated user's email"),
+    region_code: str = Query("US", alias="regionCode", description="ISO country code"),
+    hl: Optional[str] = Query(None, description="Language for category titles"),
+):
+    user = await find_user(email)
+    if not user:
+        raise HTTPException(401, "User not authenticated")
+    region_code = region_code.upper()
+
+    async def fetch():
+        clients = await run_blocking(ranked_clients, user)
+        if not clients:
+            raise HTTPException(401, "User has not authorized any configured OAuth client")
+        youtube = await get_youtube_client(user["user_id"], user, clients[0].name)
+        return await run_blocking(
+            fetch_categories, youtube, clients[0].project, user["user_id"], region_code, hl
+        )
+
+    return await services.category_cache.get(f"categories:{region_code}:{hl or ''}", fetch)
+
+@router.get("/metrics")
+def metrics():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+@router.get("/privacy-options/")
 def get_privacy_options():
     return PRIVACY_OPTIONS
 
-@app.post("/upload/")
-async def upload_video(
-    upload_type: str = Form(...),
-    file: Optional[UploadFile] = File(None),
-    video_url: Optional[str] = Form(None),
-    title: str = Form(...),
-    description: str = Form(...),
-    tags: List[str] = Form(...),
-    category_id: str = Form(...),
-    privacy_status: str = Form(...),
-    publish_at: Optional[str] = Form(None),
-    embeddable: bool = Form(False),
-    made_for_kids: bool = Form(False),
-    paid_product_placement: bool = Form(False),
-    auto_levels: bool = Form(False),
-    notify_subscribers: bool = Form(True),
-    stabilize: bool = Form(False),
-    thumbnail_url: Optional[str] = Form(None),
-    email: str = Form(...),
-):
-    user = tokens.find_one({"email": email})
-    if not user:
-        raise HTTPException(401, "User not found")
-    youtube = get_youtube_client(user["user_id"])
-
-    if upload_type == "url":
-        if not video_url:
-            raise HTTPException(400, "video_url is required for URL upload")
-        video_path, r2_key = await download_url_to_temp_and_r2(video_url)
-    elif upload_type == "local":
-        if not file:
+@router.post("/upload/", openapi_extra=UPLOAD_FORM_OPENAPI)
+async def upload_video(request: Request, background_tasks: BackgroundTasks):
+    fields, video_path, digest = await read_upload_form(request)
+    # The saved file is ours until the job is queued; don't leave it behind
+    try:
+        form = parse_upload_form(fields)
+        user = await find_user(form.email)
+        if not user:
+            raise HTTPException(401, "User not found")
+
+        if form.upload_type == "local" and form.defer_upload:
+            raise HTTPException(400, "defer_upload needs a url or r2 source; stage the file in R2")
+        if form.upload_type == "local" and not video_path:
             raise HTTPException(400, "file is required for local upload")
-        video_path = await save_upload_file(file)
-        r2_key = None
-    else:
-        raise HTTPException(400, "upload_type must be 'url' or 'local'")
-
-    meta = VideoUploadRequest(
-        upload_type=upload_type,
-        video_url=video_url,
-        local_video_path=video_path,
-        title=title,
-        description=description,
-        tags=tags,
-        category_id=category_id,
-        privacy_status=privacy_status,
-        publish_at=publish_at,
-        embeddable=embeddable,
-        made_for_kids=made_for_kids,
-        paid_product_badged_product_placement=paid_product_placement,
-        auto_levels=auto_levels,
-        notify_subscribers=notify_subscribers,
-        stabilize=stabilize,
-        thumbnail_url=thumbnail_url
+        if form.upload_type != "local" and video_path:
+            discard_scratch(video_path)
+            video_path = digest = None
+
+        meta = VideoUploadRequest(
+            **form.model_dump(exclude={"email"}),
+            local_video_path=video_path,
+        )
+        if digest:
+            meta.sha256 = digest
+        error = validate_upload_request(meta)
+        if error:
+            raise HTTPException(400, error)
+
+        duplicate = await run_blocking(
+            services.upload_index.find_duplicate, user["user_id"], meta.sha256, meta.video_url
+        )
+        if duplicate:
+            if video_path:
+                await run_blocking(discard_scratch, video_path)
+            return {
+                "status": "duplicate",
+                "video_id": duplicate["video_id"],
+                "message": "Already uploaded",
+            }
+
+        if meta.defer_upload:
+            # Quota is reserved when the upload comes due
+            if not any(name in OAUTH_CLIENTS for name in user_grants(user)):
+                raise HTTPException(401, "User has not authorized any configured OAuth client")
+            item = await services.scheduler.schedule(
+                meta.model_dump(), user["user_id"], parse_publish_at(meta.publish_at)
+            )
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "schedule_id": item["_id"],
+                    "status": "scheduled",
+                    "run_at": item["run_at"].isoformat(),
+                    "message": "Upload scheduled",
+                },
+            )
+
+        # Reject now, before any download, if today's quota can't cover the
+        # insert on any of the user's OAuth clients
+        try:
+            client, day = await run_blocking(reserve_upload, user)
+        except QuotaExceeded as exc:
+            raise HTTPException(429, str(exc))
+        # A local upload is held on this node until its R2 copy is recorded,
+        # which happens after the response so large files don't delay it
+        share = bool(video_path and LOCAL_UPLOAD_R2_COPY)
+        try:
+            job_id = await services.upload_queue.enqueue(
+                {**meta.model_dump(), "oauth_client": client, "quota_day": day},
+                user["user_id"],
+                hold=share,
+            )
+        except BaseException:
+            await run_blocking(release_upload, user["user_id"], client, day)
+            raise
+        if share:
+            background_tasks.add_task(share_local_upload, job_id, video_path, digest)
+
+        # Accepted: the upload itself runs on a background worker
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "status": "queued", "message": "Upload queued"}
+        )
+    except BaseException:
+        if video_path:
+            discard_scratch(video_path)
+        raise
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await services.upload_queue.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+    return job_status(job)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(403, "Admin API is disabled; set ADMIN_TOKEN")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(403, "Invalid admin token")
+
+@router.get("/admin/bandwidth", dependencies=[Depends(require_admin)])
+async def get_bandwidth():
+    bandwidth = services.bandwidth
+    return {"limits": bandwidth.config(), "stats": bandwidth.stats()}
+
+@router.put("/admin/bandwidth", dependencies=[Depends(require_admin)])
+async def set_bandwidth(limits: BandwidthLimits):
+    changes: Dict[str, dict] = {
+        name: link.model_dump() for name, link in (
+            ("ingress", limits.ingress), ("egress", limits.egress)
+        ) if link
+    }
+    await run_blocking(services.bandwidth.update, changes)
+    return await get_bandwidth()
+
+@router.get("/schedules/{schedule_id}")
+async def get_schedule(schedule_id: str):
+    item = await services.scheduler.get(schedule_id)
+    if not item:
+        raise HTTPException(404, "Scheduled upload not found")
+    return schedule_status(item)
+
+@router.delete("/schedules/{schedule_id}")
+async def cancel_schedule(schedule_id: str):
+    item = await services.scheduler.cancel(schedule_id)
+    if not item:
+        raise HTTPException(404, "Scheduled upload not found")
+    if item["status"] != "cancelled":
+        raise HTTPException(409, f"Scheduled upload is already {item['status']}")
+    return schedule_status(item)
+
+@router.get("/upload/{job_id}/events")
+async def upload_events(job_id: str):
+    job = await services.upload_queue.get(job_id)
+    if not job:
+        raise HTTPException(404, "Job not found")
+
+    async def stream():
+        status = {"type": "status", **job_status(job)}
+        yield sse_message(status)
+        if job["status"] in FINAL_STATUSES:
+            return
+        async for event in progress_broker.subscribe(job_id, PROGRESS_KEEPALIVE):
+            if event is None:
+                # Quiet for a while (or the job runs on another process):
+                # check the stored status so the stream still terminates
+                current = await services.upload_queue.get(job_id)
+                if current and current["status"] in FINAL_STATUSES:
+                    yield sse_message({"type": "status", **job_status(current)})
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_message(event)
+            if event.get("final"):
+                return
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    body = build_request_body(meta)
-    media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
-    insert = youtube.videos().insert(
-        part="snippet,status,paidProductPlacementDetails",
-        body=body,
-        media_body=media,
-        autoLevels=auto_levels,
-        notifySubscribers=notify_subscribers,
-        stabilize=stabilize
+
+@router.post("/upload/batch")
+async def upload_batch(batch: BatchUploadRequest):
+    if not batch.items:
+        raise HTTPException(400, "items must not be empty")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(400, f"At most {BATCH_MAX_ITEMS} items per batch")
+    user = await find_user(batch.email)
+    if not user:
+        raise HTTPException(401, "User not found")
+
+    errors = {}
+    for index, item in enumerate(batch.items):
+        if item.upload_type == "local":
+            errors[index] = "local uploads are not supported in a batch; stage the file in R2"
+        elif error := validate_upload_request(item):
+            errors[index] = error
+    # Check pre-staged objects exist before queueing anything that needs them
+    staged = [
+        (index, item.r2_key) for index, item in enumerate(batch.items)
+        if item.upload_type == "r2" and index not in errors
+    ]
+    found = await asyncio.gather(*(run_blocking(services.r2.exists, key) for _, key in staged))
+    for (index, key), exists in zip(staged, found):
+        if not exists:
+            errors[index] = f"R2 object not found: {key}"
+
+    candidates = [index for index in range(len(batch.items)) if index not in errors]
+    found = await asyncio.gather(*(
+        run_blocking(
+            services.upload_index.find_duplicate,
+            user["user_id"],
+            batch.items[index].sha256,
+            batch.items[index].video_url,
+        )
+        for index in candidates
+    ))
+    duplicates = {index: dup for index, dup in zip(candidates, found) if dup}
+    deferred = [
+        index for index in candidates
+        if index not in duplicates and batch.items[index].defer_upload
+    ]
+    if deferred and not any(name in OAUTH_CLIENTS for name in user_grants(user)):
+        for index in deferred:
+            errors[index] = "User has not authorized any configured OAuth client"
+        deferred = []
+    items = await services.scheduler.schedule_many(
+        [
+            (batch.items[index].model_dump(), parse_publish_at(batch.items[index].publish_at))
+            for index in deferred
+        ],
+        user["user_id"],
     )
-    resp = None
-    while resp is None:
-        status, resp = insert.next_chunk()
-        if status:
-            print(f"Upload {int(status.progress()*100)}%")
+    scheduled = dict(zip(deferred, items))
 
-    if r2_key:
-        s3.delete_object(Bucket=R2_BUCKET, Key=r2_key)
-        os.remove(video_path)
+    valid, routed = [], {}
+    try:
+        for index in candidates:
+            if index in duplicates or index in scheduled or index in errors:
+                continue
+            try:
+                routed[index] = await run_blocking(reserve_upload, user)
+            except QuotaExceeded as exc:
+                errors[index] = str(exc)
+                continue
+            valid.append(index)
+        job_ids = await services.upload_queue.enqueue_many(
+            [
+                {**batch.items[index].model_dump(), "oauth_client": client, "quota_day": day}
+                for client, day in (routed[index] for index in valid)
+            ],
+            user["user_id"],
+        )
+    except BaseException as exc:
+        # Items an ordered insert got through before failing keep theirs
+        inserted = exc.details.get("nInserted", 0) if isinstance(exc, BulkWriteError) else 0
+        for index in valid[inserted:]:
+            await run_blocking(release_upload, user["user_id"], *routed[index])
+        raise
+    queued = dict(zip(valid, job_ids))
 
-    # Completed upload: return JSON response
+    results = []
+    for index in range(len(batch.items)):
+        if index in queued:
+            results.append({"index": index, "job_id": queued[index], "status": "queued"})
+        elif index in scheduled:
+            results.append({
+                "index": index,
+                "schedule_id": scheduled[index]["_id"],
+                "status": "scheduled",
+                "run_at": scheduled[index]["run_at"].isoformat(),
+            })
+        elif index in duplicates:
+            results.append({
+                "index": index,
+                "status": "duplicate",
+                "video_id": duplicates[index]["video_id"],
+            })
+        else:
+            results.append({"index": index, "status": "rejected", "error": errors[index]})
     return JSONResponse(
-        status_code=200,
-        content={"video_id": resp.get("id"), "message": "Upload complete!"}
+        status_code=400 if len(errors) == len(batch.items) else 202,
+        content={
+            "queued": len(queued),
+            "scheduled": len(scheduled),
+            "duplicates": len(duplicates),
+            "rejected": len(errors),
+            "results": results,
+        },
     )
+
+# ─────────── App ────────────────────────────────────────────────────────────────
+def create_app() -> FastAPI:
+    app = FastAPI(debug=True, lifespan=lifespan)
+    app.add_exception_handler(Exception, debug_exception_handler)
+    app.middleware("http")(time_requests)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Lock down in production
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    return app
+
+app = create_app()
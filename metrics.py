@@ -0,0 +1,70 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Phases span a few milliseconds (Mongo lookups) to many minutes (downloads)
+PHASE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800,
+)
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response starts, per route",
+    ["method", "route", "status"],
+)
+PHASE_SECONDS = Histogram(
+    "upload_phase_duration_seconds",
+    "Time spent in each step of the upload pipeline",
+    ["phase"],
+    buckets=PHASE_BUCKETS,
+)
+BYTES_TRANSFERRED = Counter(
+    "upload_bytes_total",
+    "Bytes moved by the upload pipeline",
+    ["direction"],
+)
+UPLOAD_FAILURES = Counter(
+    "upload_failures_total",
+    "Upload jobs that failed, by cause",
+    ["cause"],
+)
+CHUNK_RETRIES = Counter(
+    "upload_chunk_retries_total",
+    "Resumable upload chunks retried, by cause",
+    ["cause"],
+)
+UPLOADS_IN_FLIGHT = Gauge(
+    "uploads_in_flight",
+    "Upload jobs currently running in this process",
+    ["upload_type"],
+)
+
+
+# Times the enclosed block into the phase histogram; works in sync code and
+# around awaits alike
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.labels(phase).observe(time.perf_counter() - start)
+
+
+# Transfer callback counting bytes, optionally chained to another callback
+# (e.g. a progress tracker)
+def count_bytes(direction: str, then: Optional[Callable[[int], None]] = None):
+    counter = BYTES_TRANSFERRED.labels(direction)
+
+    def callback(nbytes: int):
+        counter.inc(nbytes)
+        if then:
+            then(nbytes)
+
+    return callback
+
+
+def render():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,85 @@
+import json
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# The client configured through GOOGLE_CLIENT_ID / GOOGLE_CLIENT_SECRET
+DEFAULT_CLIENT = "default"
+CLIENT_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+@dataclass(frozen=True)
+class OAuthClient:
+    name: str
+    client_id: str
+    client_secret: str
+    redirect_uri: str
+    # Quota is accounted per Google Cloud project; defaults to the client id
+    project: str
+    daily_limit: Optional[int] = None
+
+    def client_config(self) -> dict:
+        return {
+            "web": {
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "redirect_uris": [self.redirect_uri],
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+            }
+        }
+
+
+# `default` plus the clients listed in `raw`, a JSON array of
+# {"name", "client_id", "client_secret"[, "redirect_uri", "project", "daily_limit"]}
+def load_clients(raw: Optional[str], default: OAuthClient) -> Dict[str, OAuthClient]:
+    clients = {default.name: default}
+    for item in json.loads(raw or "[]"):
+        name = item.get("name", "")
+        if not CLIENT_NAME.match(name):
+            raise ValueError(f"OAuth client name {name!r} must match {CLIENT_NAME.pattern}")
+        if name in clients:
+            raise ValueError(f"OAuth client {name!r} is configured twice")
+        clients[name] = OAuthClient(
+            name=name,
+            client_id=item["client_id"],
+            client_secret=item["client_secret"],
+            redirect_uri=item.get("redirect_uri") or default.redirect_uri,
+            project=item.get("project") or item["client_id"],
+            daily_limit=item.get("daily_limit"),
+        )
+    return clients
+
+
+# Spreads new work over OAuth clients (and so over Cloud projects). Clients
+# are ranked by remaining daily quota per upload already running through
+# them in this process, so a project that is busy or nearly spent is only
+# picked when the others are worse off.
+class ClientRouter:
+    def __init__(self, clients: Dict[str, OAuthClient]):
+        self.clients = clients
+        self._in_flight: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def rank(self, names: Iterable[str], remaining: Dict[str, int]) -> List[OAuthClient]:
+        candidates = [self.clients[name] for name in names if name in self.clients]
+        with self._lock:
+            load = dict(self._in_flight)
+        return sorted(
+            candidates,
+            key=lambda client: remaining.get(client.project, 0) / (1 + load.get(client.name, 0)),
+            reverse=True,
+        )
+
+    @contextmanager
+    def track(self, name: str):
+        with self._lock:
+            self._in_flight[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight[name] -= 1
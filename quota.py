@@ -0,0 +1,207 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# YouTube Data API unit cost per call
+QUOTA_COSTS: Dict[str, int] = {
+    "videos.insert": 1600,
+    "thumbnails.set": 50,
+    "videoCategories.list": 1,
+}
+
+# Daily quotas reset at midnight Pacific time
+QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def quota_day(now: Optional[datetime] = None) -> str:
+    return (now or datetime.now(timezone.utc)).astimezone(QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+# Seconds until the next midnight Pacific, when a new quota day starts
+def seconds_until_reset(now: Optional[datetime] = None) -> float:
+    local = (now or datetime.now(timezone.utc)).astimezone(QUOTA_TZ)
+    midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), QUOTA_TZ)
+    return (midnight - local).total_seconds()
+
+
+# Quota accounting for one or more Google Cloud projects, stored in Mongo so
+# every process shares it:
+#   - daily budgets per project and per user, reserved atomically when work
+#     is accepted so requests that can't be covered are rejected up front;
+#   - a token bucket per project (refilled at daily_limit / 24h) that paces
+#     expensive calls, so the budget a reset frees isn't spent straight after
+#     the previous day's.
+class QuotaScheduler:
+    def __init__(
+        self,
+        collection,
+        daily_limit: int = 10000,
+        user_daily_limit: int = 0,
+        bucket_capacity: Optional[int] = None,
+        costs: Optional[Dict[str, int]] = None,
+        project_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.collection = collection
+        self.daily_limit = daily_limit
+        self.user_daily_limit = user_daily_limit
+        self.bucket_capacity = bucket_capacity
+        self.costs = costs or QUOTA_COSTS
+        # Projects granted a different daily quota than `daily_limit`
+        self.project_limits = project_limits or {}
+
+    def limit(self, project: str) -> int:
+        return self.project_limits.get(project, self.daily_limit)
+
+    # A day's budget by default: that much is already reserved up front, so
+    # the bucket only holds back spending beyond one day's worth per 24h
+    def capacity(self, project: str) -> int:
+        return self.bucket_capacity or max(self.limit(project), *self.costs.values(), 1)
+
+    def refill_per_second(self, project: str) -> float:
+        return self.limit(project) / 86400
+
+    def ensure_indexes(self):
+        self.collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    def cost(self, method: str, calls: int = 1) -> int:
+        return self.costs.get(method, 0) * calls
+
+    # ─────────── Daily budgets ────────────────────────────────────────────────
+    def _daily_key(self, project: str, user_id: Optional[str], day: str) -> str:
+        return f"daily:{project}:{day}" if user_id is None else f"daily:{project}:user:{user_id}:{day}"
+
+    def _add_daily(self, key: str, method: str, cost: int):
+        self.collection.update_one(
+            {"_id": key},
+            {
+                "$inc": {"used": cost, f"methods.{method}": cost},
+                "$setOnInsert": {"expires_at": datetime.now(timezone.utc) + timedelta(days=2)},
+            },
+            upsert=True,
+        )
+
+    def _take_daily(self, key: str, limit: int, method: str, cost: int) -> bool:
+        if cost > limit:
+            return False
+        # Upsert with a budget filter: when the day's doc exists but can't
+        # cover the cost, the upsert collides on _id instead of matching.
+        try:
+            self.collection.find_one_and_update(
+                {"_id": key, "used": {"$lte": limit - cost}},
+                {
+                    "$inc": {"used": cost, f"methods.{method}": cost},
+                    "$setOnInsert": {"expires_at": datetime.now(timezone.utc) + timedelta(days=2)},
+                },
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _give_back(self, key: str, method: str, cost: int):
+        self._add_daily(key, method, -cost)
+
+    def reserve(
+        self, project: str, user_id: str, method: str, calls: int = 1, day: Optional[str] = None
+    ) -> int:
+        cost = self.cost(method, calls)
+        if not cost:
+            return 0
+        day = day or quota_day()
+        project_key = self._daily_key(project, None, day)
+        if not self._take_daily(project_key, self.limit(project), method, cost):
+            raise QuotaExceeded(f"Daily quota for project {project} cannot cover {method}")
+        user_key = self._daily_key(project, user_id, day)
+        if not self.user_daily_limit:
+            self._add_daily(user_key, method, cost)
+        elif not self._take_daily(user_key, self.user_daily_limit, method, cost):
+            self._give_back(project_key, method, cost)
+            raise QuotaExceeded(f"Daily quota for user {user_id} cannot cover {method}")
+        return cost
+
+    # Hands back a reservation; `day` must be the day it was reserved on
+    def release(
+        self, project: str, user_id: str, method: str, calls: int = 1, day: Optional[str] = None
+    ):
+        cost = self.cost(method, calls)
+        if not cost:
+            return
+        day = day or quota_day()
+        self._give_back(self._daily_key(project, None, day), method, cost)
+        self._give_back(self._daily_key(project, user_id, day), method, cost)
+
+    # Moves a reservation from one quota day to another, e.g. for work held
+    # back past the reset; raises QuotaExceeded, keeping the reservation
+    # where it was, if `to_day` can't cover it
+    def move(self, project: str, user_id: str, method: str, from_day: str, to_day: str, calls: int = 1):
+        if from_day != to_day:
+            self.reserve(project, user_id, method, calls, day=to_day)
+            self.release(project, user_id, method, calls, day=from_day)
+
+    # Usage that is already spent (cheap reads); never rejected
+    def record(self, project: str, user_id: str, method: str, calls: int = 1):
+        cost = self.cost(method, calls)
+        if not cost:
+            return
+        day = quota_day()
+        self._add_daily(self._daily_key(project, None, day), method, cost)
+        self._add_daily(self._daily_key(project, user_id, day), method, cost)
+
+    def remaining(self, project: str) -> int:
+        return self.remaining_many([project])[project]
+
+    def remaining_many(self, projects: Iterable[str]) -> Dict[str, int]:
+        day = quota_day()
+        keys = {self._daily_key(project, None, day): project for project in projects}
+        used = {
+            doc["_id"]: doc.get("used", 0)
+            for doc in self.collection.find({"_id": {"$in": list(keys)}}, {"used": 1})
+        }
+        return {project: self.limit(project) - used.get(key, 0) for key, project in keys.items()}
+
+    # ─────────── Token bucket ─────────────────────────────────────────────────
+    # Takes `cost` tokens if available and returns 0, otherwise returns the
+    # seconds until enough tokens will have accumulated. The refill and the
+    # take happen in one server-side pipeline update, so racing processes
+    # can't both spend the same tokens.
+    def try_admit(self, project: str, method: str, calls: int = 1) -> float:
+        cost = self.cost(method, calls)
+        if not cost:
+            return 0.0
+        capacity = self.capacity(project)
+        refill_per_second = self.refill_per_second(project)
+        if cost > capacity:
+            raise QuotaExceeded(f"{method} costs more than the bucket capacity {capacity}")
+        now = datetime.now(timezone.utc)
+        refilled = {
+            "$min": [
+                capacity,
+                {"$add": [
+                    {"$ifNull": ["$tokens", capacity]},
+                    {"$multiply": [
+                        refill_per_second,
+                        {"$divide": [{"$subtract": [now, {"$ifNull": ["$at", now]}]}, 1000]},
+                    ]},
+                ]},
+            ]
+        }
+        doc = self.collection.find_one_and_update(
+            {"_id": f"bucket:{project}"},
+            [
+                {"$set": {"tokens": refilled, "at": now}},
+                {"$set": {"granted": {"$gte": ["$tokens", cost]}}},
+                {"$set": {"tokens": {"$cond": ["$granted", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["granted"]:
+            return 0.0
+        return (cost - doc["tokens"]) / refill_per_second
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, ReturnDocument
+
+from executor import run_blocking
+from jobs import DeferJob, utcnow
+
+logger = logging.getLogger("uvicorn.error")
+
+# Schedule states
+PENDING = "pending"
+DISPATCHED = "dispatched"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# A daily window as (start time of day, length), in UTC
+Window = Tuple[time, timedelta]
+
+
+# "01:00-06:00,22:30-02:00" -> windows; an end before the start wraps past midnight
+def parse_windows(raw: Optional[str]) -> List[Window]:
+    windows = []
+    for part in filter(None, (p.strip() for p in (raw or "").split(","))):
+        try:
+            start, end = (time.fromisoformat(t.strip()) for t in part.split("-"))
+        except ValueError:
+            raise ValueError(f"Off-peak window {part!r} must look like HH:MM-HH:MM")
+        day = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        length = datetime.combine(day, end) - datetime.combine(day, start)
+        windows.append((start, length if length > timedelta(0) else length + timedelta(days=1)))
+    return windows
+
+
+def as_utc(value: datetime) -> datetime:
+    # pymongo hands back naive datetimes (in UTC) unless the client is tz-aware
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+# When to start uploading something that must be live by `publish_at`: a spot
+# in the latest off-peak window that still leaves `lead_time` before the
+# publish time, spread over the window by `key` so items due together don't
+# all start at once. With no windows, at the deadline itself; if no window
+# fits before the deadline, right away.
+def plan_run_at(
+    publish_at: datetime,
+    now: datetime,
+    windows: List[Window],
+    lead_time: timedelta,
+    key: str = "",
+) -> datetime:
+    deadline = publish_at - lead_time
+    if deadline <= now:
+        return now
+    if not windows:
+        return deadline
+    spread = int.from_bytes(hashlib.sha256(key.encode()).digest()[:4], "big") / 2 ** 32
+    day = deadline.date()
+    while day >= now.date() - timedelta(days=1):
+        best = None
+        for start, length in windows:
+            opens = datetime.combine(day, start, tzinfo=timezone.utc)
+            lo, hi = max(opens, now), min(opens + length, deadline)
+            if lo < hi and (best is None or lo > best[0]):
+                best = (lo, hi)
+        if best:
+            lo, hi = best
+            return lo + (hi - lo) * spread
+        day -= timedelta(days=1)
+    return now
+
+
+# Pending uploads with a publish time, stored in Mongo and handed to
+# `dispatch` at the run_at planned from `windows` and `lead_time`. Only items
+# due within `horizon` seconds are held in memory, on a heap keyed by run_at;
+# the rest stay in Mongo and are paged in through the (status, run_at) index
+# every `refill_interval` seconds, so neither startup nor steady state scans
+# the whole collection however many items are pending.
+#
+# Several processes may run a scheduler over the same collection: an item is
+# leased atomically before it is dispatched, and the lease lapses after
+# `lease_time` seconds so a crashed process's items are picked up again.
+# `dispatch` may raise DeferJob to retry an item later; any other error
+# marks it failed.
+class UploadScheduler:
+    def __init__(
+        self,
+        collection,
+        dispatch: Callable[[dict], Awaitable[None]],
+        windows: Optional[List[Window]] = None,
+        lead_time: float = 86400.0,
+        horizon: float = 3600.0,
+        refill_interval: float = 60.0,
+        max_loaded: int = 100_000,
+        lease_time: float = 300.0,
+    ):
+        self.collection = collection
+        self.dispatch = dispatch
+        self.windows = windows or []
+        self.lead_time = timedelta(seconds=lead_time)
+        self.horizon = horizon
+        self.refill_interval = refill_interval
+        self.max_loaded = max_loaded
+        self.lease_time = lease_time
+        self._heap: List[Tuple[datetime, str]] = []
+        self._loaded: Set[str] = set()
+        self._loaded_until: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ─────────── Producer API ─────────────────────────────────────────────────
+    def _new_item(self, payload: dict, user_id: str, publish_at: datetime) -> dict:
+        now = utcnow()
+        item_id = str(uuid.uuid4())
+        return {
+            "_id": item_id,
+            "user_id": user_id,
+            "status": PENDING,
+            "payload": payload,
+            "publish_at": publish_at,
+            "run_at": plan_run_at(publish_at, now, self.windows, self.lead_time, item_id),
+            "job_id": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def _track(self, item_id: str, run_at: datetime):
+        # Anything past the loaded horizon is picked up by a later refill
+        if (
+            item_id in self._loaded or self._loaded_until is None
+            or run_at >= self._loaded_until or len(self._heap) >= self.max_loaded
+        ):
+            return
+        heapq.heappush(self._heap, (run_at, item_id))
+        self._loaded.add(item_id)
+        if self._heap[0][1] == item_id:
+            self._wakeup.set()
+
+    # Stores (payload, publish_at) pairs; returns the new items
+    async def schedule_many(self, items: List[Tuple[dict, datetime]], user_id: str) -> List[dict]:
+        if not items:
+            return []
+        docs = [self._new_item(payload, user_id, publish_at) for payload, publish_at in items]
+        await run_blocking(self.collection.insert_many, docs, ordered=True)
+        for doc in docs:
+            self._track(doc["_id"], doc["run_at"])
+        return docs
+
+    async def schedule(self, payload: dict, user_id: str, publish_at: datetime) -> dict:
+        return (await self.schedule_many([(payload, publish_at)], user_id))[0]
+
+    async def get(self, item_id: str) -> Optional[dict]:
+        return await run_blocking(self.collection.find_one, {"_id": item_id})
+
+    # Cancels a pending item; returns the item as it now stands, or None
+    async def cancel(self, item_id: str) -> Optional[dict]:
+        item = await run_blocking(
+            self.collection.find_one_and_update,
+            {"_id": item_id, "status": PENDING},
+            {"$set": {"status": CANCELLED, "updated_at": utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return item or await self.get(item_id)
+
+    # ─────────── Timer ────────────────────────────────────────────────────────
+    async def start(self):
+        await run_blocking(
+            self.collection.create_index, [("status", ASCENDING), ("run_at", ASCENDING)]
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # Loads pending items due before the new horizon. The query walks the
+    # index over that range only; overdue items (e.g. from before a restart,
+    # or scheduled by another process) come first.
+    async def _refill(self):
+        until = utcnow() + timedelta(seconds=self.horizon)
+        docs = await run_blocking(lambda: list(
+            self.collection.find(
+                {"status": PENDING, "run_at": {"$lt": until}}, {"run_at": 1}
+            ).sort("run_at", ASCENDING).limit(self.max_loaded)
+        ))
+        # A capped refill only covers up to its last item
+        self._loaded_until = until if len(docs) < self.max_loaded else as_utc(docs[-1]["run_at"])
+        for doc in docs:
+            if len(self._heap) >= self.max_loaded:
+                break
+            if doc["_id"] not in self._loaded:
+                heapq.heappush(self._heap, (as_utc(doc["run_at"]), doc["_id"]))
+                self._loaded.add(doc["_id"])
+
+    async def _run(self):
+        next_refill = utcnow()
+        while True:
+            try:
+                now = utcnow()
+                if now >= next_refill:
+                    await self._refill()
+                    next_refill = now + timedelta(seconds=self.refill_interval)
+                while self._heap and self._heap[0][0] <= utcnow():
+                    _, item_id = heapq.heappop(self._heap)
+                    self._loaded.discard(item_id)
+                    await self._fire(item_id)
+                wake = next_refill if not self._heap else min(next_refill, self._heap[0][0])
+                timeout = max((wake - utcnow()).total_seconds(), 0)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduler loop failed; retrying")
+                await asyncio.sleep(self.refill_interval)
+
+    # Leases `item_id`, dispatches it and records the outcome. The dispatched
+    # job takes the item's id, so a retry after a crash can tell it was queued.
+    async def _fire(self, item_id: str):
+        now = utcnow()
+        item = await run_blocking(
+            self.collection.find_one_and_update,
+            {
+                "_id": item_id,
+                "status": PENDING,
+                "run_at": {"$lte": now},
+                "$or": [{"leased_until": None}, {"leased_until": {"$lt": now}}],
+            },
+            {"$set": {"leased_until": now + timedelta(seconds=self.lease_time)}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if item is None:
+            return  # cancelled, rescheduled or taken by another process
+        update: Dict[str, object]
+        try:
+            await self.dispatch(item)
+            update = {"status": DISPATCHED, "job_id": item_id, "error": None}
+        except DeferJob as exc:
+            run_at = utcnow() + timedelta(seconds=exc.delay)
+            logger.info(f"Scheduled upload {item_id} deferred {exc.delay:.0f}s: {exc}")
+            update = {"run_at": run_at, "error": str(exc)}
+            self._track(item_id, run_at)
+        except Exception as exc:
+            logger.exception(f"Scheduled upload {item_id} could not be queued")
+            update = {"status": FAILED, "error": str(exc)}
+        await run_blocking(
+            self.collection.update_one,
+            {"_id": item_id},
+            {"$set": {**update, "leased_until": None, "updated_at": utcnow()}},
+        )
+
+
+def schedule_status(item: dict) -> dict:
+    return {
+        "schedule_id": item["_id"],
+        "status": item["status"],
+        "publish_at": item.get("publish_at"),
+        "run_at": item.get("run_at"),
+        "job_id": item.get("job_id"),
+        "error": item.get("error"),
+        "created_at": item.get("created_at"),
+    }
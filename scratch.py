@@ -0,0 +1,118 @@
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Tuple
+
+from executor import run_blocking
+
+
+class ScratchFull(Exception):
+    pass
+
+
+# Managed directory for temporary copies of videos with a total byte budget.
+# Files on disk count against the budget, plus the unwritten remainder of
+# every reservation, so downloads still in progress are accounted for. Space
+# is reserved before a file is written and the reservation is released once
+# the write finishes (or fails); the file itself counts from then on.
+class ScratchSpace:
+    def __init__(
+        self,
+        directory: str,
+        budget: int = 0,
+        min_free: int = 0,
+        poll_interval: float = 0.5,
+    ):
+        self.directory = os.path.abspath(directory)
+        self.budget = budget
+        self.min_free = min_free
+        self.poll_interval = poll_interval
+        self._reserved: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def new_path(self, suffix: str = "") -> str:
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}{suffix}")
+
+    def owns(self, path: str) -> bool:
+        return os.path.dirname(os.path.abspath(path)) == self.directory
+
+    def _sizes(self) -> Dict[str, int]:
+        sizes = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False):
+                        sizes[entry.path] = entry.stat().st_size
+                except FileNotFoundError:
+                    pass
+        return sizes
+
+    def usage(self) -> Tuple[int, int]:
+        sizes = self._sizes()
+        with self._lock:
+            pending = sum(max(n - sizes.get(p, 0), 0) for p, n in self._reserved.items())
+        return sum(sizes.values()), pending
+
+    def try_reserve(self, path: str, nbytes: int) -> bool:
+        if self.budget and nbytes > self.budget:
+            raise ScratchFull(f"{nbytes} bytes is more than the scratch budget ({self.budget})")
+        with self._lock:
+            sizes = self._sizes()
+            # Reserving a path again (to grow a file of unknown length while
+            # it is written) replaces its reservation; `nbytes` includes what
+            # is already on disk
+            written = sizes.pop(path, 0)
+            pending = sum(
+                max(n - sizes.get(p, 0), 0) for p, n in self._reserved.items() if p != path
+            )
+            if self.budget and sum(sizes.values()) + pending + nbytes > self.budget:
+                return False
+            if shutil.disk_usage(self.directory).free - pending - max(nbytes - written, 0) < self.min_free:
+                return False
+            self._reserved[path] = nbytes
+            return True
+
+    # Waits up to `timeout` seconds for space freed by other uploads
+    async def reserve(self, path: str, nbytes: int, timeout: float):
+        deadline = time.monotonic() + timeout
+        while not await run_blocking(self.try_reserve, path, nbytes):
+            if time.monotonic() >= deadline:
+                raise ScratchFull("Not enough scratch space; try again later")
+            await asyncio.sleep(self.poll_interval)
+
+    def release(self, path: str):
+        with self._lock:
+            self._reserved.pop(path, None)
+
+    def remove(self, path: str):
+        self.release(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # Deletes files older than `max_age` seconds that nothing claims
+    def sweep(self, max_age: float, keep: Iterable[str] = ()) -> Tuple[int, int]:
+        cutoff = time.time() - max_age
+        keep = {os.path.abspath(path) for path in keep}
+        with self._lock:
+            keep.update(self._reserved)
+        removed = freed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.path in keep or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat()
+                    if stat.st_mtime >= cutoff:
+                        continue
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
@@ -0,0 +1,103 @@
+import os
+import uuid
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+MB = 1024 * 1024
+
+
+# Cloudflare R2 (S3-compatible) object storage with explicit multipart
+# transfer settings. One client (and so one connection pool) is shared by
+# every upload worker; size the pool for workers * max_concurrency.
+class R2Storage:
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        multipart_threshold: int = 16 * MB,
+        part_size: int = 16 * MB,
+        max_concurrency: int = 8,
+        max_pool_connections: int = 32,
+        prefix: str = "videos",
+    ):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={"max_attempts": 5, "mode": "standard"},
+            ),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency,
+            use_threads=True,
+        )
+
+    # Content-addressed when the digest is known up front, otherwise unique
+    # per ingest; either way two sources never overwrite each other.
+    def object_key(self, source_name: str, digest: Optional[str] = None) -> str:
+        ext = os.path.splitext(source_name)[1].lower() or ".mp4"
+        if digest:
+            return f"{self.prefix}/sha256/{digest}{ext}"
+        return f"{self.prefix}/incoming/{uuid.uuid4().hex}{ext}"
+
+    # Content-addressed objects may be shared by several jobs and uploads
+    def is_content_addressed(self, key: str) -> bool:
+        return key.startswith(f"{self.prefix}/sha256/")
+
+    def upload_fileobj(self, fileobj, key: str, callback: Optional[Callable[[int], None]] = None):
+        self.client.upload_fileobj(
+            fileobj, self.bucket, key, Config=self.transfer_config, Callback=callback
+        )
+
+    def download_fileobj(self, key: str, fileobj, callback: Optional[Callable[[int], None]] = None):
+        self.client.download_fileobj(
+            self.bucket, key, fileobj, Config=self.transfer_config, Callback=callback
+        )
+
+    # Server-side copy, multipart for large objects
+    def copy(self, source_key: str, key: str):
+        self.client.copy(
+            {"Bucket": self.bucket, "Key": source_key}, self.bucket, key, Config=self.transfer_config
+        )
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys: List[str]):
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+
+    def list_keys(self, prefix: str) -> Iterator[Tuple[str, datetime]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", ()):
+                yield obj["Key"], obj["LastModified"]
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.client.exceptions.ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
@@ -0,0 +1,142 @@
+import io
+import queue
+import threading
+from typing import Callable, Optional
+
+from googleapiclient.http import MediaUpload
+
+# YouTube resumable chunks must be multiples of 256 KiB (except the last one)
+CHUNK_GRANULARITY = 256 * 1024
+
+
+# Resumable media body fed from a non-seekable stream of unknown length, e.g.
+# an HTTP response. Only the chunk in flight plus one chunk of read-ahead is
+# buffered, so memory is bounded by ~2x chunksize whatever the video size.
+# `offset` is the absolute position of the stream's first byte, used when
+# resuming a session part-way through the source.
+class StreamingMediaUpload(MediaUpload):
+    def __init__(self, stream, mimetype: str, chunksize: int, offset: int = 0):
+        if chunksize <= 0 or chunksize % CHUNK_GRANULARITY:
+            raise ValueError(
+                f"chunksize must be a positive multiple of {CHUNK_GRANULARITY} bytes"
+            )
+        self._stream = stream
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._buffer = bytearray()
+        self._buffer_start = offset  # absolute offset of self._buffer[0]
+        self._total: Optional[int] = None
+
+    def _fill(self, end: int):
+        while self._total is None and self._buffer_start + len(self._buffer) < end:
+            data = self._stream.read(end - self._buffer_start - len(self._buffer))
+            if not data:
+                self._total = self._buffer_start + len(self._buffer)
+            else:
+                self._buffer.extend(data)
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def size(self):
+        # Read ahead far enough to know whether the next chunk is the last one,
+        # so the final Content-Range carries the real total instead of "*".
+        self._fill(self._buffer_start + 2 * self._chunksize + 1)
+        return self._total
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    # Whether getbytes() can still serve `begin`; bytes before the buffer are gone
+    def can_rewind(self, begin: int) -> bool:
+        return begin >= self._buffer_start
+
+    def getbytes(self, begin, length):
+        if begin < self._buffer_start:
+            raise ValueError(
+                f"Cannot rewind stream to {begin}; oldest buffered byte is "
+                f"{self._buffer_start}"
+            )
+        # YouTube may acknowledge more than we last recorded; read through it
+        self._fill(begin + length)
+        del self._buffer[:begin - self._buffer_start]
+        self._buffer_start = begin
+        return bytes(self._buffer[:length])
+
+
+def discard(stream, nbytes: int, block_size: int = 1024 * 1024):
+    while nbytes > 0:
+        data = stream.read(min(block_size, nbytes))
+        if not data:
+            raise EOFError(f"Stream ended {nbytes} bytes before the resume offset")
+        nbytes -= len(data)
+
+
+class _QueueReader(io.RawIOBase):
+    def __init__(self, chunks: queue.Queue):
+        self._chunks = chunks
+        self._pending = bytearray()
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self._pending) < size):
+            chunk = self._chunks.get()
+            if chunk is None:
+                self.eof = True
+            else:
+                self._pending.extend(chunk)
+        if size is None or size < 0:
+            size = len(self._pending)
+        data = bytes(self._pending[:size])
+        del self._pending[:size]
+        return data
+
+
+# Wraps a source stream and copies every byte read from it into a second
+# consumer (e.g. an R2 upload) running on its own thread through a bounded
+# queue. A failing consumer is recorded and detached; it never breaks the
+# primary read path.
+class TeeReader:
+    def __init__(
+        self,
+        source,
+        consumer: Callable[[io.RawIOBase], None],
+        max_buffered_chunks: int = 8,
+    ):
+        self._source = source
+        self._chunks: queue.Queue = queue.Queue(maxsize=max_buffered_chunks)
+        self._reader = _QueueReader(self._chunks)
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._consume, args=(consumer,), daemon=True
+        )
+        self._thread.start()
+
+    def _consume(self, consumer):
+        try:
+            consumer(self._reader)
+        except Exception as exc:
+            self.error = exc
+            # Keep draining so the producer never blocks on a dead consumer
+            while not self._reader.eof and self._chunks.get() is not None:
+                pass
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        if data and self.error is None:
+            self._chunks.put(data)
+        return data
+
+    def close(self) -> Optional[BaseException]:
+        self._chunks.put(None)
+        self._thread.join()
+        return self.error
@@ -0,0 +1,60 @@
+import io
+from typing import Tuple
+
+import httpx
+from PIL import Image, UnidentifiedImageError
+
+# YouTube custom thumbnail limits
+THUMBNAIL_MAX_BYTES = 2 * 1024 * 1024
+THUMBNAIL_MAX_SIZE = (1280, 720)
+THUMBNAIL_MIMES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+async def fetch_image(client: httpx.AsyncClient, url: str, max_bytes: int) -> bytes:
+    data = bytearray()
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes(64 * 1024):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ThumbnailError(f"Thumbnail is larger than {max_bytes} bytes")
+    return bytes(data)
+
+
+# CPU-bound decode/resize/encode; meant for a process pool, so it takes and
+# returns plain bytes. Images already within limits are passed through.
+def prepare_image(
+    data: bytes,
+    max_size: Tuple[int, int] = THUMBNAIL_MAX_SIZE,
+    max_bytes: int = THUMBNAIL_MAX_BYTES,
+) -> Tuple[bytes, str]:
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            fmt = img.format
+            if (
+                fmt in THUMBNAIL_MIMES
+                and len(data) <= max_bytes
+                and img.width <= max_size[0]
+                and img.height <= max_size[1]
+            ):
+                return data, THUMBNAIL_MIMES[fmt]
+            img = img.convert("RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise ThumbnailError(f"Invalid thumbnail image: {exc}")
+
+    img.thumbnail(max_size, Image.LANCZOS)
+    quality = 90
+    while True:
+        out = io.BytesIO()
+        img.save(out, "JPEG", quality=quality, optimize=True)
+        if out.tell() <= max_bytes:
+            return out.getvalue(), "image/jpeg"
+        if quality > 60:
+            quality -= 10
+        else:
+            img = img.resize((max(img.width * 4 // 5, 1), max(img.height * 4 // 5, 1)), Image.LANCZOS)
@@ -0,0 +1,71 @@
+from typing import Dict, Optional
+
+from pymongo import ASCENDING
+
+from oauth_clients import DEFAULT_CLIENT
+
+GRANT_FIELDS = ("access_token", "refresh_token", "token_expiry")
+
+# Only what the API needs from a token document
+USER_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "email": 1,
+    "access_token": 1,
+    "refresh_token": 1,
+    "token_expiry": 1,
+    "grants": 1,
+}
+
+
+# A user's tokens are only valid with the OAuth client that issued them. The
+# default client's grant sits at the top level of the token document (the
+# layout from before there were several clients); others under grants.<name>.
+def grant_prefix(client: str) -> str:
+    return "" if client == DEFAULT_CLIENT else f"grants.{client}."
+
+
+# The user's tokens per OAuth client name
+def user_grants(user: dict) -> Dict[str, dict]:
+    grants = dict(user.get("grants") or {})
+    if user.get("access_token"):
+        grants[DEFAULT_CLIENT] = {field: user.get(field) for field in GRANT_FIELDS}
+    return grants
+
+
+# OAuth tokens per Google account, read from the request path with the async
+# driver so lookups never tie up the event loop or a blocking-pool thread.
+class TokenStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("user_id", ASCENDING)], unique=True)
+        await self.collection.create_index([("email", ASCENDING)], unique=True)
+
+    async def find(self, email: Optional[str] = None, user_id: Optional[str] = None) -> Optional[dict]:
+        if not (email or user_id):
+            return None
+        query = {"user_id": user_id} if user_id else {"email": email}
+        return await self.collection.find_one(query, USER_PROJECTION)
+
+    async def save(
+        self,
+        user_id: str,
+        email: str,
+        access_token: str,
+        refresh_token: Optional[str],
+        token_expiry: Optional[str],
+        client: str = DEFAULT_CLIENT,
+    ):
+        prefix = grant_prefix(client)
+        await self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": {
+                "email": email,
+                f"{prefix}access_token": access_token,
+                f"{prefix}refresh_token": refresh_token,
+                f"{prefix}token_expiry": token_expiry,
+            }},
+            upsert=True,
+        )
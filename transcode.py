@@ -0,0 +1,132 @@
+import collections
+import logging
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("uvicorn.error")
+
+TRANSCODE_PROFILES = ("remux", "h264")
+
+# The output is piped, so it can't be rewritten with the index up front
+# (faststart); fragmented MP4 is the streamable equivalent YouTube accepts
+FRAGMENTED_MP4 = ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+
+
+class TranscodeError(Exception):
+    pass
+
+
+# ffmpeg's stdout as a file-like reader. At end of stream the process is
+# reaped and a failure raises instead of reading as a clean EOF, so a
+# truncated output is never finalized as a complete upload.
+class TranscodeOutput:
+    def __init__(self, proc: subprocess.Popen, stderr: collections.deque):
+        self._proc = proc
+        self._stderr = stderr
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._proc.stdout.read(size)
+        if data:
+            self.bytes_read += len(data)
+            return data
+        returncode = self._proc.wait()
+        if returncode != 0:
+            raise TranscodeError(
+                f"ffmpeg exited with {returncode}: {' | '.join(self._stderr) or 'no output'}"
+            )
+        return b""
+
+
+# Runs ffmpeg as a subprocess per transcode, at most `max_processes` at once
+# (callers wait for a slot). Profiles:
+#   remux - copy the video stream, re-encode audio to AAC, into MP4
+#   h264  - re-encode video to H.264 at `video_bitrate`, audio to AAC
+class Transcoder:
+    def __init__(
+        self,
+        ffmpeg: str = "ffmpeg",
+        max_processes: int = 2,
+        video_bitrate: str = "4M",
+        audio_bitrate: str = "192k",
+        preset: str = "veryfast",
+        threads: int = 0,
+    ):
+        self.ffmpeg = ffmpeg
+        self.video_bitrate = video_bitrate
+        self.audio_bitrate = audio_bitrate
+        self.preset = preset
+        self.threads = threads
+        self._slots = threading.BoundedSemaphore(max_processes)
+        self._running: Dict[int, subprocess.Popen] = {}
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return shutil.which(self.ffmpeg) is not None
+
+    def command(self, source: str, profile: str) -> List[str]:
+        if profile not in TRANSCODE_PROFILES:
+            raise ValueError(f"Unknown transcode profile {profile!r}; use one of {TRANSCODE_PROFILES}")
+        audio = ["-c:a", "aac", "-b:a", self.audio_bitrate]
+        if profile == "remux":
+            video = ["-c:v", "copy"]
+        else:
+            video = [
+                "-c:v", "libx264", "-preset", self.preset, "-pix_fmt", "yuv420p",
+                "-b:v", self.video_bitrate, "-maxrate", self.video_bitrate,
+                "-bufsize", self.video_bitrate,
+            ]
+        return [
+            self.ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-i", source,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            *video, *audio,
+            "-threads", str(self.threads),
+            *FRAGMENTED_MP4, "pipe:1",
+        ]
+
+    # Yields a TranscodeOutput for `source` (a path or URL ffmpeg can read),
+    # waiting up to `timeout` seconds for a slot (None waits indefinitely).
+    # The process is killed if the caller stops reading early.
+    @contextmanager
+    def open(self, source: str, profile: str, timeout: Optional[float] = None):
+        command = self.command(source, profile)
+        if not self._slots.acquire(timeout=timeout):
+            raise TranscodeError("Timed out waiting for a transcode slot")
+        try:
+            proc = subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        except OSError as exc:
+            self._slots.release()
+            raise TranscodeError(f"Could not start ffmpeg: {exc}") from exc
+        stderr: collections.deque = collections.deque(maxlen=20)
+        drain = threading.Thread(
+            target=lambda: stderr.extend(line.decode(errors="replace").strip() for line in proc.stderr),
+            daemon=True,
+        )
+        drain.start()
+        with self._lock:
+            self._running[proc.pid] = proc
+        try:
+            yield TranscodeOutput(proc, stderr)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+            proc.stdout.close()
+            drain.join(timeout=5)
+            with self._lock:
+                self._running.pop(proc.pid, None)
+            self._slots.release()
+
+    # Kills transcodes still running, e.g. on shutdown
+    def kill_all(self):
+        with self._lock:
+            running = list(self._running.values())
+        for proc in running:
+            if proc.poll() is None:
+                proc.kill()
@@ -0,0 +1,270 @@
+import struct
+from dataclasses import dataclass
+from typing import Iterator, Optional, Tuple
+
+# Enough for the container header and, in most files, the MP4 moov box /
+# Matroska Info / AVI main header that carry the duration
+HEADER_BYTES = 64 * 1024
+
+# Top-level boxes a QuickTime/MP4 file may start with (older QuickTime files
+# have no ftyp)
+MP4_TOP_LEVEL = {
+    b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid", b"udta", b"meta",
+    b"styp", b"sidx", b"moof", b"pdin",
+}
+MATROSKA_DOCTYPES = {b"matroska": "matroska", b"webm": "webm"}
+
+EBML_HEADER = 0x1A45DFA3
+EBML_DOCTYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_CLUSTER = 0x1F43B675
+
+
+class InvalidVideo(Exception):
+    pass
+
+
+class VideoTooLarge(InvalidVideo):
+    pass
+
+
+@dataclass
+class VideoHeader:
+    container: str  # mp4, mov, matroska, webm or avi
+    brand: Optional[str] = None
+    # Seconds, when the header carries it
+    duration: Optional[float] = None
+    # MP4/MOV: whether the index precedes the media data (faststart)
+    moov_first: Optional[bool] = None
+
+
+# ─────────── MP4 / QuickTime ────────────────────────────────────────────────────
+# (type, offset, header length, size or None if it runs to the end of file)
+def _boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int, Optional[int]]]:
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        if size == 0:
+            yield kind, pos, header, None
+            return
+        if size < header:
+            raise InvalidVideo(f"Malformed MP4 box {kind!r} at byte {pos}")
+        yield kind, pos, header, size
+        pos += size
+
+
+def _mvhd_duration(data: bytes, start: int, end: int) -> Optional[float]:
+    for kind, pos, header, size in _boxes(data, start, end):
+        if kind != b"mvhd":
+            continue
+        body = pos + header
+        version = data[body] if body < end else None
+        if version == 0 and body + 20 <= end:
+            timescale, duration = struct.unpack_from(">II", data, body + 12)
+            unknown = duration == 0xFFFFFFFF
+        elif version == 1 and body + 32 <= end:
+            timescale, duration = struct.unpack_from(">IQ", data, body + 20)
+            unknown = duration == 0xFFFFFFFFFFFFFFFF
+        else:
+            return None
+        return None if unknown or not timescale else duration / timescale
+    return None
+
+
+def _parse_mp4(data: bytes) -> Optional[VideoHeader]:
+    if data[4:8] not in MP4_TOP_LEVEL:
+        return None
+    header = VideoHeader(container="mov")
+    for kind, pos, box_header, size in _boxes(data, 0, len(data)):
+        if kind == b"ftyp" and pos == 0:
+            brand = data[pos + box_header:pos + box_header + 4]
+            header.brand = brand.decode("latin-1").strip()
+            header.container = "mov" if brand == b"qt  " else "mp4"
+        elif kind == b"moov":
+            if header.moov_first is None:
+                header.moov_first = True
+            end = len(data) if size is None else min(pos + size, len(data))
+            header.duration = _mvhd_duration(data, pos + box_header, end)
+        elif kind == b"mdat" and header.moov_first is None:
+            header.moov_first = False
+        elif pos == 0 and kind not in MP4_TOP_LEVEL:
+            return None
+    return header
+
+
+# ─────────── Matroska / WebM ────────────────────────────────────────────────────
+# EBML variable-length integer at `pos`: (value, length). Element IDs keep
+# their length marker bit; sizes don't, and all-ones means "unknown".
+def _vint(data: bytes, pos: int, keep_marker: bool = False) -> Tuple[Optional[int], int]:
+    if pos >= len(data) or data[pos] == 0:
+        raise InvalidVideo(f"Malformed EBML number at byte {pos}")
+    length = 9 - data[pos].bit_length()
+    if pos + length > len(data):
+        raise InvalidVideo("EBML header is truncated")
+    value = data[pos] if keep_marker else data[pos] & (0xFF >> length)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+# (id, payload offset, payload size or None if unknown)
+def _elements(data: bytes, start: int, end: int) -> Iterator[Tuple[int, int, Optional[int]]]:
+    pos = start
+    while pos < end:
+        try:
+            element, id_length = _vint(data, pos, keep_marker=True)
+            size, size_length = _vint(data, pos + id_length)
+        except InvalidVideo:
+            if pos == start:
+                raise
+            return  # the header cut this element off
+        body = pos + id_length + size_length
+        yield element, body, size
+        if size is None:
+            return
+        pos = body + size
+
+
+def _parse_matroska(data: bytes) -> Optional[VideoHeader]:
+    if struct.unpack_from(">I", data, 0)[0] != EBML_HEADER:
+        return None
+    elements = _elements(data, 0, len(data))
+    _, body, size = next(elements)
+    if size is None or body + size > len(data):
+        raise InvalidVideo("EBML header is truncated")
+    doctype = next(
+        (data[b:b + s].rstrip(b"\0") for e, b, s in _elements(data, body, body + size) if e == EBML_DOCTYPE),
+        None,
+    )
+    if doctype not in MATROSKA_DOCTYPES:
+        raise InvalidVideo(f"Unsupported EBML document type {doctype!r}")
+    header = VideoHeader(container=MATROSKA_DOCTYPES[doctype], brand=doctype.decode())
+    for element, segment, segment_size in elements:
+        if element != MKV_SEGMENT:
+            continue
+        end = len(data) if segment_size is None else min(segment + segment_size, len(data))
+        for child, info, info_size in _elements(data, segment, end):
+            if child == MKV_CLUSTER:
+                break
+            if child != MKV_INFO or info_size is None:
+                continue
+            scale, duration = 1_000_000, None
+            for field, value, length in _elements(data, info, min(info + info_size, len(data))):
+                if value + (length or 0) > len(data):
+                    break
+                if field == MKV_TIMECODE_SCALE and length:
+                    scale = int.from_bytes(data[value:value + length], "big")
+                elif field == MKV_DURATION and length in (4, 8):
+                    duration = struct.unpack_from(">f" if length == 4 else ">d", data, value)[0]
+            if duration is not None:
+                header.duration = duration * scale / 1e9
+            break
+        break
+    return header
+
+
+# ─────────── AVI ──────────────────────────────────────────────────────────────
+def _parse_avi(data: bytes) -> Optional[VideoHeader]:
+    if data[:4] != b"RIFF" or data[8:12] != b"AVI ":
+        return None
+    header = VideoHeader(container="avi")
+    # RIFF 'AVI ' > LIST 'hdrl' > 'avih' (microseconds per frame, ..., total frames)
+    if data[12:16] == b"LIST" and data[20:24] == b"hdrl" and data[24:28] == b"avih" and len(data) >= 52:
+        usec_per_frame = struct.unpack_from("<I", data, 32)[0]
+        total_frames = struct.unpack_from("<I", data, 48)[0]
+        if usec_per_frame and total_frames:
+            header.duration = usec_per_frame * total_frames / 1e6
+    return header
+
+
+# Identifies the container from the first bytes of a file
+def parse_header(data: bytes) -> VideoHeader:
+    if len(data) < 12:
+        raise InvalidVideo("File is too short to be a video")
+    for parse in (_parse_mp4, _parse_matroska, _parse_avi):
+        header = parse(data)
+        if header:
+            return header
+    raise InvalidVideo("Not a supported video container (MP4/MOV, Matroska/WebM or AVI)")
+
+
+def check_size(size: Optional[int], max_bytes: int = 0):
+    if max_bytes and size is not None and size > max_bytes:
+        raise VideoTooLarge(f"Video is larger than {max_bytes} bytes")
+
+
+# Parses `head` (the first bytes of a file) and applies the limits; `size` is
+# the full file size when known
+def validate_head(
+    head: bytes, size: Optional[int] = None, max_bytes: int = 0, max_duration: float = 0
+) -> VideoHeader:
+    check_size(size, max_bytes)
+    header = parse_header(head)
+    if max_duration and header.duration and header.duration > max_duration:
+        raise InvalidVideo(
+            f"Video is {header.duration:.0f}s long; the limit is {max_duration:.0f}s"
+        )
+    return header
+
+
+# Validates a stream while it is read: the header once the first
+# `header_bytes` have arrived (or the stream ends), and the running size on
+# every chunk, so bad input is rejected after a few KB rather than at the end.
+class HeaderValidator:
+    def __init__(
+        self,
+        max_bytes: int = 0,
+        max_duration: float = 0,
+        expected_size: Optional[int] = None,
+        header_bytes: int = HEADER_BYTES,
+    ):
+        check_size(expected_size, max_bytes)
+        self.max_bytes = max_bytes
+        self.max_duration = max_duration
+        self.header_bytes = header_bytes
+        self.header: Optional[VideoHeader] = None
+        self.size = 0
+        self._head = bytearray()
+
+    def feed(self, data: bytes):
+        self.size += len(data)
+        check_size(self.size, self.max_bytes)
+        if self.header is None:
+            self._head += data[:self.header_bytes - len(self._head)]
+            if len(self._head) >= self.header_bytes:
+                self._validate()
+
+    def finish(self) -> VideoHeader:
+        if self.header is None:
+            self._validate()
+        return self.header
+
+    def _validate(self):
+        self.header = validate_head(bytes(self._head), max_duration=self.max_duration)
+        self._head = bytearray()
+
+
+# File-like wrapper feeding everything read through a HeaderValidator
+class ValidatingReader:
+    def __init__(self, stream, validator: HeaderValidator):
+        self._stream = stream
+        self.validator = validator
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        if data:
+            self.validator.feed(data)
+        else:
+            self.validator.finish()
+        return data
@@ -0,0 +1,167 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import google_auth_httplib2
+from cachetools import TTLCache
+from google.auth.transport.requests import Request as AuthRequest
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.http import HttpRequest, build_http
+
+from oauth_clients import DEFAULT_CLIENT
+from token_store import grant_prefix, user_grants
+
+logger = logging.getLogger("uvicorn.error")
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+_discovery_docs: dict = {}
+_discovery_lock = threading.Lock()
+
+
+# Parsed once per process from the discovery documents bundled with
+# google-api-python-client, instead of re-reading/parsing them per build().
+def discovery_doc(service: str, version: str) -> dict:
+    key = (service, version)
+    with _discovery_lock:
+        if key not in _discovery_docs:
+            _discovery_docs[key] = json.loads(get_static_doc(service, version))
+        return _discovery_docs[key]
+
+
+def parse_expiry(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    expiry = datetime.fromisoformat(value)
+    # google-auth compares expiry against naive UTC timestamps
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+    return expiry
+
+
+@dataclass
+class _Entry:
+    credentials: Credentials
+    service: object = None
+    persisted_token: Optional[str] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+# Per-user cache of Credentials and built YouTube service objects. Service
+# objects are shared across threads, so every API request gets its own
+# AuthorizedHttp (httplib2 connections are not thread-safe). Tokens are
+# refreshed shortly before they expire and written back to the token store.
+class YouTubeClientCache:
+    def __init__(
+        self,
+        tokens,
+        client_id: str,
+        client_secret: str,
+        scopes: List[str],
+        maxsize: int = 1024,
+        ttl: float = 3600,
+        refresh_margin: float = 300,
+        api_endpoint: Optional[str] = None,
+        client: str = DEFAULT_CLIENT,
+    ):
+        self.tokens = tokens
+        # Name of the OAuth client these credentials belong to; selects the
+        # user's grant for it in the token document
+        self.client = client
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scopes = scopes
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        # Overrides the API host (and the upload host with it), e.g. for a
+        # local stand-in of YouTube
+        self.client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, user: Optional[dict] = None):
+        entry = self._entry(user_id, user)
+        if entry is None:
+            return None
+        self._ensure_fresh(user_id, entry)
+        return entry.service
+
+    def credentials(self, user_id: str, user: Optional[dict] = None) -> Optional[Credentials]:
+        entry = self._entry(user_id, user)
+        if entry is None:
+            return None
+        self._ensure_fresh(user_id, entry)
+        return entry.credentials
+
+    # Lets async callers skip the token lookup when the client is warm
+    def cached(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._entries
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def _entry(self, user_id: str, user: Optional[dict]) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None:
+            return entry
+        if user is None:
+            user = self.tokens.find_one({"user_id": user_id})
+        grant = user_grants(user).get(self.client) if user else None
+        if not grant:
+            return None
+        creds = Credentials(
+            token=grant["access_token"],
+            refresh_token=grant["refresh_token"],
+            token_uri=TOKEN_URI,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=self.scopes,
+            expiry=parse_expiry(grant.get("token_expiry")),
+        )
+        entry = _Entry(credentials=creds, persisted_token=creds.token)
+        entry.service = build_from_document(
+            discovery_doc("youtube", "v3"),
+            http=build_http(),
+            requestBuilder=self._request_builder(user_id, entry),
+            client_options=self.client_options,
+        )
+        with self._lock:
+            # Another thread may have built one meanwhile; keep the first
+            return self._entries.setdefault(user_id, entry)
+
+    def _request_builder(self, user_id: str, entry: _Entry):
+        def build_request(http, *args, **kwargs):
+            self._ensure_fresh(user_id, entry)
+            authed = google_auth_httplib2.AuthorizedHttp(
+                entry.credentials, http=build_http()
+            )
+            return HttpRequest(authed, *args, **kwargs)
+        return build_request
+
+    def _ensure_fresh(self, user_id: str, entry: _Entry):
+        creds = entry.credentials
+        with entry.lock:
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            if creds.expiry is None or creds.expiry - now < self.refresh_margin:
+                creds.refresh(AuthRequest())
+                logger.debug(f"Refreshed access token for {user_id}")
+            # Also catches tokens refreshed by AuthorizedHttp after a 401
+            if creds.token != entry.persisted_token:
+                self._write_back(user_id, creds)
+                entry.persisted_token = creds.token
+
+    def _write_back(self, user_id: str, creds: Credentials):
+        prefix = grant_prefix(self.client)
+        update = {f"{prefix}access_token": creds.token}
+        if creds.expiry:
+            update[f"{prefix}token_expiry"] = creds.expiry.isoformat()
+        if creds.refresh_token:
+            update[f"{prefix}refresh_token"] = creds.refresh_token
+        self.tokens.update_one({"user_id": user_id}, {"$set": update})